@@ -0,0 +1,26 @@
+import logging
+import os
+
+from utils.benchmark import compare_benchmarks, load_benchmarks, run_benchmarks, save_benchmarks
+
+logging.getLogger().setLevel(logging.INFO)
+
+# results of the current run, named by commit
+output_dir = 'benchmark_results'
+
+# results of another commit to compare with, disabled if None
+baseline_path = None
+
+# run all benchmarks with default sweeps
+results = run_benchmarks()
+
+commit = results['environment']['commit'] or 'unknown'
+save_benchmarks(results=results, file_path=os.path.join(output_dir, f'{commit[:12]}.json'))
+
+# compare with baseline
+if baseline_path is not None:
+    comparison = compare_benchmarks(baseline=load_benchmarks(file_path=baseline_path), current=results)
+
+    for row in comparison:
+        print(f'{row["name"]:<48} {str(row["params"]):<24} {row["baseline"]:.3e} -> {row["current"]:.3e} sec '
+              f'(x{row["ratio"]:.2f})')
@@ -24,7 +24,7 @@ equation.solve_numerical()
 # plot results
 # _ = plot_results(results=equation.output_data, save_output_fig=True, delete_previous_results=True)
 
-time_keys = list(equation.output_data.total_solutions.keys())
+time_grid = equation.output_data.time_grid
 needed_items = {0: 'k', 2: 'b', 4: 'r', 6: 'y', 8: 'm'}
 
 # plot results
@@ -34,10 +34,10 @@ plt.title('Распределение концентрации C=C(x)', size=20)
 
 for current_idx, current_color in needed_items.items():
     plt.plot(equation.output_data.grid,
-             equation.output_data.total_solutions[time_keys[current_idx]].reshape(-1),
+             equation.output_data.total_solutions[current_idx].reshape(-1),
              f'.-{current_color}',
              markersize=15,
-             label=f'Численное решение в момент времени t = {current_idx} сек')
+             label=f'Численное решение в момент времени t = {time_grid[current_idx]:.1f} сек')
 # plt.ylim(0.0258, 0.02585)
 plt.xlabel('Длина L, м', fontsize=20)
 plt.ylabel('Концентрация C', fontsize=20)
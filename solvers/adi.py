@@ -0,0 +1,203 @@
+import numpy as np
+
+from solvers.tdma import run_tdma, run_tdma_batch
+
+
+def calc_adi_residual(a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, a_n: np.ndarray, a_s: np.ndarray,
+                      b: np.ndarray, x: np.ndarray, result: np.ndarray | None = None) -> np.ndarray:
+    """Residual of 2D discrete analogue a_p * x_P = a_e * x_E + a_w * x_W + a_n * x_N + a_s * x_S + b.
+
+    Parameters
+    ----------
+    a_p, a_e, a_w, a_n, a_s: np.ndarray
+        Coefficients of discrete analogue, shape (nx, ny). Neighbours outside the grid must have zero coefficients.
+    b: np.ndarray
+        Right side of discrete analogue, shape (nx, ny).
+    x: np.ndarray
+        Solution values, shape (nx, ny).
+    result: np.ndarray
+        Residual b + a_e * x_E + a_w * x_W + a_n * x_N + a_s * x_S - a_p * x_P. Allocated if not set.
+
+    Returns
+    ----------
+    result: np.ndarray
+        Residual values, shape (nx, ny).
+
+    """
+
+    if result is None:
+        result = np.empty_like(x)
+
+    np.multiply(a_p, x, out=result)
+    np.subtract(b, result, out=result)
+
+    result[:-1] += a_e[:-1] * x[1:]
+    result[1:] += a_w[1:] * x[:-1]
+    result[:, :-1] += a_n[:, :-1] * x[:, 1:]
+    result[:, 1:] += a_s[:, 1:] * x[:, :-1]
+
+    return result
+
+
+def apply_block_correction(a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, a_n: np.ndarray, a_s: np.ndarray,
+                           residual: np.ndarray, x: np.ndarray, axis: int) -> np.ndarray:
+    """Add correction, which is uniform along every line and satisfies the sum of line equations.
+
+    Summed over a line by Y, the residual equations for the correction of each X position form one tridiagonal system
+    (axis=0), and vice versa for lines by X (axis=1). It removes the smooth error, which line sweeps damp slowly.
+
+    Parameters
+    ----------
+    a_p, a_e, a_w, a_n, a_s: np.ndarray
+        Coefficients of discrete analogue, shape (nx, ny).
+    residual: np.ndarray
+        Residual of x calculated by calc_adi_residual, shape (nx, ny).
+    x: np.ndarray
+        Solution values, corrected in place, shape (nx, ny).
+    axis: int
+        Axis of corrections: 0 for correction by X uniform by Y, 1 for correction by Y uniform by X.
+
+    Returns
+    ----------
+    correction: np.ndarray
+        Correction values, shape (nx,) for axis=0 and (ny,) for axis=1.
+
+    """
+
+    if axis == 0:
+        a_next, a_prev, a_across = a_e, a_w, (a_n, a_s)
+    else:
+        a_next, a_prev, a_across = a_n, a_s, (a_e, a_w)
+
+    # links to neighbours on the same line have the same correction and move to the main diagonal
+    a = (a_p - a_across[0] - a_across[1]).sum(axis=1 - axis)
+    correction = run_tdma(a=a, b=a_next.sum(axis=1 - axis), c=a_prev.sum(axis=1 - axis),
+                          d=residual.sum(axis=1 - axis))
+
+    x += correction[:, None] if axis == 0 else correction[None, :]
+
+    return correction
+
+
+def _set_line_right_side(d: np.ndarray, b: np.ndarray, a_next: np.ndarray, a_prev: np.ndarray, x: np.ndarray,
+                         start: int):
+    """Right side d = b + a_next * x_next + a_prev * x_prev of every second line start, start + 2, ...
+
+    Lines are indexed by the last axis, their neighbours are the lines before and after.
+
+    """
+
+    n = x.shape[1]
+    lines = slice(start, None, 2)
+    np.copyto(d[:, lines], b[:, lines])
+
+    # next lines exist for all lines except the last grid line
+    n_next = len(range(start + 1, n, 2))
+    d[:, lines][:, :n_next] += a_next[:, lines][:, :n_next] * x[:, start + 1::2]
+
+    # previous lines exist for all lines except the first grid line
+    first = 1 if start == 0 else 0
+    n_prev = len(range(start + 2 * first, n, 2))
+    d[:, lines][:, first:] += a_prev[:, lines][:, first:] * x[:, start + 2 * first - 1::2][:, :n_prev]
+
+
+def run_adi_sweep(a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, a_n: np.ndarray, a_s: np.ndarray,
+                  b: np.ndarray, x: np.ndarray, d: np.ndarray, p: np.ndarray, q: np.ndarray, parallel: bool = False):
+    """Single pair of line sweeps by X and by Y, e.g. a smoother of multigrid method.
+
+    Lines of each sweep are solved in zebra order: even lines as one batch, then odd lines as another batch
+    with the updated even neighbours. Unlike simultaneous update of all lines, it damps the error, which is
+    oscillating across the lines and smooth along them.
+
+    Parameters
+    ----------
+    a_p, a_e, a_w, a_n, a_s: np.ndarray
+        Coefficients of discrete analogue, shape (nx, ny).
+    b: np.ndarray
+        Right side of discrete analogue, shape (nx, ny).
+    x: np.ndarray
+        Solution values, updated in place, shape (nx, ny).
+    d, p, q: np.ndarray
+        Workspace buffers for line right sides and TDMA forward sweep, shape (nx, ny).
+    parallel: bool
+        Flag to solve lines of each sweep on all available cores.
+
+    """
+
+    nx, ny = x.shape
+
+    # lines by X: d = b + a_n * x_N + a_s * x_S
+    for start in range(min(2, ny)):
+        lines = (slice(None), slice(start, None, 2))
+        _set_line_right_side(d, b, a_n, a_s, x, start)
+        run_tdma_batch(a=a_p[lines], b=a_e[lines], c=a_w[lines], d=d[lines], result=x[lines], p=p[lines],
+                       q=q[lines], parallel=parallel, axis=0)
+
+    # lines by Y: d = b + a_e * x_E + a_w * x_W
+    for start in range(min(2, nx)):
+        lines = slice(start, None, 2)
+        _set_line_right_side(d.T, b.T, a_e.T, a_w.T, x.T, start)
+        run_tdma_batch(a=a_p[lines], b=a_n[lines], c=a_s[lines], d=d[lines], result=x[lines], p=p[lines],
+                       q=q[lines], parallel=parallel, axis=1)
+
+
+def run_adi(a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, a_n: np.ndarray, a_s: np.ndarray, b: np.ndarray,
+            x: np.ndarray, tol: float = 1E-8, max_iterations: int = 100, workspace: np.ndarray | None = None,
+            parallel: bool = False, block_correction: bool = True) -> tuple[int, float]:
+    """Alternating direction line-by-line TDMA method for 2D discrete analogue.
+
+    Every iteration sweeps lines by X and then lines by Y. Each sweep solves all lines as one batch of
+    tridiagonal systems, neighbours in the other direction are taken from the latest solution values.
+    Sweeps are preceded by block corrections by X and Y, so convergence does not degrade for steady problems
+    on fine grids.
+
+    Parameters
+    ----------
+    a_p, a_e, a_w, a_n, a_s: np.ndarray
+        Coefficients of discrete analogue a_p * x_P = a_e * x_E + a_w * x_W + a_n * x_N + a_s * x_S + b,
+        shape (nx, ny). Neighbours outside the grid must have zero coefficients.
+    b: np.ndarray
+        Right side of discrete analogue, shape (nx, ny).
+    x: np.ndarray
+        Initial guess, overwritten in place by the solution, shape (nx, ny).
+    tol: float
+        Relative residual norm ||r|| / ||b|| to stop iterations.
+    max_iterations: int
+        Maximum number of X and Y sweep pairs.
+    workspace: np.ndarray
+        Workspace buffer, shape (4, nx, ny). Allocated if not set.
+    parallel: bool
+        Flag to solve lines of each sweep on all available cores.
+    block_correction: bool
+        Flag to apply block corrections before every pair of sweeps.
+
+    Returns
+    ----------
+    iterations: int
+        Number of X and Y sweep pairs.
+    residual: float
+        Relative residual norm of the solution.
+
+    """
+
+    if workspace is None:
+        workspace = np.empty(shape=(4, *x.shape), dtype=x.dtype)
+
+    d, p, q, r = workspace
+    b_norm = max(np.linalg.norm(b), np.finfo(np.float64).tiny)
+
+    residual = np.linalg.norm(calc_adi_residual(a_p, a_e, a_w, a_n, a_s, b, x, result=r)) / b_norm
+    iterations = 0
+
+    while residual > tol and iterations < max_iterations:
+        if block_correction:
+            apply_block_correction(a_p, a_e, a_w, a_n, a_s, r, x, axis=0)
+            calc_adi_residual(a_p, a_e, a_w, a_n, a_s, b, x, result=r)
+            apply_block_correction(a_p, a_e, a_w, a_n, a_s, r, x, axis=1)
+
+        run_adi_sweep(a_p, a_e, a_w, a_n, a_s, b, x, d, p, q, parallel=parallel)
+
+        residual = np.linalg.norm(calc_adi_residual(a_p, a_e, a_w, a_n, a_s, b, x, result=r)) / b_norm
+        iterations += 1
+
+    return iterations, residual
@@ -1,7 +1,199 @@
+import logging
+
 import numpy as np
 
-from solvers.diffusion_convection.solver_dataclasses import BoundaryType
-from solvers.tdma import run_tdma
+from solvers.adi import calc_adi_residual, run_adi
+from solvers.diffusion_convection.solver_dataclasses import BoundaryType, TimeScheme
+from solvers.krylov import SparseKrylovSolver
+from solvers.tdma import (MixedPrecisionTdma, Precision, TdmaMethod, calc_tdma_residual, factorize_tdma,
+                          get_precision_dtype, run_tdma, run_tdma_factorized, run_tdma_partitioned)
+from utils.grid import get_grid_spacing
+
+
+# Discrete analogue functions fill (..., nx, ny) arrays in place. Grid axes are the last two, leading axes are
+# independent systems, e.g. ensemble members of shape (n_members, nx, 1). Parameters are broadcast against them.
+
+
+def calc_face_velocity(c: np.ndarray, f_c, coef: float | np.ndarray, u_face: np.ndarray, u_sed_e: np.ndarray,
+                       u_sed_w: np.ndarray):
+    """Calculate U_sed = coef * f_c(C) on internal faces by average concentration of neighbour control volumes.
+
+    Face velocity between control volumes i and i + 1 is the east face velocity of i and the west face velocity
+    of i + 1, walls are impermeable.
+
+    Parameters
+    ----------
+    c: np.ndarray
+        Concentration, shape (..., nx, ny).
+    f_c:
+        Approximation function, called on arrays (NumPy or numba ufunc).
+    coef: float | np.ndarray
+        Constant factor of velocity, scalar or broadcast against faces, e.g. of shape (n_members, 1, 1).
+    u_face: np.ndarray
+        Velocity on internal faces, shape (..., nx - 1, ny).
+    u_sed_e, u_sed_w: np.ndarray
+        Velocity on east and west faces of control volumes, shape (..., nx, ny).
+
+    """
+
+    nx = c.shape[-2]
+
+    np.add(c[..., :nx - 1, :], c[..., 1:, :], out=u_face)
+    u_face *= 0.5
+
+    if isinstance(f_c, np.ufunc):
+        f_c(u_face, out=u_face)
+    else:
+        u_face[...] = f_c(u_face)
+
+    u_face *= coef
+
+    u_sed_e[..., :nx - 1, :] = u_face
+    u_sed_e[..., nx - 1, :] = 0.0
+
+    u_sed_w[..., 1:, :] = u_face
+    u_sed_w[..., 0, :] = 0.0
+
+
+def initialize_dirichlet_coefficients(a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, b: np.ndarray,
+                                      c_wall_left: float | np.ndarray, c_wall_right: float | np.ndarray):
+    """Initialize boundary control volumes by wall values: ghost nodes are mirrored, so the wall value is the
+    average of the ghost and the first internal node.
+
+    Parameters
+    ----------
+    a_p, a_e, a_w, b: np.ndarray
+        Discrete analogue, shape (..., nx, ny).
+    c_wall_left, c_wall_right: float | np.ndarray
+        Wall values, scalar or broadcast against boundary rows, e.g. of shape (n_members, 1).
+
+    """
+
+    a_e[..., 0, :] = -1.0
+    a_w[..., 0, :] = 0.0
+    a_p[..., 0, :] = 1.0
+    b[..., 0, :] = 2.0 * c_wall_left
+
+    a_e[..., -1, :] = 0.0
+    a_w[..., -1, :] = -1.0
+    a_p[..., -1, :] = 1.0
+    b[..., -1, :] = 2.0 * c_wall_right
+
+
+def initialize_internal_coefficients(a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, u_sed_e: np.ndarray,
+                                     u_sed_w: np.ndarray, d_dx_e: np.ndarray, d_dx_w: np.ndarray,
+                                     dx_dt: float | np.ndarray, sp_dx: np.ndarray | None = None, theta: float = 1.0,
+                                     transient: float = 1.0):
+    """Initialize a_p, a_e and a_w of internal control volumes by upwind convection and central diffusion.
+
+    Parameters
+    ----------
+    a_p, a_e, a_w: np.ndarray
+        Coefficients of discrete analogue, shape (..., nx, ny).
+    u_sed_e, u_sed_w: np.ndarray
+        Velocity on east and west faces, shape (..., nx, ny).
+    d_dx_e, d_dx_w: np.ndarray
+        Diffusion conductances of east and west faces, broadcast against internal control volumes.
+    dx_dt: float | np.ndarray
+        Transient coefficients dx_p / dt, broadcast against internal control volumes.
+    sp_dx: np.ndarray | None
+        Implicit source slope multiplied by control volume widths, no source if None.
+    theta: float
+        Weight of implicit spatial terms, 0.5 for Crank-Nicolson.
+    transient: float
+        Factor of transient term, 1.5 for BDF2.
+
+    """
+
+    nx = a_p.shape[-2]
+
+    a_e = a_e[..., 1:nx - 1, :]
+    a_w = a_w[..., 1:nx - 1, :]
+    a_p = a_p[..., 1:nx - 1, :]
+    u_sed_e = u_sed_e[..., 1:nx - 1, :]
+    u_sed_w = u_sed_w[..., 1:nx - 1, :]
+
+    np.negative(u_sed_e, out=a_e)
+    np.maximum(a_e, 0.0, out=a_e)
+    a_e += d_dx_e
+
+    np.maximum(u_sed_w, 0.0, out=a_w)
+    a_w += d_dx_w
+
+    np.subtract(u_sed_e, u_sed_w, out=a_p)
+
+    # implicit part of the source
+    if sp_dx is not None:
+        a_p -= sp_dx
+
+    if theta == 1.0 and transient == 1.0:
+        a_p += dx_dt + d_dx_e + d_dx_w
+    else:
+        # spatial terms are weighted by theta, transient term is scaled for BDF2
+        a_p += d_dx_e + d_dx_w
+
+        if theta != 1.0:
+            a_e *= theta
+            a_w *= theta
+            a_p *= theta
+
+        a_p += transient * dx_dt
+
+
+def initialize_internal_right_side(b: np.ndarray, old_solution: np.ndarray, dx_dt: float | np.ndarray,
+                                   previous_solution: np.ndarray | None = None, sc_dx: np.ndarray | None = None):
+    """Initialize right side of internal control volumes by the previous time layers.
+
+    Parameters
+    ----------
+    b: np.ndarray
+        Right side of discrete analogue, shape (..., nx, ny).
+    old_solution: np.ndarray
+        The previous time layer, shape (..., nx, ny).
+    dx_dt: float | np.ndarray
+        Transient coefficients dx_p / dt, broadcast against internal control volumes.
+    previous_solution: np.ndarray | None
+        The layer before the previous one for BDF2, backward Euler if None.
+    sc_dx: np.ndarray | None
+        Weighted constant part of the source multiplied by control volume widths, no source if None.
+
+    """
+
+    nx = b.shape[-2]
+    b = b[..., 1:nx - 1, :]
+
+    if previous_solution is None:
+        np.multiply(old_solution[..., 1:nx - 1, :], dx_dt, out=b)
+    else:
+        np.multiply(old_solution[..., 1:nx - 1, :], 2.0, out=b)
+        b -= 0.5 * previous_solution[..., 1:nx - 1, :]
+        b *= dx_dt
+
+    if sc_dx is not None:
+        b += sc_dx
+
+
+def relax_iterate(solution: np.ndarray, iterate: np.ndarray, increment: np.ndarray, relaxation: float):
+    """Under-relaxed update of nonlinear iterate: solution = iterate + relaxation * (solution - iterate).
+
+    Parameters
+    ----------
+    solution: np.ndarray
+        Solution of the linearized discrete analogue, replaced by the relaxed one.
+    iterate: np.ndarray
+        The previous iterate.
+    increment: np.ndarray
+        Buffer for the relaxed increment solution - iterate.
+    relaxation: float
+        Under-relaxation factor, no relaxation if 1.
+
+    """
+
+    np.subtract(solution, iterate, out=increment)
+
+    if relaxation != 1.0:
+        increment *= relaxation
+        np.add(iterate, increment, out=solution)
 
 
 class FiniteVolumeScheme:
@@ -17,7 +209,17 @@ class FiniteVolumeScheme:
                  c_wall_right: float,
                  c_initial: float,
                  boundary_type: BoundaryType,
-                 q_source: float):
+                 q_source: float,
+                 tdma_method: TdmaMethod = TdmaMethod.THOMAS,
+                 frozen_operator: bool = False,
+                 adi_tol: float = 1E-10,
+                 adi_max_iterations: int = 100,
+                 sparse_solver: SparseKrylovSolver | None = None,
+                 precision: Precision = Precision.DOUBLE,
+                 refinement_tol: float = 1E-10,
+                 refinement_max_iterations: int = 10,
+                 x_grid: np.ndarray | None = None,
+                 time_scheme: TimeScheme = TimeScheme.EULER):
         """Finite volume method scheme by describing discrete analogue of the equation.
 
         Parameters
@@ -29,7 +231,7 @@ class FiniteVolumeScheme:
         nt: int
             Number of time points..
         dx: float
-            Step size in X direction.
+            Step size in X direction of uniform grid.
         dy: float
             Step size in Y direction.
         dt: float
@@ -46,6 +248,34 @@ class FiniteVolumeScheme:
             Boundary condition type.
         q_source : float
             Source value.
+        tdma_method : TdmaMethod
+            Tridiagonal solver algorithm. For 2D grid partitioned method solves lines of ADI sweeps on all cores.
+        frozen_operator : bool
+            Flag to reuse TDMA forward sweep while a_p, a_e and a_w are constant (Thomas algorithm, 1D grid only).
+        adi_tol : float
+            Relative residual norm to stop ADI iterations on 2D grid.
+        adi_max_iterations : int
+            Maximum number of ADI iterations on 2D grid.
+        sparse_solver : SparseKrylovSolver
+            Sparse Krylov solver used instead of TDMA and ADI iterations if set. Frozen operator keeps its matrix
+            and preconditioner.
+        precision : Precision
+            Floating point precision of discrete analogue, solution and TDMA solve. Mixed precision is implemented
+            for Thomas algorithm on 1D grid only.
+        refinement_tol : float
+            Relative residual norm to stop iterative refinement of mixed precision TDMA.
+        refinement_max_iterations : int
+            Maximum number of refinement steps of mixed precision TDMA.
+        x_grid : np.ndarray
+            Node coordinates by X of non-uniform grid, shape (nx,). Uniform grid with step dx if None.
+        time_scheme : TimeScheme
+            Time integration scheme. Scheme of every time step is set by start_time_step, so start-up steps of
+            second order schemes are solved by backward Euler.
+
+        Notes
+        ----------
+        On 2D grid walls by Y are impermeable, control volumes next to them have a half height.
+        Control volume faces by X are halfway between neighbour nodes.
 
         """
 
@@ -53,99 +283,434 @@ class FiniteVolumeScheme:
         self._ny: int = ny
         self._nt: int = nt
 
-        self._dx_e: float = dx
-        self._dx_w: float = dx
+        # distances to neighbour nodes and control volume widths by X as columns, broadcast along Y
+        if x_grid is None:
+            dx_e, dx_w, dx_p = (np.full(shape=self._nx, fill_value=dx) for _ in range(3))
+        else:
+            dx_e, dx_w, dx_p = get_grid_spacing(x_grid)
+
+        self._dx_e: np.ndarray = dx_e[:, None]
+        self._dx_w: np.ndarray = dx_w[:, None]
+        self._dx_p: np.ndarray = dx_p[:, None]
         self._dy_n: float = dy
         self._dy_s: float = dy
 
-        self._dx: float = dx
         self._dy: float = dy
         self._dt: float = dt
 
-        self._d_e: float = d
-        self._d_w: float = d
+        # diffusion coefficients on faces by X as columns and by Y as scalars
+        self._d_e: np.ndarray = np.full(shape=(self._nx, 1), fill_value=d)
+        self._d_w: np.ndarray = np.full(shape=(self._nx, 1), fill_value=d)
         self._d_s: float = d
         self._d_n: float = d
 
+        # diffusion conductances of faces by X, constant for the grid, and transient coefficients of the time step
+        self._d_dx_e: np.ndarray = self._d_e / self._dx_e
+        self._d_dx_w: np.ndarray = self._d_w / self._dx_w
+        self._dx_dt: np.ndarray = self._dx_p / self._dt
+        self._dx_dt_step: float = self._dt
+
         self._c_left_wall = c_wall_left
         self._c_right_wall = c_wall_right
         self._c_initial = c_initial
 
-        self._a_p: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._a_e: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._a_w: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._a_n: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._a_s: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._b: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-
-        self._u_sed: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._u_sed_e: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._u_sed_w: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._u_sed_n: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._u_sed_s: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-
-        self._current_solution: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._old_solution: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
+        self._precision: Precision = precision
+        self._dtype: type = get_precision_dtype(precision)
+
+        self._a_p: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._a_e: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._a_w: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._a_n: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._a_s: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._b: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        self._u_sed: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._u_sed_e: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._u_sed_w: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._u_sed_n: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._u_sed_s: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        self._current_solution: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._old_solution: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        # TDMA workspace buffers
+        self._p: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._q: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        self._tdma_method: TdmaMethod = tdma_method
+        self._tdma_workspace: np.ndarray | None = None
+
+        if self._tdma_method == TdmaMethod.PARTITIONED:
+            self._tdma_workspace = np.zeros(shape=(3, self._nx), dtype=self._dtype)
+
+        # cached TDMA forward sweep, valid while the operator state is unchanged
+        self._sparse_solver: SparseKrylovSolver | None = sparse_solver
+        self._frozen_operator: bool = frozen_operator and (self._sparse_solver is not None or
+                                                           self._tdma_method == TdmaMethod.THOMAS and self._ny == 1)
+        self._tdma_denominator: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._operator_state: tuple | None = None
+
+        # float32 TDMA with float64 iterative refinement
+        self._mixed_tdma: MixedPrecisionTdma | None = None
+        self._refinement_tol: float = refinement_tol
+
+        if self._precision == Precision.MIXED:
+            if self._ny > 1 or self._sparse_solver is not None or self._tdma_method != TdmaMethod.THOMAS:
+                raise ValueError('Mixed precision is implemented for Thomas algorithm on 1D grid only!')
+
+            self._mixed_tdma = MixedPrecisionTdma(n=self._nx, tol=refinement_tol,
+                                                  max_iterations=refinement_max_iterations)
+
         self._boundary_type: BoundaryType = boundary_type
         self._q_source: float = q_source
 
+        # linearized volumetric source of internal control volumes, set by set_source (disabled by default)
+        self._sc: np.ndarray | None = None
+        self._sp: np.ndarray | None = None
+
+        # time integration, the layer before the old one is kept for BDF2 and Rannacher start-up of Crank-Nicolson
+        self._time_scheme: TimeScheme = time_scheme
+        self._step_scheme: TimeScheme = TimeScheme.EULER
+        self._n_time_steps: int = 0
+        self._previous_solution: np.ndarray | None = None
+        self._explicit_part: np.ndarray | None = None
+        self._explicit_part_valid: bool = False
+
+        if self._time_scheme != TimeScheme.EULER:
+            self._previous_solution = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        if self._time_scheme == TimeScheme.CRANK_NICOLSON:
+            self._explicit_part = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        # control volume heights and ADI workspace on 2D grid
+        self._dy_p: np.ndarray | None = None
+        # float32 residual norm is not reduced below the single precision rounding error
+        self._adi_tol: float = max(adi_tol, float(np.finfo(self._dtype).eps))
+        self._adi_max_iterations: int = adi_max_iterations
+        self._adi_workspace: np.ndarray | None = None
+        self._adi_iterations: int = 0
+        self._adi_residual: float = 0.0
+
+        if self._ny > 1:
+            self._dy_p = np.full(shape=self._ny, fill_value=self._dy, dtype=self._dtype)
+            self._dy_p[[0, -1]] = 0.5 * self._dy
+            self._adi_workspace = np.zeros(shape=(4, self._nx, self._ny), dtype=self._dtype)
+
+    def _get_operator_state(self) -> tuple:
+        """Scalar parameters a_p, a_e and a_w depend on. Velocity, grid and diffusion coefficient changes are
+        tracked by invalidate_operator.
+        """
+
+        return self._boundary_type, self._dt, self._step_scheme
+
+    def _get_time_weights(self) -> tuple[float, float]:
+        """Weight of implicit spatial terms and factor of transient term of the current time step.
+        """
+
+        if self._step_scheme == TimeScheme.CRANK_NICOLSON:
+            return 0.5, 1.0
+
+        if self._step_scheme == TimeScheme.BDF2:
+            return 1.0, 1.5
+
+        return 1.0, 1.0
+
+    def get_step_scheme(self) -> TimeScheme:
+        """Scheme of the next time step: backward Euler for steady equation and the first BDF2 step without
+        the previous layer.
+        """
+
+        if not np.isfinite(self._dt):
+            return TimeScheme.EULER
+
+        if self._time_scheme == TimeScheme.BDF2 and self._n_time_steps == 0:
+            return TimeScheme.EULER
+
+        return self._time_scheme
+
+    def start_time_step(self, step_scheme: TimeScheme):
+        """Set scheme of the next time step. Explicit part of Crank-Nicolson is calculated again by the old layer
+        and the first discrete analogue of the step.
+        """
+
+        self._step_scheme = step_scheme
+        self._explicit_part_valid = False
+
+    def finish_time_step(self):
+        """Keep the old layer for BDF2 before it is replaced by the new one.
+        """
+
+        if self._time_scheme == TimeScheme.BDF2:
+            np.copyto(self._previous_solution, self._old_solution)
+
+        self._n_time_steps += 1
+
+    def invalidate_operator(self):
+        """Drop cached TDMA forward sweep, so the operator is assembled and factorized again.
+        """
+
+        self._operator_state = None
+
+    def set_source(self, sc: float | np.ndarray, sp: float | np.ndarray, x: np.ndarray):
+        """Set linearized volumetric source s = sc + sp * C of internal control volumes.
+
+        Negative slope is added to a_p, so a stiff loss term is implicit and a_p stays dominant. Positive slope
+        is moved to the constant part by the latest solution x. The operator is assembled again only if the
+        implicit slope is changed.
+
+        Parameters
+        ----------
+        sc: float | np.ndarray
+            Constant part, scalar or field of shape (nx,) or (nx, ny).
+        sp: float | np.ndarray
+            Slope, scalar or field of shape (nx,) or (nx, ny).
+        x: np.ndarray
+            The latest solution, shape (nx, ny).
+
+        """
+
+        shape = (self._nx, self._ny)
+        sc = np.asarray(sc, dtype=self._dtype)
+        sp = np.asarray(sp, dtype=self._dtype)
+
+        # fields by X are broadcast along Y
+        sc = np.broadcast_to(sc[:, None] if sc.ndim == 1 else sc, shape)
+        sp = np.broadcast_to(sp[:, None] if sp.ndim == 1 else sp, shape)
+
+        if self._sc is None:
+            self._sc = np.zeros(shape=shape, dtype=self._dtype)
+            self._sp = np.zeros(shape=shape, dtype=self._dtype)
+            self.invalidate_operator()
+
+        np.maximum(sp, 0.0, out=self._sc)
+        self._sc *= x
+        self._sc += sc
+
+        sp_implicit = np.minimum(sp, 0.0)
+
+        if not np.array_equal(sp_implicit, self._sp):
+            np.copyto(self._sp, sp_implicit)
+            self.invalidate_operator()
+
+    def _get_dx_dt(self) -> np.ndarray:
+        """Transient coefficients dx_p / dt of control volumes, recalculated if the time step is changed.
+        """
+
+        if self._dx_dt_step != self._dt:
+            np.divide(self._dx_p, self._dt, out=self._dx_dt)
+            self._dx_dt_step = self._dt
+
+        return self._dx_dt
+
+    def set_x_grid(self, x_grid: np.ndarray):
+        """Move nodes by X to new coordinates, e.g. for solution-adaptive grid. The number of nodes is kept.
+        """
+
+        if x_grid.size != self._nx:
+            raise ValueError('New grid must have the same number of nodes!')
+
+        dx_e, dx_w, dx_p = get_grid_spacing(x_grid)
+
+        self._dx_e[:, 0] = dx_e
+        self._dx_w[:, 0] = dx_w
+        self._dx_p[:, 0] = dx_p
+
+        np.divide(self._d_e, self._dx_e, out=self._d_dx_e)
+        np.divide(self._d_w, self._dx_w, out=self._d_dx_w)
+        np.divide(self._dx_p, self._dt, out=self._dx_dt)
+        self._dx_dt_step = self._dt
+
+        self.invalidate_operator()
+
     def initialize_discrete_analogue(self):
         """Initialize discrete analogue by scheme.
         """
 
-        if self._boundary_type == BoundaryType.Dirichlet:
-            self._a_e[0] = -1.0
-            self._a_w[0] = 0.0
-            self._a_p[0] = 1.0
-            self._b[0] = 2.0 * self._c_left_wall
+        # only the right side changes while the operator is frozen
+        if self._frozen_operator and self._operator_state == self._get_operator_state():
+            self._initialize_right_side()
+            return
 
-            self._a_e[self._nx - 1] = 0.0
-            self._a_w[self._nx - 1] = -1.0
-            self._a_p[self._nx - 1] = 1.0
-            self._b[self._nx - 1] = 2.0 * self._c_right_wall
+        self._operator_state = None
+
+        if self._boundary_type == BoundaryType.Dirichlet:
+            initialize_dirichlet_coefficients(a_p=self._a_p, a_e=self._a_e, a_w=self._a_w, b=self._b,
+                                              c_wall_left=self._c_left_wall, c_wall_right=self._c_right_wall)
 
         if self._boundary_type == BoundaryType.Neumann:
             self._a_e[0] = 1.0
             self._a_w[0] = 0.0
             self._a_p[0] = 1.0
-            self._b[0] = -self._q_source / self._d_e * self._dx_e
+            self._b[0] = -self._q_source / self._d_e[0] * self._dx_e[0]
 
             self._a_e[self._nx - 1] = 0.0
             self._a_w[self._nx - 1] = 1.0
             self._a_p[self._nx - 1] = 1.0
-            self._b[self._nx - 1] = self._q_source / self._d_w * self._dx_w
+            self._b[self._nx - 1] = self._q_source / self._d_w[self._nx - 1] * self._dx_w[self._nx - 1]
 
         if self._boundary_type == BoundaryType.Robin:
-            self._a_e[0] = 1.0 - self._u_sed_e[0] * self._dx_e / (2.0 * self._d_e)
+            self._a_e[0] = 1.0 - self._u_sed_e[0] * self._dx_e[0] / (2.0 * self._d_e[0])
             self._a_w[0] = 0.0
-            self._a_p[0] = 1.0 + self._u_sed_e[0] * self._dx_e / (2.0 * self._d_e)
+            self._a_p[0] = 1.0 + self._u_sed_e[0] * self._dx_e[0] / (2.0 * self._d_e[0])
             self._b[0] = 0.0
 
             self._a_e[self._nx - 1] = 0.0
-            self._a_w[self._nx - 1] = 1.0 + self._u_sed_w[self._nx - 1] * self._dx_w / (2.0 * self._d_w)
-            self._a_p[self._nx - 1] = 1.0 - self._u_sed_w[self._nx - 1] * self._dx_w / (2.0 * self._d_w)
+            self._a_w[self._nx - 1] = (1.0 + self._u_sed_w[self._nx - 1] * self._dx_w[self._nx - 1] /
+                                       (2.0 * self._d_w[self._nx - 1]))
+            self._a_p[self._nx - 1] = (1.0 - self._u_sed_w[self._nx - 1] * self._dx_w[self._nx - 1] /
+                                       (2.0 * self._d_w[self._nx - 1]))
             self._b[self._nx - 1] = 0.0
 
-        for i in range(1, self._nx - 1):
-            self._a_e[i] = self._d_e / self._dx_e + max(-self._u_sed_e[i], 0.0)
-            self._a_w[i] = self._d_w / self._dx_w + max(self._u_sed_w[i], 0.0)
-            self._a_p[i] = self._dx / self._dt + self._d_e / self._dx_e + self._d_w / self._dx_w + (self._u_sed_e[i] - self._u_sed_w[i])
-            self._b[i] = self._dx / self._dt * self._old_solution[i]
+        # internal control volumes, filled in place by whole-array operations
+        nx = self._nx
+        theta, transient = self._get_time_weights()
+
+        initialize_internal_coefficients(
+            a_p=self._a_p,
+            a_e=self._a_e,
+            a_w=self._a_w,
+            u_sed_e=self._u_sed_e,
+            u_sed_w=self._u_sed_w,
+            d_dx_e=self._d_dx_e[1:nx - 1],
+            d_dx_w=self._d_dx_w[1:nx - 1],
+            dx_dt=self._get_dx_dt()[1:nx - 1],
+            sp_dx=None if self._sp is None else self._sp[1:nx - 1] * self._dx_p[1:nx - 1],
+            theta=theta,
+            transient=transient
+        )
+
+        if self._ny > 1:
+            self._initialize_y_coefficients()
+
+        self._initialize_right_side()
+
+    def _initialize_y_coefficients(self):
+        """Scale internal control volumes by their heights and add diffusion fluxes by Y on 2D grid.
+        """
+
+        a_e = self._a_e[1:self._nx - 1]
+        a_w = self._a_w[1:self._nx - 1]
+        a_p = self._a_p[1:self._nx - 1]
+        a_n = self._a_n[1:self._nx - 1]
+        a_s = self._a_s[1:self._nx - 1]
+
+        a_e *= self._dy_p
+        a_w *= self._dy_p
+        a_p *= self._dy_p
+
+        # impermeable walls by Y
+        theta = self._get_time_weights()[0]
+        a_n[:, :self._ny - 1] = theta * self._d_n * self._dx_p[1:self._nx - 1] / self._dy_n
+        a_n[:, self._ny - 1] = 0.0
+        a_s[:, 1:] = theta * self._d_s * self._dx_p[1:self._nx - 1] / self._dy_s
+        a_s[:, 0] = 0.0
+
+        a_p += a_n
+        a_p += a_s
+
+    def _initialize_right_side(self):
+        """Initialize right side of discrete analogue for internal control volumes.
+
+        BDF2 uses two previous layers. Crank-Nicolson adds explicit spatial terms -theta * A * C_old, which equal
+        to the residual of the first discrete analogue of the step on the old layer with the backward Euler right side.
+        The constant part of the source is weighted like the other spatial terms.
+
+        """
+
+        nx = self._nx
+        sc_dx = None
+
+        if self._sc is not None:
+            sc_dx = self._get_time_weights()[0] * self._sc[1:nx - 1] * self._dx_p[1:nx - 1]
+
+        initialize_internal_right_side(
+            b=self._b,
+            old_solution=self._old_solution,
+            dx_dt=self._get_dx_dt()[1:nx - 1],
+            previous_solution=self._previous_solution if self._step_scheme == TimeScheme.BDF2 else None,
+            sc_dx=sc_dx
+        )
+
+        b = self._b[1:nx - 1]
+
+        if self._ny > 1:
+            b *= self._dy_p
+
+        if self._step_scheme == TimeScheme.CRANK_NICOLSON:
+            if not self._explicit_part_valid:
+                self.calc_residual(x=self._old_solution, result=self._explicit_part)
+                self._explicit_part_valid = True
+
+            b -= self._explicit_part[1:nx - 1]
 
     def update_u_sed(self):
         """Update velocity by concentration.
         """
 
-        self._u_sed_w = self._u_sed
-        self._u_sed_e = self._u_sed
-        self._u_sed_n = self._u_sed
-        self._u_sed_s = self._u_sed
+        # values are copied, so face velocities never share memory with each other
+        np.copyto(self._u_sed_w, self._u_sed)
+        np.copyto(self._u_sed_e, self._u_sed)
+        np.copyto(self._u_sed_n, self._u_sed)
+        np.copyto(self._u_sed_s, self._u_sed)
+
+        self.invalidate_operator()
+
+    def calc_residual(self, x: np.ndarray, result: np.ndarray) -> np.ndarray:
+        """Residual a_p * x_P - a_e * x_E - a_w * x_W - a_n * x_N - a_s * x_S - b of discrete analogue.
+        """
+
+        if self._ny == 1:
+            return calc_tdma_residual(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, x=x, result=result)
+
+        calc_adi_residual(self._a_p, self._a_e, self._a_w, self._a_n, self._a_s, self._b, x, result=result)
+
+        return np.negative(result, out=result)
 
     def solve_equation(self):
-        """Solve the equation by TDMA algorithm.
+        """Solve the equation by TDMA algorithm, by ADI iterations on 2D grid or by sparse Krylov solver.
         """
 
-        run_tdma(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, result=self._current_solution)
+        if self._sparse_solver is not None:
+            if not self._frozen_operator or self._operator_state is None:
+                self._sparse_solver.set_operator(self._a_p, self._a_e, self._a_w, self._a_n, self._a_s)
+                self._operator_state = self._get_operator_state() if self._frozen_operator else None
+
+            # начальное приближение - предыдущее решение
+            self._sparse_solver.solve(b=self._b, x=self._current_solution)
+        elif self._ny > 1:
+            self._adi_iterations, self._adi_residual = run_adi(
+                self._a_p, self._a_e, self._a_w, self._a_n, self._a_s, self._b, self._current_solution,
+                tol=self._adi_tol, max_iterations=self._adi_max_iterations, workspace=self._adi_workspace,
+                parallel=self._tdma_method == TdmaMethod.PARTITIONED)
+
+            if self._adi_residual > self._adi_tol:
+                logging.warning(f'ADI iterations did not converge, residual = {self._adi_residual}')
+        elif self._mixed_tdma is not None:
+            if not self._frozen_operator or self._operator_state is None:
+                self._mixed_tdma.factorize(a=self._a_p, b=self._a_e, c=self._a_w)
+                self._operator_state = self._get_operator_state() if self._frozen_operator else None
+
+            self._mixed_tdma.solve(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, x=self._current_solution)
+
+            # refinement diverges if the condition number exceeds the float32 resolution
+            if self._mixed_tdma.residual > self._refinement_tol:
+                logging.warning(f'Iterative refinement did not converge, residual = {self._mixed_tdma.residual}, '
+                                f'solved in double precision')
+                run_tdma(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, result=self._current_solution, p=self._p,
+                         q=self._q)
+        elif self._tdma_method == TdmaMethod.PARTITIONED:
+            run_tdma_partitioned(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, result=self._current_solution,
+                                 workspace=self._tdma_workspace)
+        elif self._frozen_operator:
+            if self._operator_state is None:
+                factorize_tdma(a=self._a_p, b=self._a_e, c=self._a_w, p=self._p, denominator=self._tdma_denominator)
+                self._operator_state = self._get_operator_state()
+
+            run_tdma_factorized(c=self._a_w, p=self._p, denominator=self._tdma_denominator, d=self._b,
+                                result=self._current_solution, q=self._q)
+        else:
+            run_tdma(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, result=self._current_solution, p=self._p,
+                     q=self._q)
 
     @property
     def current_solution(self):
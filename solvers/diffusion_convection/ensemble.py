@@ -0,0 +1,314 @@
+import logging
+
+import numpy as np
+
+from solvers.diffusion_convection.discrete_analogue import (calc_face_velocity, initialize_dirichlet_coefficients,
+                                                            initialize_internal_coefficients,
+                                                            initialize_internal_right_side, relax_iterate)
+from solvers.diffusion_convection.solver_dataclasses import NonlinearMethod, TimeScheme
+from solvers.tdma import Precision, TdmaMethod, calc_tdma_batch_residual, get_precision_dtype, run_tdma_batch
+from utils.common import timer
+from utils.grid import get_x_grid
+from utils.history import SolutionHistory
+
+# input data fields, which may differ between ensemble members
+ENSEMBLE_FIELDS = ('d', 'c_init', 'c_wall_left', 'c_wall_right', 'const_u_sed', 'g', 'r0', 'rho1', 'rho2', 'mu2')
+
+
+class EnsembleDiffusionConvection:
+    @timer
+    def __init__(self, input_data, members: dict[str, np.ndarray | list]):
+        """Solve 1D unsteady diffusion convection equation for an ensemble of parameter sets at once.
+
+        Coefficient arrays have shape (n_members, nx, 1): the arrays of 1D FiniteVolumeScheme with a leading member
+        axis. Every time step assembles discrete analogues of all members by the same functions as the scheme and
+        solves them by one batched TDMA call. The discretization is the same as in DiffsuionConvection with Dirichlet
+        boundary conditions, fixed time step and Picard iterations.
+
+        Parameters
+        ----------
+        input_data :
+            Input data for equation. Includes domain and parameters shared by all members.
+        members: dict[str, np.ndarray | list]
+            Values of each member for fields listed in ENSEMBLE_FIELDS, all of the same length n_members.
+            Fields, which are not set, are taken from input data.
+
+        Notes
+        ----------
+        Solutions of all members are saved in memory with shape (n_saved, n_members, nx), in float32 for single
+        precision. Steady state detection, adaptive time step, checkpoints, HDF5 output and mixed precision
+        are not supported.
+
+        """
+
+        logging.info('Start initialization ensemble grid and solver data...')
+
+        # read and parse input/output data
+        self._input_data = input_data
+        self._grid_time_data = self._input_data.grid_time_data
+        self._equation_input_data = self._input_data.equation_input_data
+        self._equation_output_data = self._input_data.equation_output_data
+
+        if self._grid_time_data.ny > 1:
+            raise ValueError('Ensemble mode is implemented for 1D grid only!')
+
+        if get_x_grid(self._grid_time_data) is not None:
+            raise ValueError('Ensemble mode is implemented for uniform grid only!')
+
+        if self._grid_time_data.adaptive_grid_stride is not None:
+            raise ValueError('Ensemble mode is implemented for static grid only!')
+
+        if self._grid_time_data.time_scheme != TimeScheme.EULER:
+            raise ValueError('Ensemble mode is implemented for backward Euler only!')
+
+        if self._grid_time_data.adaptive_time_step:
+            raise ValueError('Ensemble mode needs fixed time step, adaptive time step is not supported!')
+
+        if (self._equation_input_data.source is not None or np.any(self._equation_input_data.sc != 0.0) or
+                np.any(self._equation_input_data.sp != 0.0)):
+            raise ValueError('Ensemble mode does not support volumetric source!')
+
+        if self._equation_input_data.nonlinear_method == NonlinearMethod.NEWTON:
+            raise ValueError('Ensemble mode supports Picard iterations only!')
+
+        if self._equation_input_data.precision == Precision.MIXED:
+            raise ValueError('Ensemble mode supports double and single precision only!')
+
+        unknown = set(members) - set(ENSEMBLE_FIELDS)
+
+        if unknown:
+            raise ValueError(f'Unknown ensemble fields {sorted(unknown)}, expected some of {ENSEMBLE_FIELDS}!')
+
+        sizes = {np.size(values) for values in members.values()}
+
+        if len(sizes) != 1:
+            raise ValueError(f'Ensemble fields must have the same number of members, got sizes {sorted(sizes)}!')
+
+        # parse grid and time parameters
+        self._length = self._grid_time_data.x_length
+        self._nx: int = self._grid_time_data.nx
+        self._nt: int = self._grid_time_data.nt
+        self._n_members: int = sizes.pop()
+        self._total_time = self._grid_time_data.total_time
+
+        self._dx: float = self._length / (self._nx - 1)
+        self._dt: float = self._total_time / (self._nt - 1)
+        self._dtype: type = get_precision_dtype(self._equation_input_data.precision)
+
+        # parameters of members, broadcast along the grid axes
+        values = {name: self._get_member_values(members, name) for name in ENSEMBLE_FIELDS}
+
+        self._d: np.ndarray = values['d']
+        self._c_init: np.ndarray = values['c_init']
+        self._c_wall_left: np.ndarray = values['c_wall_left']
+        self._c_wall_right: np.ndarray = values['c_wall_right']
+        self._u_sed_coef: np.ndarray = (values['const_u_sed'] * values['r0'] ** 2.0 * values['g'] *
+                                        (values['rho1'] - values['rho2']) / values['mu2'])
+
+        shape = (self._n_members, self._nx, 1)
+
+        self._a_p: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._a_e: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._a_w: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._b: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+
+        self._u_sed_e: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._u_sed_w: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._u_sed_face: np.ndarray = np.zeros(shape=(self._n_members, self._nx - 1, 1), dtype=self._dtype)
+
+        self._current_solution: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._old_solution: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._iterate: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._residual: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+
+        # TDMA workspace buffers
+        self._p: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._q: np.ndarray = np.zeros(shape=shape, dtype=self._dtype)
+        self._parallel: bool = self._equation_input_data.tdma_method == TdmaMethod.PARTITIONED
+
+        # nonlinear iterations for concentration-dependent velocity
+        self._concentration_dependent_u_sed: bool = self._equation_input_data.concentration_dependent_u_sed
+        self._nonlinear_max_iterations: int = max(1, self._equation_input_data.nonlinear_max_iterations)
+        self._nonlinear_relaxation: float = self._equation_input_data.nonlinear_relaxation
+        self._nonlinear_residual_tol: float = self._equation_input_data.nonlinear_residual_tol
+        self._nonlinear_increment_tol: float = self._equation_input_data.nonlinear_increment_tol
+        self._nonlinear_iterations = SolutionHistory(n_saved=self._nt, shape=(), dtype=np.int64)
+        self._nonlinear_residuals = SolutionHistory(n_saved=self._nt, shape=())
+
+        # solutions of all members by each saved time layer
+        self._save_stride: int = max(1, self._grid_time_data.save_stride)
+        self._n_saved: int = -(-(self._nt - 1) // self._save_stride) + 1
+        self._solutions = SolutionHistory(n_saved=self._n_saved, shape=(self._n_members, self._nx), dtype=self._dtype)
+
+        self._equation_output_data.grid = np.linspace(start=0.0, stop=self._length, num=self._nx)
+        self._equation_output_data.y_grid = None
+        self._equation_output_data.numerical_solution = self._current_solution[..., 0]
+
+        logging.info('End initialization ensemble grid and solver data.')
+
+    def _get_member_values(self, members: dict, name: str) -> np.ndarray:
+        """Values of the field for every member, shape (n_members, 1, 1).
+        """
+
+        values = members.get(name, getattr(self._equation_input_data, name))
+        values = np.broadcast_to(np.asarray(values, dtype=self._dtype).reshape(-1), (self._n_members,))
+
+        return values[:, None, None].copy()
+
+    def _calc_u_sed(self, c: np.ndarray):
+        """Calculate U_sed by C values on control volume faces of all members, walls are impermeable.
+        """
+
+        calc_face_velocity(c=c, f_c=self._equation_input_data.f_c, coef=self._u_sed_coef, u_face=self._u_sed_face,
+                           u_sed_e=self._u_sed_e, u_sed_w=self._u_sed_w)
+
+    def _initialize_operator(self):
+        """Initialize a_p, a_e and a_w of all members by face velocities and b of walls by wall values.
+        """
+
+        initialize_dirichlet_coefficients(a_p=self._a_p, a_e=self._a_e, a_w=self._a_w, b=self._b,
+                                          c_wall_left=self._c_wall_left[:, 0], c_wall_right=self._c_wall_right[:, 0])
+
+        d_dx = self._d / self._dx
+
+        initialize_internal_coefficients(a_p=self._a_p, a_e=self._a_e, a_w=self._a_w, u_sed_e=self._u_sed_e,
+                                         u_sed_w=self._u_sed_w, d_dx_e=d_dx, d_dx_w=d_dx, dx_dt=self._dx / self._dt)
+
+    def _initialize_right_side(self):
+        """Initialize right side of discrete analogues of internal control volumes by the previous time layer.
+        """
+
+        initialize_internal_right_side(b=self._b, old_solution=self._old_solution, dx_dt=self._dx / self._dt)
+
+    def _calc_residuals(self, x: np.ndarray) -> np.ndarray:
+        """Relative residual norm of discrete analogue of every member.
+        """
+
+        r = calc_tdma_batch_residual(a=self._a_p[..., 0], b=self._a_e[..., 0], c=self._a_w[..., 0], d=self._b[..., 0],
+                                     x=x[..., 0], result=self._residual[..., 0])
+
+        return (np.linalg.norm(r, axis=1) /
+                np.maximum(np.linalg.norm(self._b[..., 0], axis=1), np.finfo(np.float64).tiny))
+
+    def _solve_equation(self):
+        """Solve discrete analogues of all members by batched TDMA.
+        """
+
+        run_tdma_batch(a=self._a_p[..., 0], b=self._a_e[..., 0], c=self._a_w[..., 0], d=self._b[..., 0],
+                       result=self._current_solution[..., 0], p=self._p[..., 0], q=self._q[..., 0],
+                       parallel=self._parallel)
+
+    def _solve_nonlinear(self) -> tuple[int, float]:
+        """Solve the new time layer of all members with velocity by the new concentration using Picard iterations.
+
+        Every member stops by its own residual and increment, as a single DiffsuionConvection solution does.
+        Converged members keep their solution, while the others are iterated.
+
+        Returns
+        ----------
+        iterations: int
+            Maximum number of linear solves over members.
+        residual: float
+            Maximum relative residual norm over members for their last iterates before update.
+
+        """
+
+        iterate = self._iterate
+        np.copyto(iterate, self._old_solution)
+        self._initialize_right_side()
+
+        active = np.ones(shape=self._n_members, dtype=bool)
+        residuals = np.full(shape=self._n_members, fill_value=np.inf)
+        iterations = np.full(shape=self._n_members, fill_value=self._nonlinear_max_iterations)
+
+        for iteration in range(self._nonlinear_max_iterations):
+            self._calc_u_sed(iterate)
+            self._initialize_operator()
+
+            residuals[active] = self._calc_residuals(iterate)[active]
+            converged = active & (residuals <= self._nonlinear_residual_tol)
+            iterations[converged] = iteration
+            active &= ~converged
+
+            if not active.any():
+                break
+
+            self._solve_equation()
+            np.copyto(self._current_solution, iterate, where=~active[:, None, None])
+
+            relax_iterate(solution=self._current_solution, iterate=iterate, increment=self._residual,
+                          relaxation=self._nonlinear_relaxation)
+
+            increments = (np.linalg.norm(self._residual[..., 0], axis=1) /
+                          np.maximum(np.linalg.norm(self._current_solution[..., 0], axis=1),
+                                     np.finfo(np.float64).tiny))
+            np.copyto(iterate, self._current_solution)
+
+            converged = active & (increments <= self._nonlinear_increment_tol)
+            iterations[converged] = iteration + 1
+            active &= ~converged
+
+            if not active.any():
+                break
+
+        np.copyto(self._current_solution, iterate)
+
+        if self._nonlinear_max_iterations > 1 and active.any():
+            logging.warning(f'Nonlinear iterations did not converge for {np.count_nonzero(active)} members, '
+                            f'residual = {np.max(residuals[active])}')
+
+        return int(np.max(iterations)), float(np.max(residuals))
+
+    @timer
+    def solve_numerical(self):
+        """Solve all members by implicit time steps.
+        """
+
+        logging.info(f'Start numerical solution of {self._n_members} ensemble members...')
+
+        # задали начальное условие
+        np.copyto(self._old_solution, np.broadcast_to(self._c_init, self._old_solution.shape))
+        np.copyto(self._current_solution, self._old_solution)
+
+        self._solutions.clear()
+        self._nonlinear_iterations.clear()
+        self._nonlinear_residuals.clear()
+        self._solutions.append(step=0, current_time=0.0, value=self._old_solution)
+
+        # без зависимости скорости от концентрации оператор постоянный
+        if not self._concentration_dependent_u_sed:
+            self._u_sed_e.fill(0.0)
+            self._u_sed_w.fill(0.0)
+            self._initialize_operator()
+
+        # цикл через временные слои
+        for step in range(1, self._nt):
+            current_time = step * self._dt
+
+            if self._concentration_dependent_u_sed:
+                iterations, residual = self._solve_nonlinear()
+                self._nonlinear_iterations.append(step=step, current_time=current_time, value=np.asarray(iterations))
+                self._nonlinear_residuals.append(step=step, current_time=current_time, value=np.asarray(residual))
+            else:
+                self._initialize_right_side()
+                self._solve_equation()
+
+            np.copyto(self._old_solution, self._current_solution)
+
+            if step % self._save_stride == 0 or step == self._nt - 1:
+                self._solutions.append(step=step, current_time=current_time, value=self._old_solution)
+
+        self._equation_output_data.total_solutions = self._solutions.values
+        self._equation_output_data.time_grid = self._solutions.time
+        self._equation_output_data.nonlinear_iterations = self._nonlinear_iterations.values
+        self._equation_output_data.nonlinear_residuals = self._nonlinear_residuals.values
+
+        logging.info('End numerical solution.')
+
+    @property
+    def n_members(self) -> int:
+        return self._n_members
+
+    @property
+    def output_data(self):
+        return self._equation_output_data
@@ -2,12 +2,16 @@ import logging
 
 import numpy as np
 
-from solvers.diffusion_convection.discrete_analogue import FiniteVolumeScheme
-from solvers.diffusion_convection.solver_dataclasses import BoundaryType
+from solvers.diffusion_convection.discrete_analogue import FiniteVolumeScheme, calc_face_velocity, relax_iterate
+from solvers.diffusion_convection.solver_dataclasses import BoundaryType, NonlinearMethod, TimeScheme
+from solvers.krylov import SparseKrylovSolver
+from solvers.tdma import run_tdma
+from solvers.time_marching import TimeMarchingSolver
 from utils.common import timer
+from utils.grid import get_adapted_grid, get_x_grid, remap_conservative
 
 
-class DiffsuionConvection(FiniteVolumeScheme):
+class DiffsuionConvection(TimeMarchingSolver, FiniteVolumeScheme):
     @timer
     def __init__(self, input_data):
         """Solve 2D unsteady diffusion convection equation.
@@ -41,26 +45,35 @@ class DiffsuionConvection(FiniteVolumeScheme):
         nt = self._grid_time_data.nt
         self._total_time = self._grid_time_data.total_time
 
+        # node coordinates of non-uniform grid by X, which set the number of nodes and the length
+        x_grid = get_x_grid(self._grid_time_data)
+
+        if x_grid is not None:
+            nx = x_grid.size
+            self._length = float(x_grid[-1] - x_grid[0])
+
         # parse initial and boundary conditions
         self._c_init: float = self._equation_input_data.c_init
         self._c_wall_left: float = self._equation_input_data.c_wall_left
         self._c_wall_right: float = self._equation_input_data.c_wall_right
         self._q_source = self._equation_input_data.q_source
 
-        # list of solutions by each time iteration
-        self._solutions: dict = {}
-        self._velocity: dict = {}
-
         # calculate parameters
         dx = self._length / (nx - 1)
-        dy = 1.0
+        dy = self._height / (ny - 1) if ny > 1 else 1.0
         self._dt = self._total_time / (nt - 1)
 
-        # TODO: 2D grid
-        # dy = self._height / (ny - 1)
-
         self._d = self._equation_input_data.d
 
+        # sparse Krylov solver instead of TDMA (disabled by default)
+        sparse_solver = None
+
+        if self._equation_input_data.krylov_method is not None:
+            sparse_solver = SparseKrylovSolver(nx=nx, ny=ny, method=self._equation_input_data.krylov_method,
+                                               preconditioner=self._equation_input_data.krylov_preconditioner,
+                                               tol=self._equation_input_data.krylov_tol,
+                                               max_iterations=self._equation_input_data.krylov_max_iterations)
+
         # initialize scheme class
         super().__init__(
             nx=nx,
@@ -74,20 +87,112 @@ class DiffsuionConvection(FiniteVolumeScheme):
             c_wall_left=self._c_wall_left,
             c_wall_right=self._c_wall_right,
             boundary_type=BoundaryType.Dirichlet,
-            q_source=self._q_source
+            q_source=self._q_source,
+            tdma_method=self._equation_input_data.tdma_method,
+            frozen_operator=self._equation_input_data.frozen_operator,
+            adi_tol=self._equation_input_data.adi_tol,
+            adi_max_iterations=self._equation_input_data.adi_max_iterations,
+            sparse_solver=sparse_solver,
+            precision=self._equation_input_data.precision,
+            refinement_tol=self._equation_input_data.refinement_tol,
+            refinement_max_iterations=self._equation_input_data.refinement_max_iterations,
+            x_grid=x_grid,
+            time_scheme=self._grid_time_data.time_scheme
         )
 
-        self._equation_output_data.grid = np.arange(start=0.0, stop=self._length, step=dx)
-        self._equation_output_data.grid = np.append(self._equation_output_data.grid, self._length)
+        # first Crank-Nicolson steps by backward Euler half steps damp oscillations of sharp initial data
+        self._rannacher_steps: int = self._grid_time_data.rannacher_steps
+
+        if self._time_scheme != TimeScheme.EULER and self._grid_time_data.adaptive_time_step:
+            raise ValueError('Adaptive time step is implemented for backward Euler only!')
+
+        if x_grid is None:
+            self._equation_output_data.grid = np.arange(start=0.0, stop=self._length, step=dx)
+            self._equation_output_data.grid = np.append(self._equation_output_data.grid, self._length)
+        else:
+            self._equation_output_data.grid = x_grid
+        self._equation_output_data.y_grid = np.linspace(start=0.0, stop=self._height, num=ny) if ny > 1 else None
+
+        # solution-adaptive grid by X, node coordinates are saved with every time layer (disabled by default)
+        self._adaptive_grid_stride: int | None = self._grid_time_data.adaptive_grid_stride
+        self._x_grid: np.ndarray = np.array(self._equation_output_data.grid, dtype=np.float64)
+
+        if self._adaptive_grid_stride is not None and ny > 1:
+            raise ValueError('Adaptive grid is implemented for 1D grid only!')
+
+        # solutions and velocities by each saved time layer, in memory or on disk
+        history_names = ('solutions', 'velocity') + (('grids',) if self._adaptive_grid_stride is not None else ())
+        self._initialize_time_marching(layer_shape=(nx,) if ny == 1 else (nx, ny), history_names=history_names)
+
+        # sedimentation velocity on internal faces
+        self._concentration_dependent_u_sed: bool = self._equation_input_data.concentration_dependent_u_sed
+        self._u_sed_face: np.ndarray = np.zeros(shape=(nx - 1, ny), dtype=self._dtype)
+
+        # nonlinear iterations for concentration-dependent velocity
+        self._nonlinear_method: NonlinearMethod = self._equation_input_data.nonlinear_method
+        self._nonlinear_max_iterations: int = max(1, self._equation_input_data.nonlinear_max_iterations)
+        self._nonlinear_relaxation: float = self._equation_input_data.nonlinear_relaxation
+        self._nonlinear_residual_tol: float = self._equation_input_data.nonlinear_residual_tol
+        self._nonlinear_increment_tol: float = self._equation_input_data.nonlinear_increment_tol
+
+        if self._nonlinear_method == NonlinearMethod.NEWTON and self._equation_input_data.df_c is None:
+            raise ValueError('Newton method needs derivative df_c of approximation function!')
+
+        if self._nonlinear_method == NonlinearMethod.NEWTON and ny > 1:
+            raise ValueError('Newton method is implemented for 1D grid only, use Picard method on 2D grid!')
+
+        self._iterate: np.ndarray = np.zeros(shape=(nx, ny), dtype=self._dtype)
+        self._residual: np.ndarray = np.zeros(shape=(nx, ny), dtype=self._dtype)
+
+        # linearized volumetric source, state-dependent source is updated every nonlinear iteration
+        self._source_function = self._equation_input_data.source
+        self._has_source: bool = (self._source_function is not None or np.any(self._equation_input_data.sc != 0.0) or
+                                  np.any(self._equation_input_data.sp != 0.0))
+
+        # jacobian of discrete analogue for Newton method in TDMA notation
+        self._jac_a: np.ndarray | None = None
+        self._jac_b: np.ndarray | None = None
+        self._jac_c: np.ndarray | None = None
+        self._u_sed_face_derivative: np.ndarray | None = None
+
+        if self._nonlinear_method == NonlinearMethod.NEWTON:
+            self._jac_a = np.zeros(shape=(nx, ny), dtype=self._dtype)
+            self._jac_b = np.zeros(shape=(nx, ny), dtype=self._dtype)
+            self._jac_c = np.zeros(shape=(nx, ny), dtype=self._dtype)
+            self._u_sed_face_derivative = np.zeros(shape=(nx - 1, ny), dtype=self._dtype)
 
         self._equation_output_data.numerical_solution = self._current_solution
-        self._equation_output_data.total_solutions = self._solutions
-        self._equation_output_data.total_velocity = self._velocity
 
         logging.info('End initialization grid and solver data.')
 
     def _calc_u_sed(self, c: np.ndarray):
-        """Calculate U_sed by C values.
+        """Calculate U_sed by C values on control volume faces by whole-array operations.
+
+        Face velocity between control volumes i and i + 1 is calculated by average concentration.
+        It is the east face velocity of i and the west face velocity of i + 1, walls are impermeable.
+
+        """
+
+        calc_face_velocity(c=c, f_c=self._equation_input_data.f_c, coef=self._get_u_sed_coef(),
+                           u_face=self._u_sed_face, u_sed_e=self._u_sed_e, u_sed_w=self._u_sed_w)
+
+        self._u_sed[1:self._nx - 1] = self._u_sed_face[1:]
+
+        self.invalidate_operator()
+
+    def _update_source(self, c: np.ndarray):
+        """Linearize volumetric source by the latest concentration.
+        """
+
+        if self._source_function is None:
+            sc, sp = self._equation_input_data.sc, self._equation_input_data.sp
+        else:
+            sc, sp = self._source_function(self._equation_output_data.grid[:, None], c)
+
+        self.set_source(sc=sc, sp=sp, x=c)
+
+    def _get_u_sed_coef(self) -> float:
+        """Constant factor of sedimentation velocity U_sed = coef * f_c(C).
         """
 
         const = self._equation_input_data.const_u_sed
@@ -96,50 +201,263 @@ class DiffsuionConvection(FiniteVolumeScheme):
         rho1 = self._equation_input_data.rho1
         rho2 = self._equation_input_data.rho2
         mu2 = self._equation_input_data.mu2
-        f_c = self._equation_input_data.f_c
 
-        for i in np.arange(1, self._nx - 1):
-            self._u_sed[i] = const * r0 ** 2.0 * g * (rho1 - rho2) * f_c((c[i] + c[i + 1]) / 2.0) / mu2
+        return const * r0 ** 2.0 * g * (rho1 - rho2) / mu2
+
+    def _initialize_jacobian(self, c: np.ndarray):
+        """Initialize jacobian of discrete analogue by concentration for Newton method.
+
+        Discrete analogue must be initialized by the same concentration. Face velocity depends on concentrations
+        of both neighbour control volumes with derivative coef * df_c(C_face) / 2. The source slope sp is already
+        in a_p, so the source is differentiated exactly if sp is its derivative.
 
-    @timer
-    def solve_numerical(self):
-        """Return numerical solution from FiniteVolumeScheme.
         """
 
-        logging.info('Start numerical solution...')
+        np.copyto(self._jac_a, self._a_p)
+        np.copyto(self._jac_b, self._a_e)
+        np.copyto(self._jac_c, self._a_w)
+
+        if not self._concentration_dependent_u_sed:
+            return
+
+        nx = self._nx
+        df_c = self._equation_input_data.df_c
+        du = self._u_sed_face_derivative
+
+        np.add(c[:nx - 1], c[1:], out=du)
+        du *= 0.5
+
+        if isinstance(df_c, np.ufunc):
+            df_c(du, out=du)
+        else:
+            du[...] = df_c(du)
+
+        du *= 0.5 * self._get_u_sed_coef()
 
-        # задали начальное условие
-        self._old_solution = np.full_like(self._current_solution, self._c_init)
+        # internal control volumes: derivatives of residual by east and west face velocities
+        du_e = du[1:]
+        du_w = du[:nx - 2]
+        dr_du_e = c[1:nx - 1] + np.where(self._u_sed_e[1:nx - 1] < 0.0, c[2:], 0.0)
+        dr_du_w = -c[1:nx - 1] - np.where(self._u_sed_w[1:nx - 1] > 0.0, c[:nx - 2], 0.0)
 
-        # начальное время
-        current_time = 0.0
+        # spatial terms of Crank-Nicolson are weighted, its explicit part does not depend on the new layer
+        theta = self._get_time_weights()[0]
 
-        # цикл через временные слои
-        while current_time <= self._total_time:
-            logging.info(f'Solving for time = {current_time}')
-            # # посчитаем скорость, используя концентрацию на текущем временном слое
-            # self._calc_u_sed(self._old_solution)
-            # self.update_u_sed()
+        if theta != 1.0:
+            dr_du_e *= theta
+            dr_du_w *= theta
+
+        self._jac_a[1:nx - 1] += dr_du_e * du_e + dr_du_w * du_w
+        self._jac_b[1:nx - 1] -= dr_du_e * du_e
+        self._jac_c[1:nx - 1] -= dr_du_w * du_w
+
+        # boundary control volumes depend on velocity only for Robin condition
+        if self._boundary_type == BoundaryType.Robin:
+            dr_du = self._dx_e[0] / (2.0 * self._d_e[0]) * (c[0] + c[1]) * du[0]
+            self._jac_a[0] += dr_du
+            self._jac_b[0] -= dr_du
+
+            dr_du = -self._dx_w[nx - 1] / (2.0 * self._d_w[nx - 1]) * (c[nx - 1] + c[nx - 2]) * du[nx - 2]
+            self._jac_a[nx - 1] += dr_du
+            self._jac_c[nx - 1] -= dr_du
+
+    def _solve_nonlinear(self) -> tuple[int, float]:
+        """Solve the new time layer with velocity and state-dependent source by the new concentration using Picard
+        or Newton iterations.
+
+        Returns
+        ----------
+        iterations: int
+            Number of linear solves.
+        residual: float
+            Relative residual norm of discrete analogue for the last iterate before its update.
+
+        """
+
+        iterate = self._iterate
+        np.copyto(iterate, self._old_solution)
+        residual = np.inf
+
+        for iteration in range(self._nonlinear_max_iterations):
+            if self._concentration_dependent_u_sed:
+                self._calc_u_sed(iterate)
+
+            if self._has_source:
+                self._update_source(iterate)
 
-            # инициализиурем дискретный аналог, используя решение на текущем временном слое
             self.initialize_discrete_analogue()
-            np.savetxt(f'a_p_{current_time}_sec.txt', self._a_p)
-            np.savetxt(f'a_e_{current_time}_sec.txt', self._a_e)
-            np.savetxt(f'a_w_{current_time}_sec.txt', self._a_w)
-            np.savetxt(f'b_{current_time}_sec.txt', self._b)
 
-            # получаем решение на следующем временном слое
-            self.solve_equation()
+            self.calc_residual(x=iterate, result=self._residual)
+            residual = np.linalg.norm(self._residual) / max(np.linalg.norm(self._b), np.finfo(np.float64).tiny)
+
+            if residual <= self._nonlinear_residual_tol:
+                np.copyto(self._current_solution, iterate)
+                return iteration, residual
+
+            if self._nonlinear_method == NonlinearMethod.NEWTON:
+                self._initialize_jacobian(iterate)
+                np.negative(self._residual, out=self._residual)
+                run_tdma(a=self._jac_a, b=self._jac_b, c=self._jac_c, d=self._residual, result=self._current_solution,
+                         p=self._p, q=self._q)
+                self.invalidate_operator()
+                self._current_solution += iterate
+            else:
+                self.solve_equation()
 
-            # обновляем решение на текущем временном слое
-            self._old_solution = self._current_solution
+            relax_iterate(solution=self._current_solution, iterate=iterate, increment=self._residual,
+                          relaxation=self._nonlinear_relaxation)
 
-            # сохраняем решение для временного слоя current_time в словарь
-            self._solutions[current_time] = self._current_solution
-            self._velocity[current_time] = self._u_sed
+            increment = (np.linalg.norm(self._residual) /
+                         max(np.linalg.norm(self._current_solution), np.finfo(np.float64).tiny))
+            np.copyto(iterate, self._current_solution)
+
+            if increment <= self._nonlinear_increment_tol:
+                return iteration + 1, residual
+
+        if self._nonlinear_max_iterations > 1:
+            logging.warning(f'Nonlinear iterations did not converge, residual = {residual}')
+
+        return self._nonlinear_max_iterations, residual
+
+    def _set_initial_condition(self):
+        self._old_solution.fill(self._c_init)
+        self._n_time_steps = 0
+
+    def _get_saved_fields(self) -> dict[str, np.ndarray]:
+        if self._adaptive_grid_stride is None:
+            return {'solutions': self._old_solution, 'velocity': self._u_sed}
+
+        return {'solutions': self._old_solution, 'velocity': self._u_sed, 'grids': self._x_grid}
+
+    def _set_x_grid(self, x_grid: np.ndarray):
+        """Move nodes of the scheme and the output grid to new coordinates.
+        """
+
+        self._x_grid = x_grid
+        self.set_x_grid(x_grid)
+        self._equation_output_data.grid = x_grid
+
+    def _adapt_grid(self, step: int):
+        """Move nodes to the front every adaptive_grid_stride time steps and remap the solution conservatively.
+        """
+
+        if self._adaptive_grid_stride is None or step % self._adaptive_grid_stride != 0:
+            return
+
+        x_grid = get_adapted_grid(grid=self._x_grid, values=self._old_solution[:, 0],
+                                  indicator=self._grid_time_data.adaptive_grid_indicator,
+                                  weight=self._grid_time_data.adaptive_grid_weight)
+
+        self._old_solution[:, 0] = remap_conservative(grid=self._x_grid, values=self._old_solution[:, 0],
+                                                      new_grid=x_grid)
+
+        if self._time_scheme == TimeScheme.BDF2:
+            self._previous_solution[:, 0] = remap_conservative(grid=self._x_grid,
+                                                               values=self._previous_solution[:, 0], new_grid=x_grid)
+        self._set_x_grid(x_grid)
+
+        # начальное приближение и скорость на новой сетке
+        np.copyto(self._current_solution, self._old_solution)
+
+        if self._concentration_dependent_u_sed:
+            self._calc_u_sed(self._old_solution)
+
+    def _get_metadata(self) -> dict:
+        return {
+            **super()._get_metadata(),
+            'd': self._d,
+            'c_init': self._c_init,
+            'c_wall_left': self._c_wall_left,
+            'c_wall_right': self._c_wall_right,
+        }
+
+    def _get_extra_state(self) -> dict:
+        state = {'u_sed': self._u_sed, 'u_sed_e': self._u_sed_e, 'u_sed_w': self._u_sed_w, 'x_grid': self._x_grid,
+                 'n_time_steps': self._n_time_steps}
+
+        if self._time_scheme == TimeScheme.BDF2:
+            state['previous_solution'] = self._previous_solution
+
+        return state
+
+    def _restore_extra_state(self, state: dict):
+        self._u_sed[...] = state['u_sed']
+        self._u_sed_e[...] = state['u_sed_e']
+        self._u_sed_w[...] = state['u_sed_w']
+        self._n_time_steps = int(state['n_time_steps'])
+
+        if self._time_scheme == TimeScheme.BDF2:
+            self._previous_solution[...] = state['previous_solution']
+
+        if self._adaptive_grid_stride is not None:
+            self._set_x_grid(np.array(state['x_grid'], dtype=np.float64))
+
+    def _solve_time_step(self) -> tuple[int, float] | None:
+        """Solve the next time layer with the current time step by the time scheme.
+
+        Returns
+        ----------
+        stats: tuple[int, float] | None
+            Number of nonlinear iterations and residual of the last solve, None for linear equation.
+
+        """
+
+        step_scheme = self.get_step_scheme()
+
+        if step_scheme == TimeScheme.CRANK_NICOLSON and self._n_time_steps < self._rannacher_steps:
+            # старт Раннахера: два полушага неявным методом Эйлера, старый слой сохраняется
+            dt = self._dt
+            np.copyto(self._previous_solution, self._old_solution)
+
+            self._dt = 0.5 * dt
+            self._solve_time_layer(step_scheme=TimeScheme.EULER)
+            np.copyto(self._old_solution, self._current_solution)
+            stats = self._solve_time_layer(step_scheme=TimeScheme.EULER)
+
+            np.copyto(self._old_solution, self._previous_solution)
+            self._dt = dt
+        else:
+            stats = self._solve_time_layer(step_scheme=step_scheme)
+
+        self.finish_time_step()
+
+        return stats
+
+    def _solve_time_layer(self, step_scheme: TimeScheme) -> tuple[int, float] | None:
+        """Solve the next time layer by the old layer with the given scheme of the time step.
+
+        Returns
+        ----------
+        stats: tuple[int, float] | None
+            Number of nonlinear iterations and residual, None for linear equation.
+
+        """
+
+        self.start_time_step(step_scheme)
+
+        if self._concentration_dependent_u_sed or self._source_function is not None:
+            # итерации по нелинейности: скорость и источник по концентрации на следующем временном слое
+            return self._solve_nonlinear()
+
+        if self._has_source:
+            self._update_source(self._old_solution)
+
+        # инициализиурем дискретный аналог, используя решение на текущем временном слое
+        self.initialize_discrete_analogue()
+
+        # получаем решение на следующем временном слое
+        self.solve_equation()
+
+        return None
+
+    @timer
+    def solve_numerical(self):
+        """Return numerical solution from FiniteVolumeScheme.
+        """
+
+        logging.info('Start numerical solution...')
 
-            # переключились на следующий временной слой
-            current_time += self._dt
+        self._march_in_time()
 
         logging.info('End numerical solution.')
 
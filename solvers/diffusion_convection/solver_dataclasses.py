@@ -2,13 +2,36 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import Callable
 
+import numpy as np
+from numba import vectorize
 from scipy.constants import g
 
+from solvers.krylov import KrylovMethod, Preconditioner
+from solvers.tdma import Precision, TdmaMethod
+from utils.grid import GridIndicator, GridStretching
 
+
+@vectorize(['float64(float64)', 'float32(float32)'], nopython=True, cache=True)
 def f_c(c: float) -> float:
     return (1.0 - c) ** 4.7
 
 
+@vectorize(['float64(float64)', 'float32(float32)'], nopython=True, cache=True)
+def df_c(c: float) -> float:
+    return -4.7 * (1.0 - c) ** 3.7
+
+
+class NonlinearMethod(Enum):
+    PICARD = 'picard'  # fixed-point iterations with velocity by the previous iterate
+    NEWTON = 'newton'  # Newton iterations with analytical derivative of f_c
+
+
+class TimeScheme(Enum):
+    EULER = 'euler'  # backward Euler, first order
+    CRANK_NICOLSON = 'crank_nicolson'  # trapezoidal rule, second order, needs damped start-up for sharp initial data
+    BDF2 = 'bdf2'  # second order backward differentiation, keeps one extra time layer
+
+
 @dataclass
 class GridTimeData:
     nx: int = 10  # dx = x_length / nx
@@ -17,28 +40,88 @@ class GridTimeData:
     y_height: float = 1.0  # m
     nt: int = 10  # dt = total_time / nt
     total_time: float = 100.0
+    save_stride: int = 1  # save every n-th time layer to history
+
+    # non-uniform grid by X, uniform grid by nx and x_length if x_stretching is UNIFORM and x_grid is None
+    x_stretching: GridStretching = GridStretching.UNIFORM  # nodes clustered at both walls if GEOMETRIC or TANH
+    x_stretching_factor: float | None = None  # tanh slope or ratio of neighbour steps, default if None
+    x_grid: np.ndarray | None = None  # node coordinates by X, overrides nx, x_length and x_stretching
+
+    # solution-adaptive grid by X on 1D grid: nodes are moved to the front, the number of nodes is constant
+    adaptive_grid_stride: int | None = None  # adapt grid every n-th time step, disabled if None
+    adaptive_grid_indicator: GridIndicator = GridIndicator.GRADIENT  # refinement indicator of the solution
+    adaptive_grid_weight: float = 100.0  # extra node density at the maximum of the indicator
+
+    # time integration scheme, second order schemes need a fixed time step
+    time_scheme: TimeScheme = TimeScheme.EULER  # backward Euler, Crank-Nicolson or BDF2
+    rannacher_steps: int = 2  # first Crank-Nicolson steps replaced by two backward Euler half steps each
+
+    # error-controlled time step, nt sets the initial time step only
+    adaptive_time_step: bool = False  # step doubling with local error estimate
+    dt_min: float = 1E-6  # sec
+    dt_max: float | None = None  # sec, total_time if None
+    time_rtol: float = 1E-3  # relative tolerance of local error
+    time_atol: float = 1E-6  # absolute tolerance of local error
+
+    # early termination at steady state
+    steady_state_tol: float | None = None  # relative change of solution by time step, disabled if None
+    steady_state_window: int = 10  # number of consecutive time steps with change below tolerance
+    steady_state_solve: bool = False  # solve steady equation directly after steady state detection
 
 
 @dataclass
 class InputData:
-    # TODO: add source linearization
-    sc: float = 0.0  # s = sc + sp * Cp
-    sp: float = 0.0  # s = sc + sp * Cp
+    # linearized volumetric source s = sc + sp * Cp of internal control volumes
+    sc: float | np.ndarray = 0.0  # constant part, scalar or field of shape (nx,) or (nx, ny)
+    sp: float | np.ndarray = 0.0  # slope, negative part is implicit, positive part is taken by the latest solution
+    source: Callable | None = None  # function (x, c) -> (sc, sp) of node coordinates and solution, overrides sc, sp
 
     # Used
-    const_u_sed = 0.2  # 2 / 9
+    const_u_sed: float = 0.2  # 2 / 9
     g: float = g  # physical constant
-    f_c: Callable = f_c  # approximation function
+    f_c: Callable = f_c  # approximation function, called on arrays (NumPy or numba ufunc)
+    df_c: Callable | None = df_c  # derivative of approximation function, used by Newton method
     r0: float = 0.001  # m
     rho1: float = 1000.0  # kg / m^3
     rho2: float = 900.0  # kg / m^3
     mu2: float = 0.6  # Pa * sec
     d: float = 9.46E-19  # diffusion coefficient, m^2 / sec
+    concentration_dependent_u_sed: bool = False  # recalculate velocity by concentration every time step
+
+    # coupling of velocity and state-dependent source with concentration on the new time layer
+    nonlinear_method: NonlinearMethod = NonlinearMethod.PICARD
+    nonlinear_max_iterations: int = 1  # 1 means velocity lagged by a time step
+    nonlinear_relaxation: float = 1.0  # under-relaxation factor of concentration update
+    nonlinear_residual_tol: float = 1E-10  # relative residual norm of discrete analogue
+    nonlinear_increment_tol: float = 1E-10  # relative norm of concentration update
 
     c_init: float = 0.01  # initial concentration (t = 0)
     c_wall_left: float = 0.07  # left boundary concentration (x = 0, t)
     c_wall_right: float = 0.07  # right boundary concentration (x = L, t)
-    q_source = 0.5  # source value
+    q_source: float = 0.5  # source value
+
+    tdma_method: TdmaMethod = TdmaMethod.THOMAS  # tridiagonal solver algorithm
+    frozen_operator: bool = True  # reuse TDMA factorization while a_p, a_e, a_w are constant
+    adi_tol: float = 1E-10  # relative residual norm of ADI iterations on 2D grid
+    adi_max_iterations: int = 100  # maximum number of ADI iterations on 2D grid
+    krylov_method: KrylovMethod | None = None  # BICGSTAB or GMRES sparse solver instead of TDMA, disabled if None
+    krylov_preconditioner: Preconditioner = Preconditioner.ILU  # preconditioner of Krylov solver
+    krylov_tol: float = 1E-10  # relative residual norm of Krylov iterations
+    krylov_max_iterations: int = 1000  # maximum number of Krylov iterations
+    precision: Precision = Precision.DOUBLE  # float32 arrays if SINGLE, float32 TDMA with float64 refinement if MIXED
+    refinement_tol: float = 1E-10  # relative residual norm of mixed precision iterative refinement
+    refinement_max_iterations: int = 10  # maximum number of mixed precision refinement steps
+
+    diagnostics_path: str | None = None  # HDF5 file for a_p, a_e, a_w, b snapshots, disabled if None
+    diagnostics_stride: int = 1  # record every n-th time step
+
+    output_path: str | None = None  # HDF5 file for saved time layers, kept in memory if None
+    output_compression: str | None = 'gzip'  # HDF5 compression filter of saved time layers
+
+    checkpoint_path: str | None = None  # npz file for solver state, disabled if None
+    checkpoint_step_interval: int | None = None  # save checkpoint every n-th time step
+    checkpoint_wall_interval: float | None = 600.0  # save checkpoint every n seconds of wall-clock time
+    restart: bool = False  # resume from checkpoint_path if it exists, output_path file must exist if set
 
 
 class BoundaryType(Enum):
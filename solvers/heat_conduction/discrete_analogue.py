@@ -1,11 +1,24 @@
+import logging
+
 import numpy as np
 
-from solvers.tdma import run_tdma
+from solvers.adi import calc_adi_residual, run_adi
+from solvers.krylov import SparseKrylovSolver
+from solvers.multigrid import GeometricMultigrid, MultigridCycle
+from solvers.tdma import (MixedPrecisionTdma, Precision, TdmaMethod, calc_tdma_residual, factorize_tdma,
+                          get_precision_dtype, run_tdma, run_tdma_factorized, run_tdma_partitioned)
+from utils.grid import get_grid_spacing
 
 
 class FiniteVolumeScheme:
     def __init__(self, nx: int, ny: int, dx: float, dy: float, k: float, left_condition_value: float,
-                 right_condition_value: float, initial_time_value: float | None):
+                 right_condition_value: float, initial_time_value: float | None,
+                 tdma_method: TdmaMethod = TdmaMethod.THOMAS, adi_tol: float = 1E-8,
+                 adi_max_iterations: int = 1000, sparse_solver: SparseKrylovSolver | None = None,
+                 multigrid_cycle: MultigridCycle | None = None, multigrid_tol: float = 1E-8,
+                 multigrid_max_cycles: int = 50, dt: float = np.inf, frozen_operator: bool = False,
+                 precision: Precision = Precision.DOUBLE, refinement_tol: float = 1E-10,
+                 refinement_max_iterations: int = 10, x_grid: np.ndarray | None = None):
         """Finite volume method scheme by describing discrete analogue of the equation.
 
         Parameters
@@ -15,7 +28,7 @@ class FiniteVolumeScheme:
         ny: int
             Number of grid points by Y.
         dx: float
-            Step size in X direction.
+            Step size in X direction of uniform grid.
         dy: float
             Step size in Y direction.
         k: float
@@ -26,63 +39,355 @@ class FiniteVolumeScheme:
             Right boundary condition value.
         initial_time_value: float
             Initial condition value.
+        tdma_method: TdmaMethod
+            Tridiagonal solver algorithm. For 2D grid partitioned method solves lines of ADI sweeps on all cores.
+        adi_tol: float
+            Relative residual norm to stop ADI iterations on 2D grid.
+        adi_max_iterations: int
+            Maximum number of ADI iterations on 2D grid.
+        sparse_solver: SparseKrylovSolver
+            Sparse Krylov solver used instead of TDMA and ADI iterations if set.
+        multigrid_cycle: MultigridCycle
+            Cycle of geometric multigrid solver used instead of TDMA and ADI iterations if set.
+        multigrid_tol: float
+            Relative residual norm to stop multigrid cycles.
+        multigrid_max_cycles: int
+            Maximum number of multigrid cycles.
+        dt: float
+            Step size in time, infinite for steady equation.
+        frozen_operator: bool
+            Flag to reuse TDMA forward sweep, sparse matrix with preconditioner or multigrid levels while a_p, a_e,
+            a_w, a_n and a_s are constant, e.g. for time steps of the same size.
+        precision: Precision
+            Floating point precision of discrete analogue, solution and TDMA solve. Mixed precision is implemented
+            for Thomas algorithm on 1D grid only.
+        refinement_tol: float
+            Relative residual norm to stop iterative refinement of mixed precision TDMA.
+        refinement_max_iterations: int
+            Maximum number of refinement steps of mixed precision TDMA.
+        x_grid: np.ndarray
+            Node coordinates by X of non-uniform grid, shape (nx,). Uniform grid with step dx if None.
+
+        Notes
+        ----------
+        On 2D grid walls by Y are insulated, control volumes next to them have a half height.
+        Control volume faces by X are halfway between neighbour nodes.
 
         """
 
         self._nx: int = nx
         self._ny: int = ny
 
-        self._dx_e: float = dx
-        self._dx_w: float = dx
+        # distances to neighbour nodes and control volume widths by X as columns, broadcast along Y
+        if x_grid is None:
+            dx_e, dx_w, dx_p = (np.full(shape=self._nx, fill_value=dx) for _ in range(3))
+        else:
+            dx_e, dx_w, dx_p = get_grid_spacing(x_grid)
+
+        self._dx_e: np.ndarray = dx_e[:, None]
+        self._dx_w: np.ndarray = dx_w[:, None]
+        self._dx_p: np.ndarray = dx_p[:, None]
         self._dy_n: float = dy
         self._dy_s: float = dy
 
-        self._k_e: float = k
-        self._k_w: float = k
+        self._dt: float = dt
+
+        # thermal diffusivities on faces by X as columns and by Y as scalars
+        self._k_e: np.ndarray = np.full(shape=(self._nx, 1), fill_value=k)
+        self._k_w: np.ndarray = np.full(shape=(self._nx, 1), fill_value=k)
         self._k_s: float = k
         self._k_n: float = k
 
+        # heat conductances of faces by X, constant for the grid, and transient coefficients of the time step
+        self._k_dx_e: np.ndarray = self._k_e / self._dx_e
+        self._k_dx_w: np.ndarray = self._k_w / self._dx_w
+        self._dx_dt: np.ndarray = self._dx_p / self._dt
+        self._dx_dt_step: float = self._dt
+
         self._left_condition_value = left_condition_value
         self._right_condition_value = right_condition_value
         self._initial_time_value = initial_time_value
 
-        self._a_p: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._a_e: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._a_w: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._a_n: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._a_s: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
-        self._b: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
+        # linearized volumetric source of internal control volumes, set by set_source (disabled by default)
+        self._sc: np.ndarray | None = None
+        self._sp: np.ndarray | None = None
+
+        self._precision: Precision = precision
+        self._dtype: type = get_precision_dtype(precision)
+
+        self._a_p: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._a_e: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._a_w: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._a_n: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._a_s: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._b: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        self._current_solution: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._old_solution: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        # TDMA workspace buffers
+        self._p: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._q: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+
+        self._tdma_method: TdmaMethod = tdma_method
+        self._tdma_workspace: np.ndarray | None = None
+
+        if self._tdma_method == TdmaMethod.PARTITIONED:
+            self._tdma_workspace = np.zeros(shape=(3, self._nx), dtype=self._dtype)
+
+        # control volume heights and ADI workspace on 2D grid
+        self._dy_p: np.ndarray | None = None
+        # float32 residual norm is not reduced below the single precision rounding error
+        self._adi_tol: float = max(adi_tol, float(np.finfo(self._dtype).eps))
+        self._adi_max_iterations: int = adi_max_iterations
+        self._adi_workspace: np.ndarray | None = None
+        self._adi_iterations: int = 0
+        self._adi_residual: float = 0.0
+
+        self._sparse_solver: SparseKrylovSolver | None = sparse_solver
+
+        self._multigrid_cycle: MultigridCycle | None = multigrid_cycle
+        self._multigrid_tol: float = max(multigrid_tol, float(np.finfo(self._dtype).eps))
+        self._multigrid_max_cycles: int = multigrid_max_cycles
+        self._multigrid: GeometricMultigrid | None = None
+        self._multigrid_cycles: int = 0
+        self._multigrid_residual: float = 0.0
+
+        # cached TDMA forward sweep, sparse operator or multigrid levels, valid while the operator state is unchanged
+        self._frozen_operator: bool = frozen_operator
+        self._tdma_denominator: np.ndarray = np.zeros(shape=(self._nx, self._ny), dtype=self._dtype)
+        self._operator_state: tuple | None = None
+
+        # float32 TDMA with float64 iterative refinement
+        self._mixed_tdma: MixedPrecisionTdma | None = None
+        self._refinement_tol: float = refinement_tol
+
+        if self._precision == Precision.MIXED:
+            if (self._ny > 1 or self._sparse_solver is not None or self._multigrid_cycle is not None or
+                    self._tdma_method != TdmaMethod.THOMAS):
+                raise ValueError('Mixed precision is implemented for Thomas algorithm on 1D grid only!')
+
+            self._mixed_tdma = MixedPrecisionTdma(n=self._nx, tol=refinement_tol,
+                                                  max_iterations=refinement_max_iterations)
+
+        if self._ny > 1:
+            self._dy_p = np.full(shape=self._ny, fill_value=dy, dtype=self._dtype)
+            self._dy_p[[0, -1]] = 0.5 * dy
+            self._adi_workspace = np.zeros(shape=(4, self._nx, self._ny), dtype=self._dtype)
 
-        self._result = np.zeros(shape=(self._nx, self._ny), dtype=np.float64)
+    def _get_operator_state(self) -> tuple:
+        """Scalar parameters a_p, a_e, a_w, a_n and a_s depend on. Grid and diffusivity changes are tracked by
+        invalidate_operator.
+        """
+
+        return self._k_n, self._k_s, self._dt
+
+    def invalidate_operator(self):
+        """Drop cached operator, so it is assembled and factorized again.
+        """
+
+        self._operator_state = None
+
+    def set_source(self, sc: float | np.ndarray, sp: float | np.ndarray, x: np.ndarray):
+        """Set linearized volumetric source s = sc + sp * T of internal control volumes.
+
+        Negative slope is added to a_p, so a stiff loss term is implicit and a_p stays dominant. Positive slope
+        is moved to the constant part by the latest solution x. The operator is assembled again only if the
+        implicit slope is changed.
+
+        Parameters
+        ----------
+        sc: float | np.ndarray
+            Constant part, scalar or field of shape (nx,) or (nx, ny).
+        sp: float | np.ndarray
+            Slope, scalar or field of shape (nx,) or (nx, ny).
+        x: np.ndarray
+            The latest solution, shape (nx, ny).
+
+        """
+
+        shape = (self._nx, self._ny)
+        sc = np.asarray(sc, dtype=self._dtype)
+        sp = np.asarray(sp, dtype=self._dtype)
+
+        # fields by X are broadcast along Y
+        sc = np.broadcast_to(sc[:, None] if sc.ndim == 1 else sc, shape)
+        sp = np.broadcast_to(sp[:, None] if sp.ndim == 1 else sp, shape)
+
+        if self._sc is None:
+            self._sc = np.zeros(shape=shape, dtype=self._dtype)
+            self._sp = np.zeros(shape=shape, dtype=self._dtype)
+            self.invalidate_operator()
+
+        np.maximum(sp, 0.0, out=self._sc)
+        self._sc *= x
+        self._sc += sc
+
+        sp_implicit = np.minimum(sp, 0.0)
+
+        if not np.array_equal(sp_implicit, self._sp):
+            np.copyto(self._sp, sp_implicit)
+            self.invalidate_operator()
+
+    def _get_dx_dt(self) -> np.ndarray:
+        """Transient coefficients dx_p / dt of control volumes, recalculated if the time step is changed.
+        """
+
+        if self._dx_dt_step != self._dt:
+            np.divide(self._dx_p, self._dt, out=self._dx_dt)
+            self._dx_dt_step = self._dt
+
+        return self._dx_dt
 
     def initialize_discrete_analogue(self):
         """Initialize discrete analogue by scheme.
         """
 
+        # only the right side changes while the operator is frozen
+        if self._frozen_operator and self._operator_state == self._get_operator_state():
+            self._initialize_right_side()
+            return
+
+        self._operator_state = None
+
         # TODO: add fictive control volume
 
-        self._b[0] = self._left_condition_value
         self._a_e[0] = 0.0
         self._a_w[0] = 0.0
         self._a_p[0] = 1.0
 
-        for i in range(1, self._nx - 1):
-            self._a_e[i] = self._k_e / self._dx_e
-            self._a_w[i] = self._k_w / self._dx_w
+        # internal control volumes, the transient term vanishes for steady equation (dt = inf)
+        self._a_e[1:self._nx - 1] = self._k_dx_e[1:self._nx - 1]
+        self._a_w[1:self._nx - 1] = self._k_dx_w[1:self._nx - 1]
 
-            self._a_p[i] = self._a_w[i] + self._a_e[i]
+        np.add(self._a_w[1:self._nx - 1], self._a_e[1:self._nx - 1], out=self._a_p[1:self._nx - 1])
+        self._a_p[1:self._nx - 1] += self._get_dx_dt()[1:self._nx - 1]
+
+        # implicit part of the source
+        if self._sp is not None:
+            self._a_p[1:self._nx - 1] -= self._sp[1:self._nx - 1] * self._dx_p[1:self._nx - 1]
+
+        if self._ny > 1:
+            self._initialize_y_coefficients()
 
-        self._b[self._nx - 1] = self._right_condition_value
         self._a_w[self._nx - 1] = 0.0
         self._a_e[self._nx - 1] = 0.0
         self._a_p[self._nx - 1] = 1.0
 
+        self._initialize_right_side()
+
+    def _initialize_y_coefficients(self):
+        """Scale internal control volumes by their heights and add heat fluxes by Y on 2D grid.
+        """
+
+        a_e = self._a_e[1:self._nx - 1]
+        a_w = self._a_w[1:self._nx - 1]
+        a_p = self._a_p[1:self._nx - 1]
+        a_n = self._a_n[1:self._nx - 1]
+        a_s = self._a_s[1:self._nx - 1]
+
+        a_e *= self._dy_p
+        a_w *= self._dy_p
+        a_p *= self._dy_p
+
+        # insulated walls by Y
+        a_n[:, :self._ny - 1] = self._k_n * self._dx_p[1:self._nx - 1] / self._dy_n
+        a_n[:, self._ny - 1] = 0.0
+        a_s[:, 1:] = self._k_s * self._dx_p[1:self._nx - 1] / self._dy_s
+        a_s[:, 0] = 0.0
+
+        a_p += a_n
+        a_p += a_s
+
+    def _initialize_right_side(self):
+        """Initialize right side of discrete analogue by boundary values and the previous time layer.
+        """
+
+        self._b[0] = self._left_condition_value
+        np.multiply(self._old_solution[1:self._nx - 1], self._get_dx_dt()[1:self._nx - 1], out=self._b[1:self._nx - 1])
+
+        if self._sc is not None:
+            self._b[1:self._nx - 1] += self._sc[1:self._nx - 1] * self._dx_p[1:self._nx - 1]
+
+        if self._ny > 1:
+            self._b[1:self._nx - 1] *= self._dy_p
+
+        self._b[self._nx - 1] = self._right_condition_value
+
+    def calc_residual(self, x: np.ndarray, result: np.ndarray) -> np.ndarray:
+        """Residual a_p * x_P - a_e * x_E - a_w * x_W - a_n * x_N - a_s * x_S - b of discrete analogue.
+        """
+
+        if self._ny == 1:
+            return calc_tdma_residual(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, x=x, result=result)
+
+        calc_adi_residual(self._a_p, self._a_e, self._a_w, self._a_n, self._a_s, self._b, x, result=result)
+
+        return np.negative(result, out=result)
+
     def solve_equation(self):
-        """Solve the equation by TDMA algorithm.
+        """Solve the equation by TDMA algorithm, by ADI iterations on 2D grid, by sparse Krylov solver
+        or by geometric multigrid.
         """
 
-        run_tdma(self._a_p, self._a_e, self._a_w, self._b, self._result)
+        # operator is prepared again unless it is frozen and unchanged
+        rebuild = not self._frozen_operator or self._operator_state is None
+
+        if self._multigrid_cycle is not None:
+            if rebuild or self._multigrid is None:
+                self._multigrid = GeometricMultigrid(self._a_p, self._a_e, self._a_w, self._a_n, self._a_s,
+                                                     cycle=self._multigrid_cycle,
+                                                     parallel=self._tdma_method == TdmaMethod.PARTITIONED)
+
+            self._multigrid_cycles, self._multigrid_residual = self._multigrid.solve(
+                b=self._b, x=self._current_solution, tol=self._multigrid_tol, max_cycles=self._multigrid_max_cycles)
+
+            if self._multigrid_residual > self._multigrid_tol:
+                logging.warning(f'Multigrid cycles did not converge, residual = {self._multigrid_residual}')
+        elif self._sparse_solver is not None:
+            if rebuild:
+                self._sparse_solver.set_operator(self._a_p, self._a_e, self._a_w, self._a_n, self._a_s)
+
+            self._sparse_solver.solve(b=self._b, x=self._current_solution)
+        elif self._ny > 1:
+            self._adi_iterations, self._adi_residual = run_adi(
+                self._a_p, self._a_e, self._a_w, self._a_n, self._a_s, self._b, self._current_solution,
+                tol=self._adi_tol, max_iterations=self._adi_max_iterations, workspace=self._adi_workspace,
+                parallel=self._tdma_method == TdmaMethod.PARTITIONED)
+
+            if self._adi_residual > self._adi_tol:
+                logging.warning(f'ADI iterations did not converge, residual = {self._adi_residual}')
+        elif self._mixed_tdma is not None:
+            if rebuild:
+                self._mixed_tdma.factorize(a=self._a_p, b=self._a_e, c=self._a_w)
+
+            self._mixed_tdma.solve(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, x=self._current_solution)
+
+            # refinement diverges if the condition number exceeds the float32 resolution
+            if self._mixed_tdma.residual > self._refinement_tol:
+                logging.warning(f'Iterative refinement did not converge, residual = {self._mixed_tdma.residual}, '
+                                f'solved in double precision')
+                run_tdma(a=self._a_p, b=self._a_e, c=self._a_w, d=self._b, result=self._current_solution, p=self._p,
+                         q=self._q)
+        elif self._tdma_method == TdmaMethod.PARTITIONED:
+            run_tdma_partitioned(self._a_p, self._a_e, self._a_w, self._b, self._current_solution,
+                                 self._tdma_workspace)
+        elif self._frozen_operator:
+            if rebuild:
+                factorize_tdma(a=self._a_p, b=self._a_e, c=self._a_w, p=self._p, denominator=self._tdma_denominator)
+
+            run_tdma_factorized(c=self._a_w, p=self._p, denominator=self._tdma_denominator, d=self._b,
+                                result=self._current_solution, q=self._q)
+        else:
+            run_tdma(self._a_p, self._a_e, self._a_w, self._b, self._current_solution, self._p, self._q)
+
+        if self._frozen_operator:
+            self._operator_state = self._get_operator_state()
 
     @property
     def result(self):
-        return self._result
+        return self._current_solution
+
+    @property
+    def current_solution(self):
+        return self._current_solution
@@ -4,10 +4,13 @@ import warnings
 import numpy as np
 
 from solvers.heat_conduction.discrete_analogue import FiniteVolumeScheme
+from solvers.krylov import SparseKrylovSolver
+from solvers.time_marching import TimeMarchingSolver
 from utils.common import timer
+from utils.grid import get_x_grid
 
 
-class HeatConductivity(FiniteVolumeScheme):
+class HeatConductivity(TimeMarchingSolver, FiniteVolumeScheme):
     @timer
     def __init__(self, input_data):
         """Solve 2D unsteady heat conductivity equation.
@@ -39,6 +42,13 @@ class HeatConductivity(FiniteVolumeScheme):
         nx = self._grid_time_data.nx
         ny = self._grid_time_data.ny
 
+        # node coordinates of non-uniform grid by X, which set the number of nodes and the length
+        x_grid = get_x_grid(self._grid_time_data)
+
+        if x_grid is not None:
+            nx = x_grid.size
+            self._length = float(x_grid[-1] - x_grid[0])
+
         # parse initial and boundary conditions
         self._t_init: float = self._equation_input_data.t_init
         self._t_left: float = self._equation_input_data.t_left
@@ -46,28 +56,68 @@ class HeatConductivity(FiniteVolumeScheme):
 
         # calculate parameters
         dx = self._length / (nx - 1)
-        dy = 1.0
-
-        # TODO: 2D grid
-        # dy = self._height / (ny - 1)
+        dy = self._height / (ny - 1) if ny > 1 else 1.0
 
-        # TODO: unsteady equation
-        # total_time = self._grid_time_data.total_time
-        # nt = self._grid_time_data.nt
-        # dt = total_time / nt
+        # unsteady equation by implicit time steps, steady equation has infinite time step
+        self._unsteady: bool = self._grid_time_data.unsteady
+        dt = self._grid_time_data.total_time / (self._grid_time_data.nt - 1) if self._unsteady else np.inf
 
         self._get_k_coef()
 
+        # sparse Krylov solver instead of TDMA (disabled by default)
+        sparse_solver = None
+
+        if self._equation_input_data.krylov_method is not None:
+            sparse_solver = SparseKrylovSolver(nx=nx, ny=ny, method=self._equation_input_data.krylov_method,
+                                               preconditioner=self._equation_input_data.krylov_preconditioner,
+                                               tol=self._equation_input_data.krylov_tol,
+                                               max_iterations=self._equation_input_data.krylov_max_iterations)
+
         # initialize scheme class
         super().__init__(nx=nx, ny=ny, dx=dx, dy=dy, k=self._k,
                          initial_time_value=self._t_init,
                          left_condition_value=self._t_left,
-                         right_condition_value=self._t_right)
-
-        self._equation_output_data.grid = np.arange(start=0.0, stop=self._length, step=dx)
-        self._equation_output_data.grid = np.append(self._equation_output_data.grid, self._length)
-
-        self._equation_output_data.numerical_solution = self._result
+                         right_condition_value=self._t_right,
+                         tdma_method=self._equation_input_data.tdma_method,
+                         adi_tol=self._equation_input_data.adi_tol,
+                         adi_max_iterations=self._equation_input_data.adi_max_iterations,
+                         sparse_solver=sparse_solver,
+                         multigrid_cycle=self._equation_input_data.multigrid_cycle,
+                         multigrid_tol=self._equation_input_data.multigrid_tol,
+                         multigrid_max_cycles=self._equation_input_data.multigrid_max_cycles,
+                         dt=dt,
+                         frozen_operator=self._equation_input_data.frozen_operator and self._unsteady,
+                         precision=self._equation_input_data.precision,
+                         refinement_tol=self._equation_input_data.refinement_tol,
+                         refinement_max_iterations=self._equation_input_data.refinement_max_iterations,
+                         x_grid=x_grid)
+
+        if x_grid is None:
+            self._equation_output_data.grid = np.arange(start=0.0, stop=self._length, step=dx)
+            self._equation_output_data.grid = np.append(self._equation_output_data.grid, self._length)
+        else:
+            self._equation_output_data.grid = x_grid
+        self._equation_output_data.y_grid = np.linspace(start=0.0, stop=self._height, num=ny) if ny > 1 else None
+
+        # temperatures by each saved time layer, in memory or on disk
+        if self._unsteady:
+            self._initialize_time_marching(layer_shape=(nx,) if ny == 1 else (nx, ny), history_names=('solutions',))
+
+        # linearized volumetric source, state-dependent source is updated every Picard iteration
+        self._source_function = self._equation_input_data.source
+        self._has_source: bool = (self._source_function is not None or np.any(self._equation_input_data.sc != 0.0) or
+                                  np.any(self._equation_input_data.sp != 0.0))
+        self._nonlinear_max_iterations: int = max(1, self._equation_input_data.nonlinear_max_iterations)
+        self._nonlinear_residual_tol: float = self._equation_input_data.nonlinear_residual_tol
+        self._nonlinear_increment_tol: float = self._equation_input_data.nonlinear_increment_tol
+        self._iterate: np.ndarray | None = None
+        self._residual: np.ndarray | None = None
+
+        if self._source_function is not None:
+            self._iterate = np.zeros(shape=(nx, ny), dtype=self._dtype)
+            self._residual = np.zeros(shape=(nx, ny), dtype=self._dtype)
+
+        self._equation_output_data.numerical_solution = self._current_solution
 
         logging.info('End initialization grid and solver data.')
 
@@ -102,8 +152,9 @@ class HeatConductivity(FiniteVolumeScheme):
 
         logging.info('Start analytical solution...')
 
+        grid = self._equation_output_data.grid
         self._equation_output_data.analytical_solution = (self._t_left + (self._t_right - self._t_left) /
-                                                          self._length * self._equation_output_data.grid)
+                                                          self._length * (grid - grid[0]))
 
         logging.info('End analytical solution.')
 
@@ -114,6 +165,22 @@ class HeatConductivity(FiniteVolumeScheme):
 
         logging.info('Start numerical solution...')
 
+        if self._unsteady:
+            self._march_in_time()
+            logging.info('End numerical solution.')
+            return
+
+        # начальное приближение итерационных решателей
+        self._current_solution.fill(self._t_init)
+
+        if self._source_function is not None:
+            self._solve_nonlinear()
+            logging.info('End numerical solution.')
+            return
+
+        if self._has_source:
+            self._update_source(self._current_solution)
+
         # discrete analogue
         self.initialize_discrete_analogue()
 
@@ -122,6 +189,91 @@ class HeatConductivity(FiniteVolumeScheme):
 
         logging.info('End numerical solution.')
 
+    def _update_source(self, t: np.ndarray):
+        """Linearize volumetric source by the latest temperature.
+        """
+
+        if self._source_function is None:
+            sc, sp = self._equation_input_data.sc, self._equation_input_data.sp
+        else:
+            sc, sp = self._source_function(self._equation_output_data.grid[:, None], t)
+
+        self.set_source(sc=sc, sp=sp, x=t)
+
+    def _solve_nonlinear(self) -> tuple[int, float]:
+        """Solve the new time layer or steady equation with state-dependent source using Picard iterations.
+        The latest solution is the initial iterate.
+
+        Returns
+        ----------
+        iterations: int
+            Number of linear solves.
+        residual: float
+            Relative residual norm of discrete analogue for the last iterate before its update.
+
+        """
+
+        iterate = self._iterate
+        np.copyto(iterate, self._current_solution)
+        residual = np.inf
+
+        for iteration in range(self._nonlinear_max_iterations):
+            self._update_source(iterate)
+            self.initialize_discrete_analogue()
+
+            self.calc_residual(x=iterate, result=self._residual)
+            residual = np.linalg.norm(self._residual) / max(np.linalg.norm(self._b), np.finfo(np.float64).tiny)
+
+            if residual <= self._nonlinear_residual_tol:
+                np.copyto(self._current_solution, iterate)
+                return iteration, residual
+
+            self.solve_equation()
+
+            np.subtract(self._current_solution, iterate, out=self._residual)
+            increment = (np.linalg.norm(self._residual) /
+                         max(np.linalg.norm(self._current_solution), np.finfo(np.float64).tiny))
+            np.copyto(iterate, self._current_solution)
+
+            if increment <= self._nonlinear_increment_tol:
+                return iteration + 1, residual
+
+        if self._nonlinear_max_iterations > 1:
+            logging.warning(f'Nonlinear iterations did not converge, residual = {residual}')
+
+        return self._nonlinear_max_iterations, residual
+
+    def _set_initial_condition(self):
+        self._old_solution.fill(self._t_init)
+
+    def _get_saved_fields(self) -> dict[str, np.ndarray]:
+        return {'solutions': self._old_solution}
+
+    def _get_metadata(self) -> dict:
+        return {
+            **super()._get_metadata(),
+            'k': self._k,
+            't_init': self._t_init,
+            't_left': self._t_left,
+            't_right': self._t_right,
+        }
+
+    def _solve_time_step(self) -> tuple[int, float] | None:
+        if self._source_function is not None:
+            # итерации по нелинейности источника на следующем временном слое
+            return self._solve_nonlinear()
+
+        if self._has_source:
+            self._update_source(self._old_solution)
+
+        # инициализиурем дискретный аналог, используя решение на текущем временном слое
+        self.initialize_discrete_analogue()
+
+        # получаем решение на следующем временном слое
+        self.solve_equation()
+
+        return None
+
     @property
     def output_data(self):
         return self._equation_output_data
@@ -1,4 +1,12 @@
 from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from solvers.krylov import KrylovMethod, Preconditioner
+from solvers.multigrid import MultigridCycle
+from solvers.tdma import Precision, TdmaMethod
+from utils.grid import GridStretching
 
 
 @dataclass
@@ -7,15 +15,40 @@ class GridTimeData:
     ny: int = 1  # step dy = y_height / ny
     x_length: float = 100.0  # m
     y_height: float = 1.0  # m
-    nt: int = 1000
-    total_time = 100.0
+    nt: int = 1000  # dt = total_time / (nt - 1)
+    total_time: float = 100.0  # sec
+    unsteady: bool = False  # transient solution by implicit time steps, steady solution if False
+    save_stride: int = 1  # save every n-th time layer to history
+
+    # non-uniform grid by X, uniform grid by nx and x_length if x_stretching is UNIFORM and x_grid is None
+    x_stretching: GridStretching = GridStretching.UNIFORM  # nodes clustered at both walls if GEOMETRIC or TANH
+    x_stretching_factor: float | None = None  # tanh slope or ratio of neighbour steps, default if None
+    x_grid: np.ndarray | None = None  # node coordinates by X, overrides nx, x_length and x_stretching
+
+    # error-controlled time step, nt sets the initial time step only
+    adaptive_time_step: bool = False  # step doubling with local error estimate
+    dt_min: float = 1E-6  # sec
+    dt_max: float | None = None  # sec, total_time if None
+    time_rtol: float = 1E-3  # relative tolerance of local error
+    time_atol: float = 1E-6  # absolute tolerance of local error
+
+    # early termination at steady state
+    steady_state_tol: float | None = None  # relative change of solution by time step, disabled if None
+    steady_state_window: int = 10  # number of consecutive time steps with change below tolerance
+    steady_state_solve: bool = False  # solve steady equation directly after steady state detection
 
 
 @dataclass
 class InputData:
-    # TODO: add source linearization
-    sc: float = 0.0  # s = sc + sp * Tp
-    sp: float = 0.0  # s = sc + sp * Tp
+    # linearized volumetric source s = sc + sp * Tp of internal control volumes
+    sc: float | np.ndarray = 0.0  # constant part, scalar or field of shape (nx,) or (nx, ny)
+    sp: float | np.ndarray = 0.0  # slope, negative part is implicit, positive part is taken by the latest solution
+    source: Callable | None = None  # function (x, t) -> (sc, sp) of node coordinates and solution, overrides sc, sp
+
+    # Picard iterations of state-dependent source on the new time layer
+    nonlinear_max_iterations: int = 1  # 1 means source linearized by the previous time layer
+    nonlinear_residual_tol: float = 1E-10  # relative residual norm of discrete analogue
+    nonlinear_increment_tol: float = 1E-10  # relative norm of temperature update
 
     k: float | None = 100.0  # thermal diffusivity, m^2 / sec
     cp: float | None = None  # specific heat capacity, J / (kg * K)
@@ -26,3 +59,29 @@ class InputData:
     t_init: float = 100.0  # K
     t_left: float = 100.0  # K
     t_right: float = 300.0  # K
+
+    tdma_method: TdmaMethod = TdmaMethod.THOMAS  # tridiagonal solver algorithm
+    frozen_operator: bool = True  # reuse factorized operator between time steps of the same size
+    adi_tol: float = 1E-8  # relative residual norm of ADI iterations on 2D grid
+    adi_max_iterations: int = 1000  # maximum number of ADI iterations on 2D grid
+    krylov_method: KrylovMethod | None = None  # sparse Krylov solver (CG) instead of TDMA, disabled if None
+    krylov_preconditioner: Preconditioner = Preconditioner.ILU  # preconditioner of Krylov solver
+    krylov_tol: float = 1E-10  # relative residual norm of Krylov iterations
+    krylov_max_iterations: int = 1000  # maximum number of Krylov iterations
+    multigrid_cycle: MultigridCycle | None = None  # geometric multigrid cycle instead of TDMA, disabled if None
+    multigrid_tol: float = 1E-8  # relative residual norm of multigrid cycles
+    multigrid_max_cycles: int = 50  # maximum number of multigrid cycles
+    precision: Precision = Precision.DOUBLE  # float32 arrays if SINGLE, float32 TDMA with float64 refinement if MIXED
+    refinement_tol: float = 1E-10  # relative residual norm of mixed precision iterative refinement
+    refinement_max_iterations: int = 10  # maximum number of mixed precision refinement steps
+
+    diagnostics_path: str | None = None  # HDF5 file for a_p, a_e, a_w, b snapshots, disabled if None
+    diagnostics_stride: int = 1  # record every n-th time step
+
+    output_path: str | None = None  # HDF5 file for saved time layers, kept in memory if None
+    output_compression: str | None = 'gzip'  # HDF5 compression filter of saved time layers
+
+    checkpoint_path: str | None = None  # npz file for solver state, disabled if None
+    checkpoint_step_interval: int | None = None  # save checkpoint every n-th time step
+    checkpoint_wall_interval: float | None = 600.0  # save checkpoint every n seconds of wall-clock time
+    restart: bool = False  # resume from checkpoint_path if it exists, output_path file must exist if set
@@ -0,0 +1,189 @@
+import logging
+from enum import Enum
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+
+class KrylovMethod(Enum):
+    CG = 'cg'  # conjugate gradients, symmetric operators (heat conduction)
+    BICGSTAB = 'bicgstab'  # stabilized biconjugate gradients, nonsymmetric operators (convection)
+    GMRES = 'gmres'  # restarted generalized minimal residual, nonsymmetric operators (convection)
+
+
+class Preconditioner(Enum):
+    NONE = 'none'
+    JACOBI = 'jacobi'  # inverse of the main diagonal
+    ILU = 'ilu'  # incomplete LU factorization
+
+
+class SparseKrylovSolver:
+    def __init__(self, nx: int, ny: int, method: KrylovMethod = KrylovMethod.BICGSTAB,
+                 preconditioner: Preconditioner = Preconditioner.ILU, tol: float = 1E-10, max_iterations: int = 1000):
+        """Preconditioned Krylov solver for 5-point discrete analogue on (nx, ny) grid.
+
+        Sparsity structure of CSR matrix is built once, matrix values are gathered from the coefficient arrays
+        by a precomputed index map on every operator update.
+
+        Parameters
+        ----------
+        nx: int
+            Number of grid points by X.
+        ny: int
+            Number of grid points by Y.
+        method: KrylovMethod
+            Krylov subspace method.
+        preconditioner: Preconditioner
+            Preconditioner type, recalculated on every operator update.
+        tol: float
+            Relative residual norm to stop iterations.
+        max_iterations: int
+            Maximum number of iterations.
+
+        Notes
+        ----------
+        Cell (i, j) is the row i * ny + j. Row of the discrete analogue
+        a_p * x_P = a_e * x_E + a_w * x_W + a_n * x_N + a_s * x_S + b is stored as
+        a_p * x_P - a_e * x_E - a_w * x_W - a_n * x_N - a_s * x_S = b.
+
+        Rows without neighbour links, e.g. Dirichlet boundary values, are solved directly and their columns are
+        moved to the right side. It keeps the matrix of heat conduction symmetric, as CG requires.
+
+        """
+
+        self._method = method
+        self._preconditioner_type = preconditioner
+        self._tol = tol
+        self._max_iterations = max_iterations
+
+        n = nx * ny
+        cells = np.arange(n).reshape(nx, ny)
+
+        # coefficient slot k * n + cell of the stacked array [a_p, a_e, a_w, a_n, a_s] and column of every link
+        links = [
+            (0, cells, cells),
+            (1, cells[:-1], cells[1:]),
+            (2, cells[1:], cells[:-1]),
+            (3, cells[:, :-1], cells[:, 1:]),
+            (4, cells[:, 1:], cells[:, :-1]),
+        ]
+
+        rows = np.concatenate([row.reshape(-1) for _, row, _ in links])
+        cols = np.concatenate([col.reshape(-1) for _, _, col in links])
+        slots = np.concatenate([k * n + row.reshape(-1) for k, row, _ in links])
+
+        # positions of CSR entries in COO order give the gather map of matrix values
+        order = sp.coo_matrix((np.arange(1, rows.size + 1, dtype=np.float64), (rows, cols)), shape=(n, n)).tocsr()
+        self._slots: np.ndarray = slots[order.data.astype(np.int64) - 1]
+        self._rows: np.ndarray = np.repeat(np.arange(n), np.diff(order.indptr))
+
+        # full operator and the matrix without links to decoupled rows share the sparsity structure
+        self._operator = sp.csr_matrix((np.zeros(rows.size, dtype=np.float64), order.indices, order.indptr),
+                                       shape=(n, n))
+        self._matrix = sp.csr_matrix((np.zeros(rows.size, dtype=np.float64), order.indices, order.indptr),
+                                     shape=(n, n))
+
+        self._coefficients: np.ndarray = np.zeros(shape=(5, n), dtype=np.float64)
+        self._decoupled: np.ndarray = np.zeros(shape=n, dtype=bool)
+        self._b: np.ndarray = np.zeros(shape=n, dtype=np.float64)
+        self._preconditioner: spla.LinearOperator | None = None
+
+        self.iterations: int = 0
+
+    def set_operator(self, a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, a_n: np.ndarray, a_s: np.ndarray):
+        """Update matrix values and preconditioner by coefficients of discrete analogue.
+
+        Parameters
+        ----------
+        a_p, a_e, a_w, a_n, a_s: np.ndarray
+            Coefficients of discrete analogue, shape (nx, ny).
+
+        """
+
+        coefficients = self._coefficients
+        np.copyto(coefficients[0], a_p.reshape(-1))
+
+        for k, a in enumerate((a_e, a_w, a_n, a_s), start=1):
+            np.negative(a.reshape(-1), out=coefficients[k])
+
+        np.take(coefficients.reshape(-1), self._slots, out=self._operator.data)
+
+        # rows without links are solved directly, their columns are removed from the other rows
+        np.equal(np.abs(coefficients[1:]).sum(axis=0), 0.0, out=self._decoupled)
+        np.copyto(self._matrix.data, self._operator.data)
+        self._matrix.data[self._decoupled[self._matrix.indices] & ~self._decoupled[self._rows]] = 0.0
+
+        self._preconditioner = self._get_preconditioner()
+
+    def _get_preconditioner(self) -> spla.LinearOperator | None:
+        """Preconditioner of the current matrix.
+        """
+
+        n = self._matrix.shape[0]
+
+        if self._preconditioner_type == Preconditioner.JACOBI:
+            inv_diagonal = 1.0 / self._matrix.diagonal()
+            return spla.LinearOperator(shape=(n, n), matvec=lambda r: inv_diagonal * r, dtype=np.float64)
+
+        if self._preconditioner_type == Preconditioner.ILU:
+            ilu = spla.spilu(self._matrix.tocsc())
+            return spla.LinearOperator(shape=(n, n), matvec=ilu.solve, dtype=np.float64)
+
+        return None
+
+    def solve(self, b: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """Solve discrete analogue with the current operator.
+
+        Parameters
+        ----------
+        b: np.ndarray
+            Right side of discrete analogue, shape (nx, ny) or (nx,).
+        x: np.ndarray
+            Initial guess, e.g. solution on the previous time layer. Overwritten in place by the solution.
+
+        Returns
+        ----------
+        x: np.ndarray
+            Solution values.
+
+        """
+
+        b_flat = b.reshape(-1)
+        x_flat = x.reshape(-1)
+
+        if not np.shares_memory(x_flat, x):
+            raise ValueError('Krylov solver result must be a contiguous array!')
+
+        # decoupled rows are known: x = b / a_p, their links are moved to the right side
+        decoupled = self._decoupled
+        x_flat[decoupled] = b_flat[decoupled] / self._coefficients[0, decoupled]
+
+        known_product = self._operator @ np.where(decoupled, x_flat, 0.0)
+        np.subtract(b_flat, known_product, out=self._b)
+        self._b[decoupled] = b_flat[decoupled]
+
+        self.iterations = 0
+
+        def count(_):
+            self.iterations += 1
+
+        kwargs = dict(x0=x_flat, rtol=self._tol, atol=0.0, maxiter=self._max_iterations, M=self._preconditioner,
+                      callback=count)
+
+        if self._method == KrylovMethod.CG:
+            solution, info = spla.cg(self._matrix, self._b, **kwargs)
+        elif self._method == KrylovMethod.GMRES:
+            solution, info = spla.gmres(self._matrix, self._b, callback_type='pr_norm', **kwargs)
+        else:
+            solution, info = spla.bicgstab(self._matrix, self._b, **kwargs)
+
+        # breakdown (info < 0) usually happens close to the solution, so it is reported as non-convergence
+        if info != 0:
+            residual = (np.linalg.norm(self._b - self._matrix @ solution) /
+                        max(np.linalg.norm(self._b), np.finfo(np.float64).tiny))
+            logging.warning(f'{self._method.name} did not converge (info = {info}), residual = {residual}')
+
+        x_flat[...] = solution
+
+        return x
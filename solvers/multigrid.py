@@ -0,0 +1,309 @@
+from enum import Enum
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+from solvers.adi import calc_adi_residual, run_adi_sweep
+
+
+class MultigridCycle(Enum):
+    V = 'v'  # one coarse grid correction per level
+    W = 'w'  # two coarse grid corrections per level
+
+
+def _get_coarse_points(n: int) -> np.ndarray:
+    """Every second grid point and the last one. Grid with 3 points or less is not coarsened.
+    """
+
+    if n <= 3:
+        return np.arange(n)
+
+    return np.unique(np.append(np.arange(0, n, 2), n - 1))
+
+
+def _get_interpolation(n: int, coarse_points: np.ndarray) -> sp.csr_matrix:
+    """Linear interpolation by node index from coarse points to grid of n points, shape (n, n_coarse).
+
+    Weights do not depend on node coordinates, so on non-uniform grid they are the uniform grid weights.
+    """
+
+    fine = np.arange(n)
+    right = np.searchsorted(coarse_points, fine)
+    left = np.maximum(right - 1, 0)
+    right = np.minimum(right, coarse_points.size - 1)
+
+    is_coarse = coarse_points[right] == fine
+    left = np.where(is_coarse, right, left)
+    span = np.maximum(coarse_points[right] - coarse_points[left], 1)
+    weight = np.where(is_coarse, 1.0, (coarse_points[right] - fine) / span)
+
+    rows = np.concatenate([fine, fine])
+    cols = np.concatenate([left, right])
+    values = np.concatenate([weight, 1.0 - weight])
+
+    return sp.csr_matrix((values, (rows, cols)), shape=(n, coarse_points.size))
+
+
+def _get_series_coefficients(a: np.ndarray, coarse_points: np.ndarray, shift: int) -> np.ndarray:
+    """Coefficients of coarse faces by X as series connection of fine faces between neighbour coarse points.
+
+    Parameters
+    ----------
+    a: np.ndarray
+        a_e (shift=1) or a_w (shift=-1) fine coefficients, shape (nx, ny).
+    coarse_points: np.ndarray
+        Indices of coarse points by X.
+    shift: int
+        Direction of the neighbour coarse point.
+
+    Returns
+    ----------
+    coefficients: np.ndarray
+        Coarse coefficients on fine lines by Y, shape (nx_coarse, ny).
+
+    """
+
+    coefficients = np.zeros(shape=(coarse_points.size, a.shape[1]), dtype=a.dtype)
+
+    if coarse_points.size < 2:
+        return coefficients
+
+    # fine faces from the coarse point towards the neighbour one: a[c] and a[c +/- 1] if the gap is 2
+    start = coarse_points[:-1] if shift > 0 else coarse_points[1:]
+    gap = np.diff(coarse_points)[:, None]
+
+    with np.errstate(divide='ignore'):
+        resistance = 1.0 / a[start] + np.where(gap == 2, 1.0 / a[start + shift], 0.0)
+        target = slice(None, -1) if shift > 0 else slice(1, None)
+        coefficients[target] = 1.0 / resistance
+
+    return coefficients
+
+
+class _MultigridLevel:
+    def __init__(self, a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, a_n: np.ndarray, a_s: np.ndarray):
+        """Discrete analogue and workspace of a single multigrid level.
+        """
+
+        self.a_p = a_p
+        self.a_e = a_e
+        self.a_w = a_w
+        self.a_n = a_n
+        self.a_s = a_s
+
+        self.b = np.zeros_like(a_p)
+        self.x = np.zeros_like(a_p)
+        self.workspace = np.zeros(shape=(4, *a_p.shape), dtype=a_p.dtype)
+
+        # rows without neighbour links, e.g. Dirichlet boundary values
+        self.decoupled = (a_e == 0.0) & (a_w == 0.0) & (a_n == 0.0) & (a_s == 0.0)
+
+        # interpolation from the next coarser level
+        self.interpolation_x: sp.csr_matrix | None = None
+        self.interpolation_y: sp.csr_matrix | None = None
+
+    @property
+    def shape(self) -> tuple:
+        return self.a_p.shape
+
+    def coarsen(self) -> '_MultigridLevel | None':
+        """Next coarser level by every second point in each direction with more than 3 points.
+
+        Coarse coefficients are conductances of the coarse control volumes: fine faces are connected in series
+        along the link and in parallel across it, the rest of the main diagonal is restricted as a source.
+
+        """
+
+        nx, ny = self.shape
+        points_x = _get_coarse_points(nx)
+        points_y = _get_coarse_points(ny)
+
+        if points_x.size == nx and points_y.size == ny:
+            return None
+
+        self.interpolation_x = _get_interpolation(nx, points_x)
+        self.interpolation_y = _get_interpolation(ny, points_y)
+
+        a_e = self._restrict_y(_get_series_coefficients(self.a_e, points_x, shift=1))
+        a_w = self._restrict_y(_get_series_coefficients(self.a_w, points_x, shift=-1))
+        a_n = self._restrict_x(_get_series_coefficients(self.a_n.T, points_y, shift=1).T)
+        a_s = self._restrict_x(_get_series_coefficients(self.a_s.T, points_y, shift=-1).T)
+
+        source = self.restrict(self.a_p - self.a_e - self.a_w - self.a_n - self.a_s)
+        a_p = a_e + a_w + a_n + a_s + source
+
+        # decoupled rows stay decoupled, their correction is zero
+        decoupled = self.decoupled[np.ix_(points_x, points_y)]
+
+        for a in (a_e, a_w, a_n, a_s):
+            a[decoupled] = 0.0
+
+        a_p[decoupled] = 1.0
+
+        return _MultigridLevel(a_p=a_p, a_e=a_e, a_w=a_w, a_n=a_n, a_s=a_s)
+
+    def _restrict_x(self, values: np.ndarray) -> np.ndarray:
+        return np.asarray(self.interpolation_x.T @ values)
+
+    def _restrict_y(self, values: np.ndarray) -> np.ndarray:
+        return np.asarray((self.interpolation_y.T @ values.T).T)
+
+    def restrict(self, values: np.ndarray) -> np.ndarray:
+        """Sum fine values of finite volume equations into coarse control volumes, transposed interpolation.
+        """
+
+        return self._restrict_y(self._restrict_x(values))
+
+    def interpolate(self, values: np.ndarray) -> np.ndarray:
+        """Interpolate values of the next coarser level.
+        """
+
+        return np.asarray(self.interpolation_x @ (self.interpolation_y @ values.T).T)
+
+    def get_matrix(self) -> sp.csc_matrix:
+        """Sparse matrix of discrete analogue, cell (i, j) is the row i * ny + j.
+        """
+
+        nx, ny = self.shape
+        offsets = [0, ny, -ny]
+        diagonals = [self.a_p.reshape(-1), -self.a_e.reshape(-1)[:-ny], -self.a_w.reshape(-1)[ny:]]
+
+        # neighbours outside the grid have zero coefficients, so flattened diagonals do not wrap
+        if ny > 1:
+            offsets += [1, -1]
+            diagonals += [-self.a_n.reshape(-1)[:-1], -self.a_s.reshape(-1)[1:]]
+
+        return sp.diags(diagonals, offsets, shape=(nx * ny, nx * ny), format='csc')
+
+
+class GeometricMultigrid:
+    def __init__(self, a_p: np.ndarray, a_e: np.ndarray, a_w: np.ndarray, a_n: np.ndarray, a_s: np.ndarray,
+                 cycle: MultigridCycle = MultigridCycle.V, pre_smoothing: int = 1, post_smoothing: int = 1,
+                 coarse_size: int = 64, parallel: bool = False):
+        """Geometric multigrid method for 5-point discrete analogue of diffusion equation on (nx, ny) grid.
+
+        Levels are coarsened by every second grid point, the smoother is a pair of line sweeps by X and Y solved by
+        batched TDMA, the coarsest level is solved by sparse LU factorization.
+
+        The grid may be non-uniform, e.g. stretched by X: grid spacing enters only through the coefficients, and
+        coarse coefficients are series connections of fine faces. Prolongation interpolates linearly by node index,
+        not by coordinate, so on strongly stretched grids the coarse grid correction is less accurate and more
+        cycles may be needed.
+
+        Parameters
+        ----------
+        a_p, a_e, a_w, a_n, a_s: np.ndarray
+            Coefficients of discrete analogue a_p * x_P = a_e * x_E + a_w * x_W + a_n * x_N + a_s * x_S + b,
+            shape (nx, ny). Neighbours outside the grid must have zero coefficients.
+        cycle: MultigridCycle
+            V or W cycle.
+        pre_smoothing: int
+            Number of line sweep pairs before coarse grid correction.
+        post_smoothing: int
+            Number of line sweep pairs after coarse grid correction.
+        coarse_size: int
+            Number of grid points, which is solved directly.
+        parallel: bool
+            Flag to solve lines of each sweep on all available cores.
+
+        """
+
+        self._cycle = cycle
+        self._pre_smoothing = pre_smoothing
+        self._post_smoothing = post_smoothing
+        self._parallel = parallel
+
+        self._levels: list[_MultigridLevel] = [_MultigridLevel(a_p=a_p, a_e=a_e, a_w=a_w, a_n=a_n, a_s=a_s)]
+
+        while self._levels[-1].a_p.size > coarse_size:
+            level = self._levels[-1].coarsen()
+
+            if level is None:
+                break
+
+            self._levels.append(level)
+
+        self._coarse_solver = spla.splu(self._levels[-1].get_matrix())
+
+    @property
+    def n_levels(self) -> int:
+        return len(self._levels)
+
+    def solve(self, b: np.ndarray, x: np.ndarray, tol: float = 1E-8, max_cycles: int = 50) -> tuple[int, float]:
+        """Solve discrete analogue by multigrid cycles.
+
+        Parameters
+        ----------
+        b: np.ndarray
+            Right side of discrete analogue, shape (nx, ny).
+        x: np.ndarray
+            Initial guess, overwritten in place by the solution, shape (nx, ny).
+        tol: float
+            Relative residual norm ||r|| / ||b|| to stop cycles.
+        max_cycles: int
+            Maximum number of cycles.
+
+        Returns
+        ----------
+        cycles: int
+            Number of cycles.
+        residual: float
+            Relative residual norm of the solution.
+
+        """
+
+        level = self._levels[0]
+        level.b = b
+        level.x = x
+
+        r = level.workspace[3]
+        b_norm = max(np.linalg.norm(b), np.finfo(np.float64).tiny)
+
+        residual = np.linalg.norm(calc_adi_residual(level.a_p, level.a_e, level.a_w, level.a_n, level.a_s, b, x,
+                                                    result=r)) / b_norm
+        cycles = 0
+
+        while residual > tol and cycles < max_cycles:
+            self._run_cycle(0)
+
+            residual = np.linalg.norm(calc_adi_residual(level.a_p, level.a_e, level.a_w, level.a_n, level.a_s, b, x,
+                                                        result=r)) / b_norm
+            cycles += 1
+
+        return cycles, residual
+
+    def _smooth(self, level: _MultigridLevel, n_sweeps: int):
+        d, p, q, _ = level.workspace
+
+        for _ in range(n_sweeps):
+            run_adi_sweep(level.a_p, level.a_e, level.a_w, level.a_n, level.a_s, level.b, level.x, d, p, q,
+                          parallel=self._parallel)
+
+    def _run_cycle(self, index: int):
+        """Recursive V or W cycle starting from the level index with its b and initial guess x.
+        """
+
+        level = self._levels[index]
+
+        if index == len(self._levels) - 1:
+            level.x[...] = self._coarse_solver.solve(level.b.reshape(-1)).reshape(level.shape)
+            return
+
+        self._smooth(level, self._pre_smoothing)
+
+        # coarse grid correction equation by the restricted residual
+        r = calc_adi_residual(level.a_p, level.a_e, level.a_w, level.a_n, level.a_s, level.b, level.x,
+                              result=level.workspace[3])
+
+        coarse = self._levels[index + 1]
+        coarse.b[...] = level.restrict(r)
+        coarse.b[coarse.decoupled] = 0.0
+        coarse.x.fill(0.0)
+
+        for _ in range(2 if self._cycle == MultigridCycle.W else 1):
+            self._run_cycle(index + 1)
+
+        level.x += level.interpolate(coarse.x)
+
+        self._smooth(level, self._post_smoothing)
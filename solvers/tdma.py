@@ -1,12 +1,260 @@
+from enum import Enum
+
+import numba as nb
 import numpy as np
+from numba import njit, prange
+
+
+class TdmaMethod(Enum):
+    THOMAS = 'thomas'  # serial Thomas algorithm
+    PARTITIONED = 'partitioned'  # multi-core partition method with reduced interface system
+
+
+class Precision(Enum):
+    DOUBLE = 'double'  # float64 discrete analogue, solve and saved history
+    SINGLE = 'single'  # float32 discrete analogue, solve and saved history
+    MIXED = 'mixed'  # float64 discrete analogue and history, float32 TDMA solve refined by float64 residuals
+
+
+def get_precision_dtype(precision: Precision) -> type:
+    """Floating point type of discrete analogue and solution arrays for the precision mode.
+    """
+
+    return np.float32 if precision == Precision.SINGLE else np.float64
+
+
+@njit(cache=True)
+def _tdma_kernel(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray,
+                 p: np.ndarray, q: np.ndarray, result: np.ndarray):
+    """Compiled in-place TDMA kernel for a single system a[i] * x[i] = b[i] * x[i + 1] + c[i] * x[i - 1] + d[i].
+
+    All arrays are one-dimensional with the same length. p and q are workspace buffers, result is overwritten.
+
+    """
+
+    n = a.shape[0]
+
+    p[0] = b[0] / a[0]
+    q[0] = d[0] / a[0]
+
+    for i in range(1, n):
+        tmp = a[i] - c[i] * p[i - 1]
+        p[i] = b[i] / tmp
+        q[i] = (d[i] + c[i] * q[i - 1]) / tmp
+
+    result[n - 1] = q[n - 1]
+    p[n - 1] = 0.0
+
+    for i in range(n - 2, -1, -1):
+        result[i] = p[i] * result[i + 1] + q[i]
+
+
+@njit(cache=True)
+def _tdma_factorize_kernel(a: np.ndarray, b: np.ndarray, c: np.ndarray, p: np.ndarray, denominator: np.ndarray):
+    """Compiled forward sweep of the TDMA kernel, which depends on the matrix only.
+    """
+
+    n = a.shape[0]
+
+    denominator[0] = a[0]
+    p[0] = b[0] / a[0]
+
+    for i in range(1, n):
+        denominator[i] = a[i] - c[i] * p[i - 1]
+        p[i] = b[i] / denominator[i]
+
+    p[n - 1] = 0.0
+
+
+@njit(cache=True)
+def _tdma_factorized_kernel(c: np.ndarray, p: np.ndarray, denominator: np.ndarray, d: np.ndarray,
+                            q: np.ndarray, result: np.ndarray):
+    """Compiled right-side sweep and back substitution of the TDMA kernel using cached forward sweep factors.
+    """
+
+    n = d.shape[0]
+
+    q[0] = d[0] / denominator[0]
+
+    for i in range(1, n):
+        q[i] = (d[i] + c[i] * q[i - 1]) / denominator[i]
+
+    result[n - 1] = q[n - 1]
+
+    for i in range(n - 2, -1, -1):
+        result[i] = p[i] * result[i + 1] + q[i]
+
+
+@njit(cache=True)
+def _tdma_residual_kernel(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, x: np.ndarray,
+                          result: np.ndarray):
+    """Compiled residual a[i] * x[i] - b[i] * x[i + 1] - c[i] * x[i - 1] - d[i] of a single system.
+    """
+
+    n = a.shape[0]
+
+    for i in range(n):
+        result[i] = a[i] * x[i] - d[i]
+
+        if i > 0:
+            result[i] -= c[i] * x[i - 1]
+
+        if i < n - 1:
+            result[i] -= b[i] * x[i + 1]
+
+
+@njit(cache=True)
+def _tdma_batch_residual_kernel(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, x: np.ndarray,
+                                result: np.ndarray):
+    """Compiled residual kernel for a batch of independent systems stored as rows of (batch, n) arrays.
+    """
+
+    for k in range(a.shape[0]):
+        _tdma_residual_kernel(a[k], b[k], c[k], d[k], x[k], result[k])
+
+
+@njit(cache=True)
+def _tdma_batch_kernel(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray,
+                       p: np.ndarray, q: np.ndarray, result: np.ndarray):
+    """Compiled TDMA kernel for a batch of independent systems stored as rows of (batch, n) arrays.
+    """
+
+    for k in range(a.shape[0]):
+        _tdma_kernel(a[k], b[k], c[k], d[k], p[k], q[k], result[k])
+
+
+@njit(cache=True, parallel=True)
+def _tdma_batch_kernel_parallel(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray,
+                                p: np.ndarray, q: np.ndarray, result: np.ndarray):
+    """Multi-core version of _tdma_batch_kernel, systems are distributed between threads.
+    """
 
+    for k in prange(a.shape[0]):
+        _tdma_kernel(a[k], b[k], c[k], d[k], p[k], q[k], result[k])
 
-# import numba as nb
-# from numba import guvectorize, float64, prange, njit
 
+@njit(cache=True)
+def _tdma_columns_kernel(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray,
+                         p: np.ndarray, q: np.ndarray, result: np.ndarray, start: int, stop: int):
+    """Compiled TDMA kernel for independent systems stored as columns [start, stop) of (n, batch) arrays.
 
-# @guvectorize([(float64[:],) * 5], '(n), (n), (n), (n) -> (n)', nopython=False, target_backend=True)
-def run_tdma(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray):
+    Every sweep step updates all columns of a row, so C-ordered arrays are traversed contiguously.
+
+    """
+
+    n = a.shape[0]
+
+    for k in range(start, stop):
+        p[0, k] = b[0, k] / a[0, k]
+        q[0, k] = d[0, k] / a[0, k]
+
+    for i in range(1, n):
+        for k in range(start, stop):
+            tmp = a[i, k] - c[i, k] * p[i - 1, k]
+            p[i, k] = b[i, k] / tmp
+            q[i, k] = (d[i, k] + c[i, k] * q[i - 1, k]) / tmp
+
+    for k in range(start, stop):
+        result[n - 1, k] = q[n - 1, k]
+        p[n - 1, k] = 0.0
+
+    for i in range(n - 2, -1, -1):
+        for k in range(start, stop):
+            result[i, k] = p[i, k] * result[i + 1, k] + q[i, k]
+
+
+@njit(cache=True, parallel=True)
+def _tdma_columns_kernel_parallel(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray,
+                                  p: np.ndarray, q: np.ndarray, result: np.ndarray, n_blocks: int):
+    """Multi-core version of _tdma_columns_kernel, blocks of columns are distributed between threads.
+    """
+
+    batch = a.shape[1]
+
+    for block in prange(n_blocks):
+        _tdma_columns_kernel(a, b, c, d, p, q, result, block * batch // n_blocks, (block + 1) * batch // n_blocks)
+
+
+@njit(cache=True, parallel=True)
+def _tdma_partitioned_kernel(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray,
+                             starts: np.ndarray, ends: np.ndarray,
+                             p: np.ndarray, v: np.ndarray, w: np.ndarray, result: np.ndarray):
+    """Compiled partition method for a single system split into blocks divided by separator rows.
+
+    Block k covers rows [starts[k], ends[k]), separator k is the row ends[k] between blocks k and k + 1.
+    Every block is solved independently as x = y + sigma_left * v + sigma_right * w, where sigma are the
+    separator values. Separators satisfy a tridiagonal reduced system, solved by the Thomas algorithm.
+
+    """
+
+    n_parts = starts.shape[0]
+
+    # local solutions of all blocks with zero separator values and two spike vectors
+    for k in prange(n_parts):
+        s = starts[k]
+        e = ends[k]
+
+        tmp = a[s]
+        p[s] = b[s] / tmp
+        result[s] = d[s] / tmp
+        v[s] = c[s] / tmp if k > 0 else 0.0
+        w[s] = b[s] / tmp if s == e - 1 and k < n_parts - 1 else 0.0
+
+        for i in range(s + 1, e):
+            tmp = a[i] - c[i] * p[i - 1]
+            p[i] = b[i] / tmp
+            result[i] = (d[i] + c[i] * result[i - 1]) / tmp
+            v[i] = c[i] * v[i - 1] / tmp
+            w[i] = ((b[i] if i == e - 1 and k < n_parts - 1 else 0.0) + c[i] * w[i - 1]) / tmp
+
+        for i in range(e - 2, s - 1, -1):
+            result[i] = p[i] * result[i + 1] + result[i]
+            v[i] = p[i] * v[i + 1] + v[i]
+            w[i] = p[i] * w[i + 1] + w[i]
+
+    # reduced system for separator values
+    n_sep = n_parts - 1
+    ra = np.empty(n_sep, dtype=a.dtype)
+    rb = np.empty(n_sep, dtype=a.dtype)
+    rc = np.empty(n_sep, dtype=a.dtype)
+    rd = np.empty(n_sep, dtype=a.dtype)
+
+    for k in range(n_sep):
+        j = ends[k]
+        ra[k] = a[j] - c[j] * w[j - 1] - b[j] * v[j + 1]
+        rb[k] = b[j] * w[j + 1]
+        rc[k] = c[j] * v[j - 1]
+        rd[k] = d[j] + c[j] * result[j - 1] + b[j] * result[j + 1]
+
+    sigma = np.empty(n_sep, dtype=a.dtype)
+    _tdma_kernel(ra, rb, rc, rd, np.empty(n_sep, dtype=a.dtype), np.empty(n_sep, dtype=a.dtype), sigma)
+
+    # recover block solutions from separator values
+    for k in prange(n_parts):
+        sigma_left = sigma[k - 1] if k > 0 else 0.0
+        sigma_right = sigma[k] if k < n_sep else 0.0
+
+        for i in range(starts[k], ends[k]):
+            result[i] += sigma_left * v[i] + sigma_right * w[i]
+
+        if k < n_sep:
+            result[ends[k]] = sigma[k]
+
+
+def _as_vector(array: np.ndarray) -> np.ndarray:
+    """Return a flat view of (n,) or (n, 1) array without copying.
+    """
+
+    vector = array.reshape(-1)
+
+    if not np.shares_memory(vector, array):
+        raise ValueError('TDMA arrays must be contiguous to be used as workspace or result buffers!')
+
+    return vector
+
+
+def run_tdma(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, result: np.ndarray | None = None,
+             p: np.ndarray | None = None, q: np.ndarray | None = None) -> np.ndarray:
     """TDMA algorithm using numba.
 
     Parameters
@@ -20,28 +268,404 @@ def run_tdma(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray):
     d: np.ndarray
         Right-side vector.
     result: np.ndarray
-        Result vector.
+        Result vector. Allocated if not set, otherwise overwritten in place.
+    p: np.ndarray
+        Workspace buffer for forward sweep coefficients. Allocated if not set.
+    q: np.ndarray
+        Workspace buffer for forward sweep right-side values. Allocated if not set.
+
+    Returns
+    ----------
+    result: np.ndarray
+        Result vector with the same shape as a.
 
     """
 
-    result = np.zeros_like(a)
+    if result is None:
+        result = np.empty_like(a)
+
+    if p is None:
+        p = np.empty_like(a)
+
+    if q is None:
+        q = np.empty_like(a)
+
+    _tdma_kernel(a.reshape(-1), b.reshape(-1), c.reshape(-1), d.reshape(-1),
+                 _as_vector(p), _as_vector(q), _as_vector(result))
+
+    return result
+
+
+def calc_tdma_residual(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, x: np.ndarray,
+                       result: np.ndarray | None = None) -> np.ndarray:
+    """Residual of tridiagonal system for the vector x.
+
+    Parameters
+    ----------
+    a: np.ndarray
+        Main diagonal values.
+    b: np.ndarray
+        Upper diagonal values.
+    c: np.ndarray
+        Lower diagonal values.
+    d: np.ndarray
+        Right-side vector.
+    x: np.ndarray
+        Vector to check.
+    result: np.ndarray
+        Residual vector. Allocated if not set, otherwise overwritten in place.
+
+    Returns
+    ----------
+    result: np.ndarray
+        Residual vector with the same shape as a.
+
+    """
+
+    if result is None:
+        result = np.empty_like(a)
+
+    _tdma_residual_kernel(a.reshape(-1), b.reshape(-1), c.reshape(-1), d.reshape(-1), x.reshape(-1),
+                          _as_vector(result))
+
+    return result
+
+
+def calc_tdma_batch_residual(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, x: np.ndarray,
+                             result: np.ndarray | None = None) -> np.ndarray:
+    """Residuals of a batch of independent tridiagonal systems for the vectors x.
+
+    Parameters
+    ----------
+    a: np.ndarray
+        Main diagonal values, shape (batch, n).
+    b: np.ndarray
+        Upper diagonal values, shape (batch, n).
+    c: np.ndarray
+        Lower diagonal values, shape (batch, n).
+    d: np.ndarray
+        Right-side vectors, shape (batch, n).
+    x: np.ndarray
+        Vectors to check, shape (batch, n).
+    result: np.ndarray
+        Residual vectors, shape (batch, n). Allocated if not set, otherwise overwritten in place.
+
+    Returns
+    ----------
+    result: np.ndarray
+        Residual vectors, shape (batch, n). Every row is the residual of calc_tdma_residual for its system.
+
+    """
+
+    if a.ndim != 2:
+        raise ValueError(f'Batched TDMA expects (batch, n) arrays, got shape {a.shape}!')
+
+    if result is None:
+        result = np.empty_like(a)
+
+    _tdma_batch_residual_kernel(a, b, c, d, x, result)
+
+    return result
+
+
+def factorize_tdma(a: np.ndarray, b: np.ndarray, c: np.ndarray, p: np.ndarray | None = None,
+                   denominator: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Forward sweep of TDMA algorithm, which can be reused while the matrix is constant.
+
+    Parameters
+    ----------
+    a: np.ndarray
+        Main diagonal values.
+    b: np.ndarray
+        Upper diagonal values.
+    c: np.ndarray
+        Lower diagonal values.
+    p: np.ndarray
+        Buffer for forward sweep coefficients. Allocated if not set.
+    denominator: np.ndarray
+        Buffer for forward sweep denominators. Allocated if not set.
+
+    Returns
+    ----------
+    p: np.ndarray
+        Forward sweep coefficients.
+    denominator: np.ndarray
+        Forward sweep denominators.
+
+    """
+
+    if p is None:
+        p = np.empty_like(a)
+
+    if denominator is None:
+        denominator = np.empty_like(a)
+
+    _tdma_factorize_kernel(a.reshape(-1), b.reshape(-1), c.reshape(-1), _as_vector(p), _as_vector(denominator))
+
+    return p, denominator
+
+
+def run_tdma_factorized(c: np.ndarray, p: np.ndarray, denominator: np.ndarray, d: np.ndarray,
+                        result: np.ndarray | None = None, q: np.ndarray | None = None) -> np.ndarray:
+    """TDMA algorithm for a new right-side vector using factors from factorize_tdma.
+
+    Parameters
+    ----------
+    c: np.ndarray
+        Lower diagonal values.
+    p: np.ndarray
+        Forward sweep coefficients.
+    denominator: np.ndarray
+        Forward sweep denominators.
+    d: np.ndarray
+        Right-side vector.
+    result: np.ndarray
+        Result vector. Allocated if not set, otherwise overwritten in place.
+    q: np.ndarray
+        Workspace buffer for forward sweep right-side values. Allocated if not set.
+
+    Returns
+    ----------
+    result: np.ndarray
+        Result vector with the same shape as d.
+
+    """
+
+    if result is None:
+        result = np.empty_like(d)
+
+    if q is None:
+        q = np.empty_like(d)
+
+    _tdma_factorized_kernel(c.reshape(-1), p.reshape(-1), denominator.reshape(-1), d.reshape(-1),
+                            _as_vector(q), _as_vector(result))
+
+    return result
+
+
+def run_tdma_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, result: np.ndarray | None = None,
+                   p: np.ndarray | None = None, q: np.ndarray | None = None, parallel: bool = False,
+                   axis: int = 1) -> np.ndarray:
+    """TDMA algorithm for a batch of independent systems of the same length using numba.
+
+    Parameters
+    ----------
+    a: np.ndarray
+        Main diagonal values, shape (batch, n).
+    b: np.ndarray
+        Upper diagonal values, shape (batch, n).
+    c: np.ndarray
+        Lower diagonal values, shape (batch, n).
+    d: np.ndarray
+        Right-side vectors, shape (batch, n).
+    result: np.ndarray
+        Result vectors, shape (batch, n). Allocated if not set, otherwise overwritten in place.
+    p: np.ndarray
+        Workspace buffer for forward sweep coefficients, shape (batch, n). Allocated if not set.
+    q: np.ndarray
+        Workspace buffer for forward sweep right-side values, shape (batch, n). Allocated if not set.
+    parallel: bool
+        Flag to solve systems on all available cores.
+    axis: int
+        Axis of the systems: 1 for rows of (batch, n) arrays, 0 for columns of (n, batch) arrays,
+        e.g. lines by X of (nx, ny) grid arrays.
+
+    Returns
+    ----------
+    result: np.ndarray
+        Result vectors, shape (batch, n).
+
+    """
+
+    if a.ndim != 2:
+        raise ValueError(f'Batched TDMA expects (batch, n) arrays, got shape {a.shape}!')
+
+    if axis not in (0, 1, -1):
+        raise ValueError(f'Batched TDMA axis must be 0 or 1, got {axis}!')
+
+    if result is None:
+        result = np.empty_like(a)
+
+    if p is None:
+        p = np.empty_like(a)
+
+    if q is None:
+        q = np.empty_like(a)
+
+    if axis == 0:
+        if parallel:
+            _tdma_columns_kernel_parallel(a, b, c, d, p, q, result, min(nb.get_num_threads(), a.shape[1]))
+        else:
+            _tdma_columns_kernel(a, b, c, d, p, q, result, 0, a.shape[1])
+
+        return result
+
+    kernel = _tdma_batch_kernel_parallel if parallel else _tdma_batch_kernel
+    kernel(a, b, c, d, p, q, result)
+
+    return result
+
+
+def run_tdma_partitioned(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray,
+                         result: np.ndarray | None = None, workspace: np.ndarray | None = None,
+                         n_parts: int | None = None) -> np.ndarray:
+    """Partitioned TDMA algorithm for a single long system using numba threads.
+
+    Parameters
+    ----------
+    a: np.ndarray
+        Main diagonal values.
+    b: np.ndarray
+        Upper diagonal values.
+    c: np.ndarray
+        Lower diagonal values.
+    d: np.ndarray
+        Right-side vector.
+    result: np.ndarray
+        Result vector. Allocated if not set, otherwise overwritten in place.
+    workspace: np.ndarray
+        Workspace buffer, shape (3, n). Allocated if not set.
+    n_parts: int
+        Number of partitions. Equals to the number of numba threads if not set.
+
+    Returns
+    ----------
+    result: np.ndarray
+        Result vector with the same shape as a.
+
+    """
+
+    if result is None:
+        result = np.empty_like(a)
+
     n = a.shape[0]
 
-    p = np.zeros_like(a)
-    q = np.zeros_like(a)
+    if workspace is None:
+        workspace = np.empty(shape=(3, n), dtype=a.dtype)
 
-    p[0] = b[0] / a[0]
-    q[0] = d[0] / a[0]
+    if n_parts is None:
+        n_parts = nb.get_num_threads()
 
-    for i in range(1, n):
-        tmp = a[i] - c[i] * p[i - 1]
-        p[i] = b[i] / tmp[0]
-        q[i] = (d[i] + c[i] * q[i - 1]) / tmp[0]
+    # every block needs at least two rows to be separated from the neighbours
+    n_parts = max(1, min(n_parts, n // 3))
 
-    result[n - 1] = q[n - 1]
-    p[n - 1] = 0.0
+    if n_parts == 1:
+        _tdma_kernel(a.reshape(-1), b.reshape(-1), c.reshape(-1), d.reshape(-1),
+                     workspace[0], workspace[1], _as_vector(result))
 
-    for i in range(n - 2, -1, -1):
-        result[i] = p[i] * result[i + 1] + q[i]
+        return result
+
+    separators = np.arange(1, n_parts) * n // n_parts
+    starts = np.concatenate(([0], separators + 1))
+    ends = np.concatenate((separators, [n]))
+
+    _tdma_partitioned_kernel(a.reshape(-1), b.reshape(-1), c.reshape(-1), d.reshape(-1), starts, ends,
+                             workspace[0], workspace[1], workspace[2], _as_vector(result))
 
     return result
+
+
+class MixedPrecisionTdma:
+    def __init__(self, n: int, tol: float = 1E-10, max_iterations: int = 10):
+        """TDMA algorithm with float32 factorization and float64 iterative refinement.
+
+        The forward sweep and every solve run in float32, which halves memory traffic of the sweeps.
+        The residual of float64 system is calculated after every solve and its float32 correction is added
+        to the float64 solution, so the result has float64 accuracy for well-conditioned systems. Refinement stops
+        as soon as a step does not halve the residual, then the caller may solve the system in float64.
+
+        Parameters
+        ----------
+        n: int
+            Number of unknowns.
+        tol: float
+            Relative residual norm ||r|| / ||d|| to stop refinement.
+        max_iterations: int
+            Maximum number of refinement steps after the first solve.
+
+        """
+
+        self._tol: float = tol
+        self._max_iterations: int = max_iterations
+
+        # float32 forward sweep factors and workspace
+        self._c: np.ndarray = np.zeros(shape=n, dtype=np.float32)
+        self._p: np.ndarray = np.zeros(shape=n, dtype=np.float32)
+        self._denominator: np.ndarray = np.zeros(shape=n, dtype=np.float32)
+        self._d: np.ndarray = np.zeros(shape=n, dtype=np.float32)
+        self._q: np.ndarray = np.zeros(shape=n, dtype=np.float32)
+        self._correction: np.ndarray = np.zeros(shape=n, dtype=np.float32)
+
+        # float64 residual
+        self._residual: np.ndarray = np.zeros(shape=n, dtype=np.float64)
+
+        self.iterations: int = 0
+        self.residual: float = 0.0
+
+    def factorize(self, a: np.ndarray, b: np.ndarray, c: np.ndarray):
+        """Forward sweep of float32 copy of the matrix, reused by solve while the matrix is constant.
+
+        Parameters
+        ----------
+        a: np.ndarray
+            Main diagonal values.
+        b: np.ndarray
+            Upper diagonal values.
+        c: np.ndarray
+            Lower diagonal values.
+
+        """
+
+        np.copyto(self._c, c.reshape(-1), casting='same_kind')
+        _tdma_factorize_kernel(a.reshape(-1).astype(np.float32), b.reshape(-1).astype(np.float32), self._c,
+                               self._p, self._denominator)
+
+    def solve(self, a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """Solve the system factorized by factorize with iterative refinement.
+
+        Parameters
+        ----------
+        a: np.ndarray
+            Main diagonal values, float64.
+        b: np.ndarray
+            Upper diagonal values, float64.
+        c: np.ndarray
+            Lower diagonal values, float64.
+        d: np.ndarray
+            Right-side vector, float64.
+        x: np.ndarray
+            Result vector, float64. Overwritten in place.
+
+        Returns
+        ----------
+        x: np.ndarray
+            Result vector.
+
+        """
+
+        a, b, c, d, x_flat = a.reshape(-1), b.reshape(-1), c.reshape(-1), d.reshape(-1), _as_vector(x)
+
+        np.copyto(self._d, d, casting='same_kind')
+        _tdma_factorized_kernel(self._c, self._p, self._denominator, self._d, self._q, self._correction)
+        np.copyto(x_flat, self._correction)
+
+        d_norm = max(np.linalg.norm(d), np.finfo(np.float64).tiny)
+        self.iterations = 0
+        previous_residual = np.inf
+
+        while True:
+            # residual a * x - b * x_E - c * x_W - d, the correction solves the system with -residual
+            _tdma_residual_kernel(a, b, c, d, x_flat, self._residual)
+            self.residual = np.linalg.norm(self._residual) / d_norm
+
+            # refinement stagnates or diverges if the condition number exceeds the float32 resolution
+            if (self.residual <= self._tol or self.iterations >= self._max_iterations or
+                    not self.residual < 0.5 * previous_residual):
+                return x
+
+            previous_residual = self.residual
+
+            np.negative(self._residual, out=self._d, casting='same_kind')
+            _tdma_factorized_kernel(self._c, self._p, self._denominator, self._d, self._q, self._correction)
+            x_flat += self._correction
+            self.iterations += 1
@@ -0,0 +1,462 @@
+import logging
+import os
+from collections import deque
+
+import numpy as np
+
+from utils.checkpoint import CheckpointManager, get_config_hash
+from utils.diagnostics import DiagnosticsRecorder
+from utils.history import SolutionHistory
+from utils.result_store import HDF5LazyHistory, HDF5ResultReader, HDF5ResultStore
+
+# input data fields, which do not change the solution and are ignored by checkpoint config hash
+RUN_CONTROL_FIELDS = ('diagnostics_path', 'diagnostics_stride', 'output_path', 'output_compression', 'checkpoint_path',
+                      'checkpoint_step_interval', 'checkpoint_wall_interval', 'restart')
+
+
+class TimeMarchingSolver:
+    """Implicit time loop shared by unsteady equation solvers.
+
+    Provides saved time layers in memory or in HDF5 file, checkpoints, diagnostics of discrete analogue,
+    error-controlled time step and steady state detection. The solver class is also a finite volume scheme with
+    _current_solution, _old_solution, _dt, _a_p, _a_e, _a_w, _b and invalidate_operator, and implements
+    _solve_time_step, _set_initial_condition and _get_saved_fields.
+
+    """
+
+    def _initialize_time_marching(self, layer_shape: tuple, history_names: tuple[str, ...]):
+        """Read time marching parameters of grid_time_data and equation_input_data and allocate histories.
+
+        Parameters
+        ----------
+        layer_shape: tuple
+            Shape of a saved time layer, e.g. (nx,).
+        history_names: tuple[str, ...]
+            Names of saved fields, e.g. solutions and velocity. Saved as total_<name> of output data.
+
+        """
+
+        grid_time_data = self._grid_time_data
+        equation_input_data = self._equation_input_data
+
+        self._nt: int = grid_time_data.nt
+        self._total_time: float = grid_time_data.total_time
+
+        # saved time layers, in memory or on disk
+        self._save_stride: int = max(1, grid_time_data.save_stride)
+        self._n_saved: int = -(-(self._nt - 1) // self._save_stride) + 1
+        self._layer_shape: tuple = layer_shape
+        self._history_names: tuple[str, ...] = history_names
+        self._output_path: str | None = equation_input_data.output_path
+        self._result_store: HDF5ResultStore | None = None
+        self._histories: dict = {}
+
+        if self._output_path is None:
+            self._histories = {name: SolutionHistory(n_saved=self._n_saved, shape=self._layer_shape,
+                                                     dtype=self._current_solution.dtype)
+                               for name in self._history_names}
+
+        # error-controlled time step
+        self._adaptive_time_step: bool = grid_time_data.adaptive_time_step
+        self._dt_min: float = grid_time_data.dt_min
+        self._dt_max: float = grid_time_data.dt_max or self._total_time
+        self._time_rtol: float = grid_time_data.time_rtol
+        self._time_atol: float = grid_time_data.time_atol
+        self._full_step_solution: np.ndarray | None = None
+        self._start_step_solution: np.ndarray | None = None
+
+        if self._adaptive_time_step:
+            self._full_step_solution = np.zeros_like(self._current_solution)
+            self._start_step_solution = np.zeros_like(self._current_solution)
+
+        # steady state detection
+        self._steady_state_tol: float | None = grid_time_data.steady_state_tol
+        self._steady_state_changes: deque = deque(maxlen=max(1, grid_time_data.steady_state_window))
+        self._steady_state_solve: bool = grid_time_data.steady_state_solve
+        self._solution_change: np.ndarray = np.zeros_like(self._current_solution)
+
+        # statistics of iterations by time steps
+        self._nonlinear_iterations = SolutionHistory(n_saved=self._nt, shape=(), dtype=np.int64)
+        self._nonlinear_residuals = SolutionHistory(n_saved=self._nt, shape=())
+
+    def _solve_time_step(self) -> tuple[int, float] | None:
+        """Solve the next time layer into _current_solution by _old_solution and the current time step.
+
+        Returns
+        ----------
+        stats: tuple[int, float] | None
+            Number of nonlinear iterations and residual, None for linear equation.
+
+        """
+
+        raise NotImplementedError
+
+    def _set_initial_condition(self):
+        """Fill _old_solution by the initial condition.
+        """
+
+        raise NotImplementedError
+
+    def _get_saved_fields(self) -> dict[str, np.ndarray]:
+        """Fields of the current time layer by history names.
+        """
+
+        raise NotImplementedError
+
+    def _adapt_grid(self, step: int):
+        """Adapt the grid to _old_solution of the time step before it is saved, e.g. move nodes to the front.
+        """
+
+        pass
+
+    def _get_metadata(self) -> dict:
+        """Scalar parameters of the run saved into HDF5 file.
+        """
+
+        return {
+            'nx': self._nx,
+            'ny': self._ny,
+            'nt': self._nt,
+            'dt': self._dt,
+            'total_time': self._total_time,
+            'x_length': self._length,
+            'y_height': self._height,
+            'save_stride': self._save_stride,
+        }
+
+    def _get_extra_state(self) -> dict:
+        """Equation-specific arrays of checkpoint, e.g. velocity.
+        """
+
+        return {}
+
+    def _restore_extra_state(self, state: dict):
+        """Restore arrays saved by _get_extra_state.
+        """
+
+        pass
+
+    def _open_result_store(self, resume: bool = False):
+        """Create on-disk histories, so saved time layers are streamed to HDF5 file instead of memory.
+        """
+
+        self._result_store = HDF5ResultStore(file_path=self._output_path,
+                                             grid=self._equation_output_data.grid,
+                                             metadata=self._get_metadata(),
+                                             compression=self._equation_input_data.output_compression,
+                                             resume=resume)
+        self._histories = {name: self._result_store.create_history(name, n_saved=self._n_saved,
+                                                                   shape=self._layer_shape,
+                                                                   dtype=self._current_solution.dtype)
+                           for name in self._history_names}
+
+    def _close_result_store(self):
+        """Close on-disk histories, output data reads them lazily without keeping the file open.
+        """
+
+        self._result_store.close()
+        self._result_store = None
+
+    def _save_time_layer(self, step: int, current_time: float):
+        """Save fields of the current time layer into histories.
+        """
+
+        for name, value in self._get_saved_fields().items():
+            self._histories[name].append(step=step, current_time=current_time, value=value)
+
+    def _get_checkpoint_histories(self) -> dict:
+        """Histories, which are kept in memory and saved into checkpoint.
+        """
+
+        histories = {'nonlinear_iterations': self._nonlinear_iterations,
+                     'nonlinear_residuals': self._nonlinear_residuals}
+
+        if self._result_store is None:
+            histories.update(self._histories)
+
+        return histories
+
+    def _get_state(self, step: int, current_time: float) -> dict:
+        """Solver state after the time step, which is enough to continue the solution bit-for-bit.
+        """
+
+        state = {
+            'config_hash': get_config_hash(self._grid_time_data, self._equation_input_data, exclude=RUN_CONTROL_FIELDS),
+            'step': step,
+            'current_time': current_time,
+            'dt': self._dt,
+            'old_solution': self._old_solution,
+            'n_layers': len(self._histories[self._history_names[0]]),
+            'steady_state_changes': np.array(self._steady_state_changes, dtype=np.float64),
+            **self._get_extra_state(),
+        }
+
+        for name, history in self._get_checkpoint_histories().items():
+            state[f'{name}_values'] = history.values
+            state[f'{name}_time'] = history.time
+            state[f'{name}_steps'] = history.steps
+
+        # on-disk histories are flushed instead of being copied into the checkpoint
+        if self._result_store is not None:
+            self._result_store.flush()
+
+        return state
+
+    def _restore_state(self, state: dict) -> tuple[int, float]:
+        """Restore solver state saved by _get_state.
+
+        Returns
+        ----------
+        step: int
+            Time step of the checkpoint.
+        current_time: float
+            Time of the checkpoint.
+
+        """
+
+        config_hash = get_config_hash(self._grid_time_data, self._equation_input_data, exclude=RUN_CONTROL_FIELDS)
+
+        if str(state['config_hash']) != config_hash:
+            raise ValueError('Checkpoint was saved for another grid or input data!')
+
+        self._dt = float(state['dt'])
+        self._old_solution[...] = state['old_solution']
+        self._restore_extra_state(state)
+        self._steady_state_changes.extend(state['steady_state_changes'])
+        self.invalidate_operator()
+
+        for name, history in self._get_checkpoint_histories().items():
+            history.clear()
+
+            for step, current_time, value in zip(state[f'{name}_steps'], state[f'{name}_time'],
+                                                 state[f'{name}_values']):
+                history.append(step=step, current_time=current_time, value=value)
+
+        if self._result_store is not None:
+            for history in self._histories.values():
+                history.truncate(int(state['n_layers']))
+
+        return int(state['step']), float(state['current_time'])
+
+    def _solve_adaptive_time_step(self, current_time: float) -> tuple[float, tuple[int, float] | None]:
+        """Solve the next time layer with local error control by step doubling.
+
+        One step dt is compared with two steps dt / 2. If the weighted RMS norm of the difference is below 1,
+        their Richardson extrapolation is accepted. Otherwise the step is repeated with smaller dt.
+        The next time step is chosen by the error estimate within [dt_min, dt_max].
+
+        Returns
+        ----------
+        dt: float
+            Accepted time step.
+        stats: tuple[int, float] | None
+            Number of nonlinear iterations and residual of the last solve, None for linear equation.
+
+        """
+
+        np.copyto(self._start_step_solution, self._old_solution)
+
+        while True:
+            dt = min(self._dt, self._total_time - current_time)
+
+            # один шаг dt
+            self._dt = dt
+            self._solve_time_step()
+            np.copyto(self._full_step_solution, self._current_solution)
+
+            # два шага dt / 2
+            self._dt = 0.5 * dt
+            self._solve_time_step()
+            np.copyto(self._old_solution, self._current_solution)
+            stats = self._solve_time_step()
+            np.copyto(self._old_solution, self._start_step_solution)
+
+            scale = self._time_atol + self._time_rtol * np.maximum(np.abs(self._current_solution),
+                                                                   np.abs(self._start_step_solution))
+            error = np.sqrt(np.mean(((self._current_solution - self._full_step_solution) / scale) ** 2))
+
+            # backward Euler local error is O(dt^2)
+            factor = 5.0 if error == 0.0 else min(5.0, max(0.2, 0.9 / np.sqrt(error)))
+            self._dt = min(max(dt * factor, self._dt_min), self._dt_max)
+
+            if error <= 1.0:
+                # local Richardson extrapolation of two backward Euler solutions is second-order accurate
+                self._current_solution *= 2.0
+                self._current_solution -= self._full_step_solution
+                return dt, stats
+
+            if dt <= self._dt_min:
+                logging.warning(f'Time step error {error} is above tolerance with minimal dt = {dt}')
+                return dt, stats
+
+            logging.debug(f'Time step dt = {dt} is rejected, error = {error}')
+
+    def _is_steady_state(self) -> bool:
+        """Check steady state by relative change of the solution over the last time steps.
+
+        Relative change ||C_new - C_old|| / ||C_new|| of the time step is added to the sliding window,
+        steady state is reached if the window is full and every change is below the tolerance.
+
+        """
+
+        if self._steady_state_tol is None:
+            return False
+
+        np.subtract(self._current_solution, self._old_solution, out=self._solution_change)
+        change = (np.linalg.norm(self._solution_change) /
+                  max(np.linalg.norm(self._current_solution), np.finfo(np.float64).tiny))
+        self._steady_state_changes.append(change)
+
+        return (len(self._steady_state_changes) == self._steady_state_changes.maxlen and
+                max(self._steady_state_changes) <= self._steady_state_tol)
+
+    def _solve_steady_state(self):
+        """Solve steady equation directly: the transient term of discrete analogue vanishes for infinite time step.
+        """
+
+        dt = self._dt
+        self._dt = np.inf
+        self._solve_time_step()
+        self._dt = dt
+
+    def _is_last_time_layer(self, step: int, current_time: float) -> bool:
+        """Check if the time layer is the last one.
+        """
+
+        if self._adaptive_time_step:
+            return current_time >= self._total_time * (1.0 - 1E-12)
+
+        return step >= self._nt - 1
+
+    def _march_in_time(self):
+        """Solve time layers from the initial condition or from checkpoint up to total time and set output histories.
+        """
+
+        # задали начальное условие
+        self._set_initial_condition()
+        self._dt = self._total_time / (self._nt - 1)
+        self.invalidate_operator()
+
+        # контрольные точки для перезапуска (отключены по умолчанию)
+        checkpoint = None
+
+        if self._equation_input_data.checkpoint_path is not None:
+            checkpoint = CheckpointManager(file_path=self._equation_input_data.checkpoint_path,
+                                           step_interval=self._equation_input_data.checkpoint_step_interval,
+                                           wall_interval=self._equation_input_data.checkpoint_wall_interval)
+
+        resume = checkpoint is not None and self._equation_input_data.restart and checkpoint.exists()
+
+        # time layers saved before the checkpoint are kept only in the output file
+        if resume and self._output_path is not None and not os.path.exists(self._output_path):
+            raise FileNotFoundError(f'Output file {self._output_path} with time layers saved before checkpoint '
+                                    f'{self._equation_input_data.checkpoint_path} is not found, '
+                                    f'restart is not possible!')
+
+        # начальный временной слой
+        self._steady_state_changes.clear()
+        steady_state_time = None
+        self._nonlinear_iterations.clear()
+        self._nonlinear_residuals.clear()
+
+        if self._output_path is None:
+            for history in self._histories.values():
+                history.clear()
+        else:
+            self._open_result_store(resume=resume)
+
+        step = 0
+        current_time = 0.0
+
+        if resume:
+            step, current_time = self._restore_state(checkpoint.load())
+            logging.info(f'Resume from time step {step}')
+        else:
+            self._save_time_layer(step=step, current_time=current_time)
+
+        # начальное приближение итерационных решателей
+        np.copyto(self._current_solution, self._old_solution)
+
+        # запись коэффициентов дискретного аналога (отключена по умолчанию)
+        recorder = None
+
+        if self._equation_input_data.diagnostics_path is not None:
+            recorder = DiagnosticsRecorder(file_path=self._equation_input_data.diagnostics_path,
+                                           stride=self._equation_input_data.diagnostics_stride)
+
+        try:
+            # цикл через временные слои
+            while not self._is_last_time_layer(step=step, current_time=current_time):
+                step += 1
+
+                if self._adaptive_time_step:
+                    dt, stats = self._solve_adaptive_time_step(current_time=current_time)
+                    current_time += dt
+                    logging.info(f'Solving for time = {current_time}, dt = {dt}')
+                else:
+                    current_time = step * self._dt
+                    logging.info(f'Solving for time = {current_time}')
+                    stats = self._solve_time_step()
+
+                if stats is not None:
+                    self._nonlinear_iterations.append(step=step, current_time=current_time, value=np.asarray(stats[0]))
+                    self._nonlinear_residuals.append(step=step, current_time=current_time, value=np.asarray(stats[1]))
+
+                if recorder is not None:
+                    recorder.record(step=step, current_time=current_time,
+                                    a_p=self._a_p, a_e=self._a_e, a_w=self._a_w, b=self._b)
+
+                # проверка выхода на стационарный режим
+                is_steady_state = self._is_steady_state()
+
+                # обновляем решение на текущем временном слое (копией: итерации по нелинейности используют оба слоя)
+                np.copyto(self._old_solution, self._current_solution)
+
+                # адаптация сетки к решению (отключена по умолчанию)
+                self._adapt_grid(step=step)
+
+                if is_steady_state:
+                    steady_state_time = current_time
+                    logging.info(f'Steady state is reached at time = {current_time}')
+
+                    # стационарное решение сохраняется как решение в конечный момент времени
+                    if self._steady_state_solve:
+                        self._save_time_layer(step=step, current_time=current_time)
+                        self._solve_steady_state()
+                        np.copyto(self._old_solution, self._current_solution)
+                        step += 1
+                        current_time = self._total_time
+
+                # сохраняем решение для временного слоя current_time
+                if (step % self._save_stride == 0 or is_steady_state or
+                        self._is_last_time_layer(step=step, current_time=current_time)):
+                    self._save_time_layer(step=step, current_time=current_time)
+
+                if is_steady_state:
+                    break
+
+                if checkpoint is not None and checkpoint.is_due(step):
+                    checkpoint.save(state=self._get_state(step=step, current_time=current_time))
+        finally:
+            if recorder is not None:
+                recorder.close()
+
+            if self._result_store is not None:
+                self._close_result_store()
+
+        self._equation_output_data.steady_state_time = steady_state_time
+        self._equation_output_data.nonlinear_iterations = self._nonlinear_iterations.values
+        self._equation_output_data.nonlinear_residuals = self._nonlinear_residuals.values
+
+        for name in self._history_names:
+            if self._output_path is None:
+                setattr(self._equation_output_data, f'total_{name}', self._histories[name].values)
+            else:
+                setattr(self._equation_output_data, f'total_{name}', HDF5LazyHistory(file_path=self._output_path,
+                                                                                    name=name))
+
+        if self._output_path is None:
+            self._equation_output_data.time_grid = self._histories[self._history_names[0]].time
+        else:
+            with HDF5ResultReader(file_path=self._output_path) as reader:
+                self._equation_output_data.time_grid = reader.get_time(self._history_names[0])
@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import numba
+import numpy as np
+
+from solvers.diffusion_convection.discrete_analogue import FiniteVolumeScheme
+from solvers.diffusion_convection.solver_dataclasses import BoundaryType
+from solvers.tdma import run_tdma
+from utils.equation_type import EquationTypeEnum, get_input_data_by_equation
+from utils.sweep import get_case_data
+
+# default sweeps, several orders of magnitude of grid size and number of time steps
+KERNEL_SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+SOLVE_NX = (10 ** 2, 10 ** 3, 10 ** 4)
+SOLVE_NT = (10, 10 ** 2, 10 ** 3)
+
+# format version of the results file, increased on incompatible changes
+RESULTS_VERSION = 1
+
+
+def _time_call(func, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """Wall-clock time of a single call, the first call is not measured (numba compilation, caches).
+
+    Calls are grouped by number, so that every of the repeat measurements takes at least min_time seconds.
+    """
+
+    func()
+
+    number = 1
+
+    while True:
+        start_time = time.perf_counter()
+
+        for _ in range(number):
+            func()
+
+        elapsed = time.perf_counter() - start_time
+
+        if elapsed >= min_time or number >= 10 ** 6:
+            break
+
+        number *= 10 if elapsed < 0.1 * min_time else 2
+
+    timings = [elapsed / number]
+
+    for _ in range(repeat - 1):
+        start_time = time.perf_counter()
+
+        for _ in range(number):
+            func()
+
+        timings.append((time.perf_counter() - start_time) / number)
+
+    return {'min': min(timings), 'median': statistics.median(timings), 'number': number, 'repeat': repeat}
+
+
+def bench_tdma(n: int, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """Timing of run_tdma on a diagonally dominant system with preallocated result and workspace buffers.
+    """
+
+    rng = np.random.default_rng(seed=0)
+
+    b = rng.random(size=n)
+    c = rng.random(size=n)
+    a = b + c + 1.0
+    d = rng.random(size=n)
+    result, p, q = (np.empty(n) for _ in range(3))
+
+    return _time_call(lambda: run_tdma(a=a, b=b, c=c, d=d, result=result, p=p, q=q), repeat=repeat,
+                      min_time=min_time)
+
+
+def bench_discrete_analogue(nx: int, boundary_type: BoundaryType, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """Timing of initialize_discrete_analogue of diffusion-convection scheme by the boundary type.
+
+    The operator is not frozen, so the whole discrete analogue is assembled by every call.
+    """
+
+    input_data = get_input_data_by_equation(equation_type=EquationTypeEnum.DIFFUSION_CONVECTION)
+    grid_time_data = input_data.grid_time_data
+    equation_input_data = input_data.equation_input_data
+
+    dt = grid_time_data.total_time / (grid_time_data.nt - 1)
+
+    scheme = FiniteVolumeScheme(nx=nx, ny=1, nt=grid_time_data.nt, dx=grid_time_data.x_length / (nx - 1), dy=1.0,
+                                dt=dt, d=equation_input_data.d, c_wall_left=equation_input_data.c_wall_left,
+                                c_wall_right=equation_input_data.c_wall_right, c_initial=equation_input_data.c_init,
+                                boundary_type=boundary_type, q_source=equation_input_data.q_source)
+
+    # nonzero velocities on faces, walls included, so that Robin conditions use them
+    scheme._u_sed_e.fill(1E-7)
+    scheme._u_sed_w.fill(1E-7)
+    scheme._old_solution.fill(equation_input_data.c_init)
+
+    return _time_call(scheme.initialize_discrete_analogue, repeat=repeat, min_time=min_time)
+
+
+def bench_u_sed(nx: int, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """Timing of _calc_u_sed of diffusion-convection solver by the default approximation function.
+    """
+
+    input_data = get_input_data_by_equation(equation_type=EquationTypeEnum.DIFFUSION_CONVECTION)
+    case_data = get_case_data(equation_data=input_data, case={'nx': nx, 'nt': 2})
+
+    logging.disable(logging.INFO)
+
+    try:
+        equation = case_data.equation_solver(input_data=case_data)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    c = np.linspace(start=0.0, stop=0.5, num=nx)[:, None]
+
+    return _time_call(lambda: equation._calc_u_sed(c), repeat=repeat, min_time=min_time)
+
+
+def bench_solve(equation_type: EquationTypeEnum, nx: int, nt: int, overrides: dict | None = None,
+                repeat: int = 3) -> dict:
+    """Timing of solve_numerical of a new equation, initialization is not measured.
+
+    Only the last time layer is saved to history, so memory does not grow with nx * nt.
+    Heat conduction is solved by time steps, otherwise nt is not used. Log messages of every time step are disabled.
+    """
+
+    input_data = get_input_data_by_equation(equation_type=equation_type)
+
+    case = {'nx': nx, 'nt': nt, 'save_stride': nt}
+
+    if equation_type == EquationTypeEnum.HEAT_CONDUCTIVITY:
+        case['unsteady'] = True
+
+    case.update(overrides or {})
+
+    # compilation and caches are warmed up by a short solve
+    warm_up_case = dict(case, nx=min(nx, 10), nt=min(nt, 3), save_stride=1)
+    timings = []
+
+    logging.disable(logging.INFO)
+
+    try:
+        warm_up_data = get_case_data(equation_data=input_data, case=warm_up_case)
+        warm_up_data.equation_solver(input_data=warm_up_data).solve_numerical()
+
+        for _ in range(repeat):
+            case_data = get_case_data(equation_data=input_data, case=case)
+            equation = case_data.equation_solver(input_data=case_data)
+
+            start_time = time.perf_counter()
+            equation.solve_numerical()
+            timings.append(time.perf_counter() - start_time)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return {'min': min(timings), 'median': statistics.median(timings), 'number': 1, 'repeat': repeat}
+
+
+def get_environment() -> dict:
+    """Commit, versions and machine of the benchmark run.
+    """
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numba': numba.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numba_threads': numba.get_num_threads()
+    }
+
+
+def run_benchmarks(kernel_sizes: tuple[int, ...] = KERNEL_SIZES, solve_nx: tuple[int, ...] = SOLVE_NX,
+                   solve_nt: tuple[int, ...] = SOLVE_NT, solve_overrides: dict | None = None, repeat: int = 5,
+                   min_time: float = 0.2) -> dict:
+    """Run kernel benchmarks by grid size and full solves by grid size and number of time steps.
+
+    Parameters
+    ----------
+    kernel_sizes: tuple[int, ...]
+        Grid sizes of run_tdma, initialize_discrete_analogue and _calc_u_sed benchmarks.
+    solve_nx: tuple[int, ...]
+        Grid sizes of full solves.
+    solve_nt: tuple[int, ...]
+        Numbers of time steps of full solves, every grid size is solved by every number of time steps.
+    solve_overrides: dict
+        Input data fields of full solves of both equations, e.g. {'tdma_method': TdmaMethod.PARTITIONED}.
+    repeat: int
+        Number of measurements of each case.
+    min_time: float
+        Minimum duration of a kernel measurement, sec. Short kernels are called several times per measurement.
+
+    Returns
+    ----------
+    results: dict
+        Environment and records with benchmark name, parameters and min / median time of a single call in seconds.
+
+    """
+
+    records = []
+
+    def add_record(name: str, params: dict, timing: dict):
+        records.append({'name': name, 'params': params, **timing})
+        logging.info(msg=f'{name} {params}: {timing["median"]:.3e} sec')
+
+    for n in kernel_sizes:
+        add_record('run_tdma', {'nx': n}, bench_tdma(n=n, repeat=repeat, min_time=min_time))
+
+    for boundary_type in BoundaryType:
+        for n in kernel_sizes:
+            add_record(f'initialize_discrete_analogue.{boundary_type.name}', {'nx': n},
+                       bench_discrete_analogue(nx=n, boundary_type=boundary_type, repeat=repeat, min_time=min_time))
+
+    for n in kernel_sizes:
+        add_record('calc_u_sed', {'nx': n}, bench_u_sed(nx=n, repeat=repeat, min_time=min_time))
+
+    for equation_type in (EquationTypeEnum.HEAT_CONDUCTIVITY, EquationTypeEnum.DIFFUSION_CONVECTION):
+        for nx in solve_nx:
+            for nt in solve_nt:
+                add_record(f'solve.{equation_type.name}', {'nx': nx, 'nt': nt},
+                           bench_solve(equation_type=equation_type, nx=nx, nt=nt, overrides=solve_overrides,
+                                       repeat=max(1, repeat // 2)))
+
+    return {'version': RESULTS_VERSION, 'environment': get_environment(), 'results': records}
+
+
+def save_benchmarks(results: dict, file_path: str):
+    """Save benchmark results to a JSON file, parent directories are created.
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+
+    with open(file_path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_benchmarks(file_path: str) -> dict:
+    """Load benchmark results from a JSON file.
+    """
+
+    with open(file_path) as f:
+        results = json.load(f)
+
+    if results.get('version') != RESULTS_VERSION:
+        raise ValueError(f'Unsupported benchmark results version {results.get("version")}!')
+
+    return results
+
+
+def compare_benchmarks(baseline: dict, current: dict, threshold: float = 0.1) -> list[dict]:
+    """Compare median times of the same benchmarks of two runs, e.g. of two commits.
+
+    Parameters
+    ----------
+    baseline: dict
+        Results of the reference run.
+    current: dict
+        Results of the new run.
+    threshold: float
+        Relative change of median time, which is reported as regression or improvement.
+
+    Returns
+    ----------
+    comparison: list[dict]
+        Benchmark name, parameters, baseline and current median times and their ratio for common benchmarks.
+
+    """
+
+    def get_key(record: dict) -> tuple:
+        return record['name'], tuple(sorted(record['params'].items()))
+
+    baseline_records = {get_key(record): record for record in baseline['results']}
+    comparison = []
+
+    for record in current['results']:
+        baseline_record = baseline_records.get(get_key(record))
+
+        if baseline_record is None:
+            continue
+
+        ratio = record['median'] / baseline_record['median']
+        comparison.append({'name': record['name'], 'params': record['params'], 'baseline': baseline_record['median'],
+                           'current': record['median'], 'ratio': ratio})
+
+        if ratio > 1.0 + threshold:
+            logging.warning(msg=f'Regression {record["name"]} {record["params"]}: x{ratio:.2f}')
+        elif ratio < 1.0 / (1.0 + threshold):
+            logging.info(msg=f'Improvement {record["name"]} {record["params"]}: x{1.0 / ratio:.2f} faster')
+
+    return comparison
@@ -0,0 +1,135 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import time
+from enum import Enum
+
+import numpy as np
+
+
+def get_config_hash(*configs, exclude: tuple = ()) -> str:
+    """Deterministic hash of dataclass fields, used to check that a checkpoint belongs to the same run.
+
+    Parameters
+    ----------
+    configs:
+        Dataclasses or dataclass instances.
+    exclude: tuple
+        Field names, which do not affect the solution, e.g. output settings.
+
+    Returns
+    ----------
+    config_hash: str
+        SHA-256 hex digest.
+
+    """
+
+    def to_str(value) -> str:
+        if isinstance(value, Enum):
+            return str(value.value)
+
+        # repr of long arrays is abbreviated, so their values are hashed
+        if isinstance(value, np.ndarray):
+            return f'{value.dtype}{value.shape}{hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()}'
+
+        if callable(value):
+            return f'{getattr(value, "__module__", "")}.{getattr(value, "__qualname__", repr(value))}'
+
+        return repr(value)
+
+    values = [{field.name: to_str(getattr(config, field.name)) for field in dataclasses.fields(config)
+               if field.name not in exclude} for config in configs]
+
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+
+def save_checkpoint(file_path: str, state: dict):
+    """Atomically save solver state into npz file: the state is written to a temporary file,
+    which then replaces the previous checkpoint.
+
+    Parameters
+    ----------
+    file_path: str
+        Checkpoint file path.
+    state: dict
+        Arrays and scalars of solver state.
+
+    """
+
+    tmp_path = f'{file_path}.tmp'
+
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **state)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, file_path)
+
+
+def load_checkpoint(file_path: str) -> dict:
+    """Load solver state saved by save_checkpoint.
+
+    Parameters
+    ----------
+    file_path: str
+        Checkpoint file path.
+
+    Returns
+    ----------
+    state: dict
+        Arrays and scalars of solver state. Scalars are returned as 0-d arrays.
+
+    """
+
+    with np.load(file_path) as data:
+        return {key: data[key] for key in data.files}
+
+
+class CheckpointManager:
+    def __init__(self, file_path: str, step_interval: int | None = None, wall_interval: float | None = None):
+        """Periodic checkpoint writer by time steps or wall-clock time.
+
+        Parameters
+        ----------
+        file_path: str
+            Checkpoint file path.
+        step_interval: int
+            Save checkpoint every step_interval time steps. Disabled if None.
+        wall_interval: float
+            Save checkpoint if wall_interval seconds passed since the previous one. Disabled if None.
+
+        """
+
+        self._file_path = file_path
+        self._step_interval = step_interval
+        self._wall_interval = wall_interval
+        self._last_save_time = time.monotonic()
+
+    def is_due(self, step: int) -> bool:
+        """Check if checkpoint should be saved after the time step.
+        """
+
+        if self._step_interval is not None and step % self._step_interval == 0:
+            return True
+
+        if self._wall_interval is not None and time.monotonic() - self._last_save_time >= self._wall_interval:
+            return True
+
+        return False
+
+    def save(self, state: dict):
+        """Save checkpoint and restart wall-clock interval.
+        """
+
+        save_checkpoint(file_path=self._file_path, state=state)
+        self._last_save_time = time.monotonic()
+
+        logging.info(f'Checkpoint for time step {int(state["step"])} saved to {self._file_path}')
+
+    def exists(self) -> bool:
+        return os.path.exists(self._file_path)
+
+    def load(self) -> dict:
+        return load_checkpoint(file_path=self._file_path)
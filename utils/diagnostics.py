@@ -0,0 +1,105 @@
+import logging
+
+import h5py
+import numpy as np
+
+
+class DiagnosticsRecorder:
+    def __init__(self, file_path: str, stride: int = 1, buffer_size: int = 64):
+        """Buffered recorder of discrete analogue snapshots into a single HDF5 file.
+
+        Parameters
+        ----------
+        file_path: str
+            Output HDF5 file path. Existing file is overwritten.
+        stride: int
+            Record every stride-th time step.
+        buffer_size: int
+            Number of snapshots kept in memory before writing them to the file.
+
+        Notes
+        ----------
+        Every recorded array gets a dataset of shape (n_snapshots, *array.shape) with the same name.
+        Datasets step and time store time step index and time value of each snapshot.
+
+        """
+
+        self._file_path = file_path
+        self._stride = max(1, stride)
+        self._buffer_size = max(1, buffer_size)
+
+        self._file = h5py.File(self._file_path, 'w')
+        self._buffers: dict[str, np.ndarray] = {}
+        self._n_buffered = 0
+        self._n_written = 0
+
+    def record(self, step: int, current_time: float, **arrays: np.ndarray):
+        """Copy arrays into the buffer if the time step matches the stride.
+
+        Parameters
+        ----------
+        step: int
+            Time step index.
+        current_time: float
+            Time value.
+        arrays: np.ndarray
+            Named arrays to record, e.g. a_p, a_e, a_w, b.
+
+        """
+
+        if step % self._stride != 0:
+            return
+
+        arrays = {'step': np.asarray(step), 'time': np.asarray(current_time), **arrays}
+
+        if not self._buffers:
+            self._buffers = {name: np.empty(shape=(self._buffer_size, *np.shape(value)), dtype=np.asarray(value).dtype)
+                             for name, value in arrays.items()}
+
+        for name, value in arrays.items():
+            self._buffers[name][self._n_buffered] = value
+
+        self._n_buffered += 1
+
+        if self._n_buffered == self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered snapshots to the file.
+        """
+
+        if self._n_buffered == 0:
+            return
+
+        start = self._n_written
+        stop = self._n_written + self._n_buffered
+
+        for name, buffer in self._buffers.items():
+            if name not in self._file:
+                self._file.create_dataset(name, shape=(0, *buffer.shape[1:]), maxshape=(None, *buffer.shape[1:]),
+                                          chunks=(self._buffer_size, *buffer.shape[1:]), dtype=buffer.dtype)
+
+            dataset = self._file[name]
+            dataset.resize(stop, axis=0)
+            dataset[start:stop] = buffer[:self._n_buffered]
+
+        self._n_written = stop
+        self._n_buffered = 0
+
+    def close(self):
+        """Flush the buffer and close the file.
+        """
+
+        if not self._file:
+            return
+
+        self.flush()
+        self._file.close()
+
+        logging.info(f'Diagnostics: {self._n_written} snapshots saved to {self._file_path}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
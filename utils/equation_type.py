@@ -9,6 +9,7 @@ from solvers.diffusion_convection.solver import DiffsuionConvection
 from solvers.diffusion_convection.solver_dataclasses import InputData as InputDataDC, GridTimeData as GridTimeDataDC
 from solvers.heat_conduction.solver import HeatConductivity
 from solvers.heat_conduction.solver_dataclasses import InputData as InputDataHC, GridTimeData as GridTimeDataHC
+from utils.result_store import HDF5LazyHistory, HDF5ResultReader
 
 
 class EquationTypeEnum(Enum):
@@ -28,10 +29,51 @@ class EquationData:
 class OutputData:
     time_grid: np.ndarray = field(default_factory=lambda: np.array([]))  # output time grid
     grid: np.ndarray = field(default_factory=lambda: np.array([]))  # output domain grid
+    y_grid: np.ndarray | None = None  # output domain grid by Y, None for 1D grid
     numerical_solution: np.ndarray = field(default_factory=lambda: np.array([]))  # output numerical solution
     analytical_solution: np.ndarray | None = field(default_factory=lambda: np.array([]))  # output analytical solution
-    total_solutions: list = field(default_factory=lambda: [])
-    total_velocity: list = field(default_factory=lambda: [])
+    total_solutions: np.ndarray | HDF5LazyHistory = field(default_factory=lambda: np.array([]))  # saved solutions
+    total_velocity: np.ndarray | HDF5LazyHistory = field(default_factory=lambda: np.array([]))  # saved velocities
+    total_grids: np.ndarray | HDF5LazyHistory | None = None  # node coordinates of saved layers, None for static grid
+    nonlinear_iterations: np.ndarray = field(default_factory=lambda: np.array([]))  # iterations by time steps
+    nonlinear_residuals: np.ndarray = field(default_factory=lambda: np.array([]))  # residuals by time steps
+    steady_state_time: float | None = None  # time of steady state detection
+
+
+def read_output_data(file_path: str) -> OutputData:
+    """Read output data saved to HDF5 file by solver. Time layers are read from disk only when indexed,
+    the file is not kept open.
+
+    Parameters
+    ----------
+    file_path: str
+        HDF5 file path.
+
+    Returns
+    -------
+    output_data: OutputData
+        Output data with lazy total_solutions, total_velocity and total_grids of adaptive grid.
+
+    """
+
+    with HDF5ResultReader(file_path=file_path) as reader:
+        time_grid = reader.get_time('solutions')
+        grid = reader.grid
+        has_velocity = reader.has_history('velocity')
+        has_grids = reader.has_history('grids')
+
+    total_solutions = HDF5LazyHistory(file_path=file_path, name='solutions')
+    total_grids = HDF5LazyHistory(file_path=file_path, name='grids') if has_grids else None
+
+    return OutputData(
+        time_grid=time_grid,
+        grid=grid if total_grids is None else total_grids[-1],
+        numerical_solution=total_solutions[-1],
+        analytical_solution=None,
+        total_solutions=total_solutions,
+        total_velocity=HDF5LazyHistory(file_path=file_path, name='velocity') if has_velocity else np.array([]),
+        total_grids=total_grids
+    )
 
 
 def get_input_data_by_equation(equation_type: EquationTypeEnum) -> EquationData | None:
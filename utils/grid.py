@@ -0,0 +1,227 @@
+from enum import Enum
+
+import numpy as np
+
+
+class GridStretching(Enum):
+    UNIFORM = 'uniform'  # constant step
+    GEOMETRIC = 'geometric'  # steps grow by a constant ratio from both walls towards the middle
+    TANH = 'tanh'  # hyperbolic tangent clustering at both walls
+
+
+class GridIndicator(Enum):
+    GRADIENT = 'gradient'  # absolute slope of the solution, refines the whole front
+    CURVATURE = 'curvature'  # absolute second derivative of the solution, refines the edges of the front
+
+
+# default clustering of stretched grids: tanh slope and ratio of neighbour steps
+DEFAULT_STRETCHING_FACTORS = {GridStretching.GEOMETRIC: 1.05, GridStretching.TANH: 2.0}
+
+
+def get_grid_coordinates(n: int, length: float, stretching: GridStretching = GridStretching.UNIFORM,
+                         stretching_factor: float | None = None) -> np.ndarray:
+    """Node coordinates from 0 to length, clustered at both walls for stretched grids.
+
+    Parameters
+    ----------
+    n: int
+        Number of grid nodes.
+    length: float
+        Domain length.
+    stretching: GridStretching
+        Node distribution.
+    stretching_factor: float
+        Slope of tanh clustering or ratio of neighbour steps of geometric grid. Default if None.
+
+    Returns
+    ----------
+    grid: np.ndarray
+        Node coordinates, shape (n,).
+
+    """
+
+    if stretching_factor is None:
+        stretching_factor = DEFAULT_STRETCHING_FACTORS.get(stretching, 1.0)
+
+    if stretching == GridStretching.TANH:
+        xi = np.linspace(start=-1.0, stop=1.0, num=n)
+        grid = 0.5 * length * (1.0 + np.tanh(stretching_factor * xi) / np.tanh(stretching_factor))
+    elif stretching == GridStretching.GEOMETRIC:
+        # steps from the left wall and their mirror from the right wall, odd step count has one middle step
+        n_steps = n - 1
+        steps = stretching_factor ** np.arange((n_steps + 1) // 2, dtype=np.float64)
+        steps = np.concatenate((steps, steps[:n_steps // 2][::-1]))
+        grid = np.concatenate(([0.0], np.cumsum(steps) * (length / np.sum(steps))))
+    else:
+        grid = np.linspace(start=0.0, stop=length, num=n)
+
+    grid[0] = 0.0
+    grid[-1] = length
+
+    return grid
+
+
+def get_grid_spacing(grid: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Distances to neighbour nodes and control volume widths of vertex-centered grid.
+
+    Control volume faces are halfway between neighbour nodes. Boundary nodes have a half control volume and
+    the distance to the missing neighbour equals to the distance to the existing one.
+
+    Parameters
+    ----------
+    grid: np.ndarray
+        Node coordinates, strictly increasing, shape (n,).
+
+    Returns
+    ----------
+    dx_e: np.ndarray
+        Distances to east neighbours, shape (n,).
+    dx_w: np.ndarray
+        Distances to west neighbours, shape (n,).
+    dx_p: np.ndarray
+        Control volume widths, shape (n,).
+
+    """
+
+    steps = np.diff(grid)
+
+    if steps.size == 0 or np.any(steps <= 0.0):
+        raise ValueError('Grid nodes must be strictly increasing!')
+
+    dx_e = np.append(steps, steps[-1])
+    dx_w = np.insert(steps, 0, steps[0])
+
+    dx_p = 0.5 * (dx_e + dx_w)
+    dx_p[0] = 0.5 * steps[0]
+    dx_p[-1] = 0.5 * steps[-1]
+
+    return dx_e, dx_w, dx_p
+
+
+def get_x_grid(grid_time_data) -> np.ndarray | None:
+    """Node coordinates by X of non-uniform grid set by x_grid or x_stretching of grid time data.
+
+    Parameters
+    ----------
+    grid_time_data:
+        Grid and time parameters of an equation.
+
+    Returns
+    ----------
+    grid: np.ndarray | None
+        Node coordinates, None for uniform grid by nx and x_length.
+
+    """
+
+    if grid_time_data.x_grid is not None:
+        return np.asarray(grid_time_data.x_grid, dtype=np.float64)
+
+    if grid_time_data.x_stretching == GridStretching.UNIFORM:
+        return None
+
+    return get_grid_coordinates(n=grid_time_data.nx, length=grid_time_data.x_length,
+                                stretching=grid_time_data.x_stretching,
+                                stretching_factor=grid_time_data.x_stretching_factor)
+
+
+def get_adapted_grid(grid: np.ndarray, values: np.ndarray, indicator: GridIndicator = GridIndicator.GRADIENT,
+                     weight: float = 100.0, smoothing: int = 4) -> np.ndarray:
+    """Grid with the same number of nodes and ends, which equidistributes the refinement indicator of the solution.
+
+    Node density is proportional to 1 + weight * indicator / max(indicator), so steps are refined at the front and
+    coarsened in flat regions. The density is smoothed to limit the ratio of neighbour steps.
+
+    Parameters
+    ----------
+    grid: np.ndarray
+        Node coordinates, strictly increasing, shape (n,).
+    values: np.ndarray
+        Solution values at the nodes, shape (n,).
+    indicator: GridIndicator
+        Refinement indicator.
+    weight: float
+        Ratio of the extra node density at the maximum of the indicator to the density in flat regions.
+    smoothing: int
+        Number of [1/4, 1/2, 1/4] smoothing passes of the node density.
+
+    Returns
+    ----------
+    grid: np.ndarray
+        New node coordinates, shape (n,). A copy of the grid if the solution is flat.
+
+    """
+
+    steps = np.diff(grid)
+    slopes = np.diff(values) / steps
+
+    if indicator == GridIndicator.CURVATURE:
+        # second derivative at internal nodes, averaged on steps and extended to the boundary steps
+        curvature = np.abs(2.0 * np.diff(slopes) / (steps[:-1] + steps[1:]))
+        curvature = np.concatenate((curvature[:1], curvature, curvature[-1:]))
+        density = 0.5 * (curvature[:-1] + curvature[1:])
+    else:
+        density = np.abs(slopes)
+
+    scale = np.max(density)
+
+    if not np.isfinite(scale) or scale <= 0.0:
+        return grid.copy()
+
+    density = 1.0 + weight / scale * density
+
+    for _ in range(smoothing):
+        density[1:-1] = 0.25 * density[:-2] + 0.5 * density[1:-1] + 0.25 * density[2:]
+
+    # new nodes split the integral of the density into equal parts
+    cumulative = np.concatenate(([0.0], np.cumsum(density * steps)))
+    new_grid = np.interp(np.linspace(start=0.0, stop=cumulative[-1], num=grid.size), cumulative, grid)
+
+    new_grid[0] = grid[0]
+    new_grid[-1] = grid[-1]
+
+    return new_grid
+
+
+def remap_conservative(grid: np.ndarray, values: np.ndarray, new_grid: np.ndarray) -> np.ndarray:
+    """Control volume averages on the new grid, which keep the integral of the solution over the domain.
+
+    The solution is reconstructed on control volumes of the old grid as linear with minmod limited slopes, so
+    the remap does not create new extrema. New values are the integrals of the reconstruction over new
+    control volumes divided by their widths. Both grids are vertex-centered with the same ends.
+
+    Parameters
+    ----------
+    grid: np.ndarray
+        Old node coordinates, shape (n,).
+    values: np.ndarray
+        Solution values at the old nodes, shape (n,).
+    new_grid: np.ndarray
+        New node coordinates, shape (m,).
+
+    Returns
+    ----------
+    new_values: np.ndarray
+        Solution values at the new nodes, shape (m,).
+
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+
+    # limited slopes by differences to neighbour nodes, constant values in boundary control volumes
+    differences = np.diff(values) / np.diff(grid)
+    slopes = np.zeros_like(values)
+    slopes[1:-1] = np.where(differences[:-1] * differences[1:] > 0.0,
+                            np.sign(differences[1:]) * np.minimum(np.abs(differences[:-1]), np.abs(differences[1:])),
+                            0.0)
+
+    faces = np.concatenate((grid[:1], 0.5 * (grid[:-1] + grid[1:]), grid[-1:]))
+    centers = 0.5 * (faces[:-1] + faces[1:])
+    integrals = np.concatenate(([0.0], np.cumsum(values * np.diff(faces))))
+
+    # integral of the reconstruction from the left end to the new faces
+    new_faces = np.concatenate((new_grid[:1], 0.5 * (new_grid[:-1] + new_grid[1:]), new_grid[-1:]))
+    k = np.clip(np.searchsorted(faces, new_faces, side='right') - 1, 0, values.size - 1)
+    new_integrals = (integrals[k] + values[k] * (new_faces - faces[k]) +
+                     0.5 * slopes[k] * ((new_faces - centers[k]) ** 2 - (faces[k] - centers[k]) ** 2))
+
+    return np.diff(new_integrals) / np.diff(new_faces)
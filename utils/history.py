@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class SolutionHistory:
+    def __init__(self, n_saved: int, shape: tuple, dtype=np.float64):
+        """Preallocated time history of a field stored in one contiguous array.
+
+        Parameters
+        ----------
+        n_saved: int
+            Expected number of saved time layers. Capacity is doubled if more layers are appended.
+        shape: tuple
+            Shape of a single time layer, e.g. (nx,).
+        dtype:
+            Data type of saved values.
+
+        """
+
+        self._values: np.ndarray = np.zeros(shape=(n_saved, *shape), dtype=dtype)
+        self._time: np.ndarray = np.zeros(shape=n_saved, dtype=np.float64)
+        self._steps: np.ndarray = np.zeros(shape=n_saved, dtype=np.int64)
+        self._size: int = 0
+
+    def append(self, step: int, current_time: float, value: np.ndarray):
+        """Copy time layer into the next free slot.
+
+        Parameters
+        ----------
+        step: int
+            Time step index.
+        current_time: float
+            Time value.
+        value: np.ndarray
+            Field values, reshaped to the layer shape.
+
+        """
+
+        if self._size == self._values.shape[0]:
+            self._grow()
+
+        self._values[self._size] = value.reshape(self._values.shape[1:])
+        self._time[self._size] = current_time
+        self._steps[self._size] = step
+        self._size += 1
+
+    def _grow(self):
+        """Double capacity, e.g. if adaptive time stepping takes more steps than expected.
+        """
+
+        capacity = max(1, 2 * self._values.shape[0])
+
+        for name in ('_values', '_time', '_steps'):
+            array = getattr(self, name)
+            grown = np.zeros(shape=(capacity, *array.shape[1:]), dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            setattr(self, name, grown)
+
+    def clear(self):
+        """Forget saved time layers without reallocation.
+        """
+
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, idx):
+        return self.values[idx]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self._size]
+
+    @property
+    def time(self) -> np.ndarray:
+        return self._time[:self._size]
+
+    @property
+    def steps(self) -> np.ndarray:
+        return self._steps[:self._size]
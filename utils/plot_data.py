@@ -7,7 +7,7 @@ from pathlib import Path
 import plotly.graph_objs as go
 
 from utils.common import timer
-from utils.output_dataclasses import OutputData
+from utils.equation_type import OutputData
 
 
 @timer
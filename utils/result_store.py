@@ -0,0 +1,391 @@
+import logging
+
+import h5py
+import numpy as np
+
+# target size of a single HDF5 chunk in bytes
+CHUNK_BYTES = 2 ** 20
+
+
+def _get_chunks(shape: tuple, itemsize: int) -> tuple:
+    """Chunk shape for (n_saved, *shape) dataset of about CHUNK_BYTES: several time layers for small grids,
+    a part of one time layer for large grids.
+    """
+
+    layer_items = int(np.prod(shape))
+    chunk_items = max(1, CHUNK_BYTES // itemsize)
+
+    if layer_items <= chunk_items:
+        return max(1, chunk_items // layer_items), *shape
+
+    return 1, max(1, chunk_items // int(np.prod(shape[1:]))), *shape[1:]
+
+
+class HDF5SolutionHistory:
+    def __init__(self, group: h5py.Group, n_saved: int, shape: tuple, dtype=np.float64,
+                 compression: str | None = 'gzip'):
+        """Time history of a field streamed into a chunked, compressed HDF5 dataset.
+
+        Has the same interface as SolutionHistory, values are stored in the group datasets values, time and steps.
+        If the group already contains them, the history continues after the saved time layers.
+
+        Parameters
+        ----------
+        group: h5py.Group
+            HDF5 group for the history datasets.
+        n_saved: int
+            Expected number of saved time layers. Datasets are created with n_saved rows and their size is doubled
+            if more layers are appended. Spare rows are removed by close.
+        shape: tuple
+            Shape of a single time layer, e.g. (nx,).
+        dtype:
+            Data type of saved values.
+        compression: str | None
+            HDF5 compression filter, e.g. gzip or lzf. Disabled if None.
+
+        Notes
+        ----------
+        Time layers are buffered in memory and written by whole chunks. The number of saved layers is kept
+        in the size attribute of the group, so it is known even if the file was not closed.
+
+        """
+
+        self._group = group
+        self._shape = shape
+
+        if 'values' in group:
+            self._values = group['values']
+            self._time = group['time']
+            self._steps = group['steps']
+            self._size = int(group.attrs.get('size', self._values.shape[0]))
+        else:
+            chunks = _get_chunks(shape, np.dtype(dtype).itemsize)
+            chunks = (max(1, min(chunks[0], n_saved)), *chunks[1:])
+            n_rows = max(1, n_saved)
+
+            self._values = group.create_dataset('values', shape=(n_rows, *shape), maxshape=(None, *shape),
+                                                dtype=dtype, chunks=chunks, compression=compression,
+                                                shuffle=compression is not None)
+            self._time = group.create_dataset('time', shape=(n_rows,), maxshape=(None,), dtype=np.float64,
+                                              chunks=(chunks[0],))
+            self._steps = group.create_dataset('steps', shape=(n_rows,), maxshape=(None,), dtype=np.int64,
+                                               chunks=(chunks[0],))
+            self._size = 0
+            self._group.attrs['size'] = 0
+
+        # time layers of a chunk, which are not written yet
+        n_buffer = self._values.chunks[0]
+        self._buffer_values: np.ndarray = np.zeros(shape=(n_buffer, *shape), dtype=self._values.dtype)
+        self._buffer_time: np.ndarray = np.zeros(shape=n_buffer, dtype=np.float64)
+        self._buffer_steps: np.ndarray = np.zeros(shape=n_buffer, dtype=np.int64)
+        self._n_buffered: int = 0
+
+    def append(self, step: int, current_time: float, value: np.ndarray):
+        """Copy time layer into the buffer, the buffer is written to the datasets when a chunk is full.
+
+        Parameters
+        ----------
+        step: int
+            Time step index.
+        current_time: float
+            Time value.
+        value: np.ndarray
+            Field values, reshaped to the layer shape.
+
+        """
+
+        self._buffer_values[self._n_buffered] = value.reshape(self._shape)
+        self._buffer_time[self._n_buffered] = current_time
+        self._buffer_steps[self._n_buffered] = step
+        self._n_buffered += 1
+        self._size += 1
+
+        if self._n_buffered == self._buffer_time.size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered time layers to the datasets, datasets are resized if they are full.
+        """
+
+        if self._n_buffered == 0:
+            return
+
+        start = self._size - self._n_buffered
+
+        if self._size > self._values.shape[0]:
+            for dataset in (self._values, self._time, self._steps):
+                dataset.resize(max(self._size, 2 * dataset.shape[0]), axis=0)
+
+        self._values[start:self._size] = self._buffer_values[:self._n_buffered]
+        self._time[start:self._size] = self._buffer_time[:self._n_buffered]
+        self._steps[start:self._size] = self._buffer_steps[:self._n_buffered]
+        self._n_buffered = 0
+        self._group.attrs['size'] = self._size
+
+    def clear(self):
+        """Forget saved time layers.
+        """
+
+        self.truncate(0)
+
+    def truncate(self, size: int):
+        """Keep only the first size time layers, e.g. the ones saved before a checkpoint.
+        """
+
+        self.flush()
+
+        for dataset in (self._values, self._time, self._steps):
+            dataset.resize(size, axis=0)
+
+        self._size = size
+        self._group.attrs['size'] = size
+
+    def close(self):
+        """Write buffered time layers and remove spare rows of the datasets.
+        """
+
+        self.truncate(self._size)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, idx):
+        return self.values[idx]
+
+    @property
+    def values(self) -> h5py.Dataset:
+        self.close()
+        return self._values
+
+    @property
+    def time(self) -> np.ndarray:
+        self.flush()
+        return self._time[:self._size]
+
+    @property
+    def steps(self) -> np.ndarray:
+        self.flush()
+        return self._steps[:self._size]
+
+
+class HDF5ResultStore:
+    def __init__(self, file_path: str, grid: np.ndarray, metadata: dict | None = None,
+                 compression: str | None = 'gzip', resume: bool = False):
+        """Writer of solver results into a single HDF5 file.
+
+        Parameters
+        ----------
+        file_path: str
+            Output HDF5 file path. Existing file is overwritten unless resume is set.
+        grid: np.ndarray
+            Domain grid, saved as grid dataset.
+        metadata: dict
+            Scalar parameters of the run, saved as file attributes.
+        compression: str | None
+            HDF5 compression filter for histories. Disabled if None.
+        resume: bool
+            Flag to continue writing into existing file, e.g. after restart from checkpoint.
+
+        """
+
+        self._file_path = file_path
+        self._compression = compression
+        self._histories: list[HDF5SolutionHistory] = []
+
+        if resume:
+            self._file = h5py.File(self._file_path, 'r+')
+            return
+
+        self._file = h5py.File(self._file_path, 'w')
+        self._file.create_dataset('grid', data=grid)
+
+        for key, value in (metadata or {}).items():
+            self._file.attrs[key] = value
+
+    def create_history(self, name: str, n_saved: int, shape: tuple, dtype=np.float64) -> HDF5SolutionHistory:
+        """Create time history stored in the group with the given name or open the existing one.
+        """
+
+        history = HDF5SolutionHistory(group=self._file.require_group(name), n_saved=n_saved, shape=shape,
+                                      dtype=dtype, compression=self._compression)
+        self._histories.append(history)
+
+        return history
+
+    def flush(self):
+        """Write buffered data to disk, e.g. before saving a checkpoint.
+        """
+
+        for history in self._histories:
+            history.flush()
+
+        self._file.flush()
+
+    def close(self):
+        """Close the file.
+        """
+
+        if not self._file:
+            return
+
+        for history in self._histories:
+            history.close()
+
+        self._file.close()
+
+        logging.info(f'Results saved to {self._file_path}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def file_path(self) -> str:
+        return self._file_path
+
+
+class HDF5ResultReader:
+    def __init__(self, file_path: str):
+        """Lazy reader of solver results saved by HDF5ResultStore.
+
+        Parameters
+        ----------
+        file_path: str
+            HDF5 file path.
+
+        """
+
+        self._file_path = file_path
+        self._file = h5py.File(self._file_path, 'r')
+
+    def has_history(self, name: str) -> bool:
+        """Check if the file contains the history, e.g. velocity is saved by diffusion convection only.
+        """
+
+        return name in self._file
+
+    def get_history(self, name: str) -> h5py.Dataset:
+        """Return history values as HDF5 dataset, which is read from disk only when sliced.
+        """
+
+        return self._file[name]['values']
+
+    def get_time(self, name: str = 'solutions') -> np.ndarray:
+        """Return time vector of the history.
+        """
+
+        return self._file[name]['time'][:]
+
+    def read(self, name: str = 'solutions', time_window: tuple[float, float] | None = None,
+             space_window: tuple[float, float] | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Read only the part of the history inside time and space windows.
+
+        Parameters
+        ----------
+        name: str
+            History name, e.g. solutions or velocity.
+        time_window: tuple[float, float]
+            Closed time interval (t_start, t_end). Whole time range if not set.
+        space_window: tuple[float, float]
+            Closed interval (x_start, x_end) by X. Whole domain if not set.
+
+        Returns
+        ----------
+        time: np.ndarray
+            Time values of the read layers.
+        grid: np.ndarray
+            Grid points of the read layers.
+        values: np.ndarray
+            History values, shape (n_time, n_x, ...).
+
+        """
+
+        time = self.get_time(name)
+        grid = self.grid
+
+        time_slice = slice(None)
+        space_slice = slice(None)
+
+        if time_window is not None:
+            time_slice = slice(np.searchsorted(time, time_window[0], side='left'),
+                               np.searchsorted(time, time_window[1], side='right'))
+
+        if space_window is not None:
+            if self.has_history('grids'):
+                raise ValueError('Space window needs a static grid, nodes of adaptive grid are in grids history!')
+
+            space_slice = slice(np.searchsorted(grid, space_window[0], side='left'),
+                                np.searchsorted(grid, space_window[1], side='right'))
+
+        return time[time_slice], grid[space_slice], self.get_history(name)[time_slice, space_slice]
+
+    def close(self):
+        """Close the file.
+        """
+
+        if self._file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def grid(self) -> np.ndarray:
+        return self._file['grid'][:]
+
+    @property
+    def attrs(self) -> dict:
+        return dict(self._file.attrs)
+
+
+class HDF5LazyHistory:
+    def __init__(self, file_path: str, name: str):
+        """Saved time history, which opens HDF5 file only to read the indexed time layers.
+
+        Unlike h5py.Dataset, it does not keep the file open, so the next run can overwrite the file.
+        Indexing after that reads the values of the new run.
+
+        Parameters
+        ----------
+        file_path: str
+            HDF5 file path.
+        name: str
+            History name, e.g. solutions or velocity.
+
+        """
+
+        self._file_path = file_path
+        self._name = name
+
+        with h5py.File(self._file_path, 'r') as file:
+            values = file[self._name]['values']
+            self._shape: tuple = values.shape
+            self._dtype: np.dtype = values.dtype
+
+    def __len__(self) -> int:
+        return self._shape[0]
+
+    def __getitem__(self, idx) -> np.ndarray:
+        with h5py.File(self._file_path, 'r') as file:
+            return file[self._name]['values'][idx]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        values = self[:]
+        return values if dtype is None else values.astype(dtype)
+
+    @property
+    def shape(self) -> tuple:
+        return self._shape
+
+    @property
+    def ndim(self) -> int:
+        return len(self._shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
@@ -0,0 +1,325 @@
+import dataclasses
+import itertools
+import logging
+import math
+import time
+from enum import Enum
+
+import h5py
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+
+from utils.equation_type import EquationData
+
+# input data fields with file paths, which must differ between sweep cases
+CASE_PATH_FIELDS = ('output_path', 'checkpoint_path', 'diagnostics_path')
+
+# scalar results of every case
+RESULT_FIELDS = [('failed', np.bool_), ('elapsed', np.float64), ('steady_state_time', np.float64),
+                 ('nonlinear_iterations', np.int64)]
+
+
+def get_sweep_cases(parameter_grid: dict[str, list]) -> list[dict]:
+    """Cartesian product of parameter values, the last parameter changes fastest.
+
+    Parameters
+    ----------
+    parameter_grid: dict[str, list]
+        Values of each parameter, e.g. {'d': [1E-9, 1E-8], 'nx': [100, 200]}.
+
+    Returns
+    ----------
+    cases: list[dict]
+        Parameter values of each case.
+
+    """
+
+    names = list(parameter_grid)
+
+    return [dict(zip(names, values)) for values in itertools.product(*(parameter_grid[name] for name in names))]
+
+
+def _get_config(config, overrides: dict):
+    """Dataclass instance with fields of config (dataclass or instance) and the overridden values.
+    """
+
+    config_type = config if isinstance(config, type) else type(config)
+    instance = config_type(**{field.name: getattr(config, field.name) for field in dataclasses.fields(config)
+                              if field.init})
+
+    for name, value in overrides.items():
+        setattr(instance, name, value)
+
+    return instance
+
+
+def _split_parameter(equation_data: EquationData, name: str) -> tuple[str, str]:
+    """Group (grid_time_data or equation_input_data) and field name of a sweep parameter.
+    """
+
+    group, _, field_name = name.rpartition('.')
+
+    if not group:
+        group = 'grid_time_data' if hasattr(equation_data.grid_time_data, name) else 'equation_input_data'
+
+    if group not in ('grid_time_data', 'equation_input_data') or not hasattr(getattr(equation_data, group), field_name):
+        raise ValueError(f'Unknown sweep parameter {name}!')
+
+    return group, field_name
+
+
+def get_case_data(equation_data: EquationData, case: dict, case_index: int = 0) -> EquationData:
+    """Equation data of a single sweep case, the base equation data is not changed.
+
+    Parameters
+    ----------
+    equation_data: EquationData
+        Base equation data, its grid_time_data and equation_input_data are dataclasses or their instances.
+    case: dict
+        Parameter values of the case. Names are fields of grid_time_data or equation_input_data,
+        e.g. nx or d, or qualified names, e.g. grid_time_data.nx.
+    case_index: int
+        Index of the case, substituted into {case} placeholder of output, checkpoint and diagnostics paths.
+
+    Returns
+    ----------
+    case_data: EquationData
+        Equation data with new grid_time_data, equation_input_data and equation_output_data instances.
+
+    """
+
+    overrides = {'grid_time_data': {}, 'equation_input_data': {}}
+
+    for name, value in case.items():
+        group, field_name = _split_parameter(equation_data, name)
+        overrides[group][field_name] = value
+
+    input_data = _get_config(equation_data.equation_input_data, overrides['equation_input_data'])
+
+    for name in CASE_PATH_FIELDS:
+        path = getattr(input_data, name, None)
+
+        if path is not None:
+            setattr(input_data, name, path.format(case=case_index))
+
+    output_data = equation_data.equation_output_data
+
+    return EquationData(
+        grid_time_data=_get_config(equation_data.grid_time_data, overrides['grid_time_data']),
+        equation_input_data=input_data,
+        equation_output_data=(output_data if isinstance(output_data, type) else type(output_data))(),
+        equation_solver=equation_data.equation_solver
+    )
+
+
+def _run_case(equation_data: EquationData, case: dict, case_index: int) -> dict:
+    """Solve a single case and return its final solution and scalar results.
+    """
+
+    start_time = time.perf_counter()
+
+    try:
+        case_data = get_case_data(equation_data=equation_data, case=case, case_index=case_index)
+        equation = case_data.equation_solver(input_data=case_data)
+        equation.solve_numerical()
+    except Exception as e:
+        return {'failed': True, 'error': f'{type(e).__name__}: {e}', 'elapsed': time.perf_counter() - start_time}
+
+    output_data = equation.output_data
+    steady_state_time = getattr(output_data, 'steady_state_time', None)
+
+    return {
+        'failed': False,
+        'elapsed': time.perf_counter() - start_time,
+        'steady_state_time': np.nan if steady_state_time is None else steady_state_time,
+        'nonlinear_iterations': int(np.sum(getattr(output_data, 'nonlinear_iterations', 0))),
+        'solution': np.array(output_data.numerical_solution),
+        'grid': np.array(output_data.grid),
+    }
+
+
+def _run_chunk(equation_data: EquationData, cases: list[tuple[int, dict]]) -> list[tuple[int, dict]]:
+    """Solve cases of a chunk one by one in the same worker process.
+    """
+
+    return [(case_index, _run_case(equation_data=equation_data, case=case, case_index=case_index))
+            for case_index, case in cases]
+
+
+def _get_parameter_column(values: list) -> np.ndarray:
+    """Column of the cases table: enums and functions are stored by names, other values as they are.
+    """
+
+    values = [value.name if isinstance(value, Enum) else getattr(value, '__name__', value) for value in values]
+    column = np.asarray(values)
+
+    return column.astype(str) if column.dtype == object else column
+
+
+@dataclasses.dataclass
+class SweepResult:
+    cases: np.ndarray  # structured array of parameter values and scalar results of every case
+    solutions: list  # final numerical solution of every case, None for failed cases
+    grids: list  # domain grid of every case, None for failed cases
+    output_path: str | None = None  # HDF5 file with the same data, not saved if None
+
+
+class _SweepStore:
+    def __init__(self, file_path: str, equation_data: EquationData):
+        """HDF5 file with final solutions of sweep cases, written as they are solved.
+        """
+
+        self._file = h5py.File(file_path, 'w')
+        self._file.attrs['equation_solver'] = equation_data.equation_solver.__name__
+
+    def write_case(self, case_index: int, result: dict):
+        if result['failed']:
+            return
+
+        group = self._file.create_group(f'case_{case_index:06d}')
+        group.create_dataset('solution', data=result['solution'])
+        group.create_dataset('grid', data=result['grid'])
+
+    def close(self, cases: np.ndarray):
+        # HDF5 has no unicode fixed-length strings, they are saved as variable-length UTF-8 strings
+        dtype = [(name, h5py.string_dtype('utf-8') if cases.dtype[name].kind == 'U' else cases.dtype[name])
+                 for name in cases.dtype.names]
+        table = np.empty(shape=cases.shape, dtype=dtype)
+
+        for name in cases.dtype.names:
+            table[name] = cases[name].astype(object) if cases.dtype[name].kind == 'U' else cases[name]
+
+        try:
+            self._file.create_dataset('cases', data=table)
+        finally:
+            self._file.close()
+
+
+def run_sweep(equation_data: EquationData, parameter_grid: dict[str, list] | None = None,
+              cases: list[dict] | None = None, n_jobs: int = -1, chunk_size: int | None = None,
+              output_path: str | None = None) -> SweepResult:
+    """Solve equation for every combination of parameters on a pool of worker processes.
+
+    Cases are sent to workers in chunks. Workers are reused for all chunks and subsequent sweeps, so imports and
+    numba compilation are paid once per worker. Progress is logged after every solved chunk.
+
+    Parameters
+    ----------
+    equation_data: EquationData
+        Base equation data, e.g. from get_input_data_by_equation.
+    parameter_grid: dict[str, list]
+        Values of each parameter, all combinations are solved. Names are fields of grid_time_data or
+        equation_input_data, e.g. {'d': [1E-9, 1E-8], 'nx': [100, 200], 'equation_input_data.c_init': [0.01]}.
+    cases: list[dict]
+        Explicit parameter values of each case instead of parameter_grid.
+    n_jobs: int
+        Number of worker processes, all cores if -1, solved in the current process if 1.
+    chunk_size: int
+        Number of cases solved by a worker at once. By default every worker gets about 4 chunks.
+    output_path: str
+        HDF5 file for the cases table and final solutions, not saved if None.
+
+    Returns
+    ----------
+    result: SweepResult
+        Cases table and final solutions in the order of cases.
+
+    Notes
+    ----------
+    Output, checkpoint and diagnostics paths of the base input data must contain {case} placeholder,
+    which is replaced by the case index, otherwise the cases would overwrite the same file.
+
+    """
+
+    if (parameter_grid is None) == (cases is None):
+        raise ValueError('Sweep needs either parameter_grid or cases!')
+
+    if cases is None:
+        cases = get_sweep_cases(parameter_grid)
+
+    n_cases = len(cases)
+
+    for name in dict.fromkeys(name for case in cases for name in case):
+        _split_parameter(equation_data, name)
+
+    for name in CASE_PATH_FIELDS:
+        path = getattr(equation_data.equation_input_data, name, None)
+
+        if path is not None and n_cases > 1 and '{case}' not in path:
+            raise ValueError(f'{name} must contain {{case}} placeholder to keep sweep cases in separate files!')
+
+    n_workers = max(1, effective_n_jobs(n_jobs))
+
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(n_cases / (4 * n_workers)))
+
+    indexed_cases = list(enumerate(cases))
+    chunks = [indexed_cases[start:start + chunk_size] for start in range(0, n_cases, chunk_size)]
+
+    logging.info(f'Sweep: {n_cases} cases in {len(chunks)} chunks on {n_workers} workers')
+
+    store = _SweepStore(output_path, equation_data) if output_path is not None else None
+    results: list[dict | None] = [None] * n_cases
+    start_time = time.perf_counter()
+    n_done = 0
+
+    try:
+        parallel = Parallel(n_jobs=n_jobs, return_as='generator')
+
+        for chunk_results in parallel(delayed(_run_chunk)(equation_data, chunk) for chunk in chunks):
+            for case_index, result in chunk_results:
+                results[case_index] = result
+
+                if result['failed']:
+                    logging.warning(f'Sweep case {case_index} {cases[case_index]} failed: {result["error"]}')
+
+                if store is not None:
+                    store.write_case(case_index, result)
+
+            n_done += len(chunk_results)
+            elapsed = time.perf_counter() - start_time
+            logging.info(f'Sweep: {n_done}/{n_cases} cases solved, {elapsed:.1f} s elapsed, '
+                         f'{elapsed / n_done * (n_cases - n_done):.1f} s left')
+    finally:
+        table = _get_cases_table(equation_data, cases, results)
+
+        if store is not None:
+            store.close(table)
+
+    return SweepResult(
+        cases=table,
+        solutions=[result.get('solution') for result in results],
+        grids=[result.get('grid') for result in results],
+        output_path=output_path
+    )
+
+
+def _get_cases_table(equation_data: EquationData, cases: list[dict], results: list[dict | None]) -> np.ndarray:
+    """Structured array of parameter values and scalar results, cases without results are marked as failed.
+    Parameters missing in a case get the base value.
+    """
+
+    columns = {}
+
+    for name in dict.fromkeys(name for case in cases for name in case):
+        group, field_name = _split_parameter(equation_data, name)
+        base_value = getattr(getattr(equation_data, group), field_name)
+        columns[name.replace('.', '__')] = _get_parameter_column([case.get(name, base_value) for case in cases])
+
+    table = np.zeros(shape=len(cases), dtype=[(name, column.dtype) for name, column in columns.items()] + RESULT_FIELDS)
+
+    for name, column in columns.items():
+        table[name] = column
+
+    table['steady_state_time'] = np.nan
+    table['failed'] = True
+
+    for i, result in enumerate(results):
+        if result is None:
+            continue
+
+        for name, _ in RESULT_FIELDS:
+            if name in result:
+                table[name][i] = result[name]
+
+    return table